@@ -0,0 +1,114 @@
+# bench_db_writes.py
+"""Measure database write throughput with N concurrent learner sessions.
+
+Each profile runs in its own process against a fresh scratch database, so the
+production database is never touched:
+
+    python bench_db_writes.py --sessions 8 --writes 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Pragma overrides that reproduce the baseline connection: SQLite's defaults (rollback
+# journal, full sync) plus the 5 s busy timeout sqlite3.connect() sets by default
+PROFILES = {
+    "default": "journal_mode=DELETE,synchronous=FULL,busy_timeout=5000,mmap_size=0,cache_size=-2000,temp_store=DEFAULT",
+    "tuned": "",
+}
+
+def run_profile(sessions, writes):
+    """Run the workload in this process; the environment selects the database and profile"""
+    import db_utils
+
+    db_utils.ensure_schema()
+    user_ids = []
+    for i in range(sessions):
+        db_utils.register_user(f"bench{i}", f"bench{i}@example.com", "bench")
+        user_ids.append(db_utils.authenticate_user(f"bench{i}", "bench")["id"])
+
+    errors = []
+    start_barrier = threading.Barrier(sessions + 1)
+
+    def session(user_id):
+        start_barrier.wait()
+        for i in range(writes):
+            try:
+                # The write mix of a learner: activity logs, quiz attempts and saved session state
+                if i % 10 == 0:
+                    db_utils.log_quiz_attempt(user_id, "Lists", i % 7, 7, {"answers": {}})
+                elif i % 10 == 1:
+                    db_utils.save_user_session(user_id, {"current_question": i})
+                else:
+                    # Committed one at a time, as the baseline log_activity did; going through
+                    # log_activity would only time the in-memory queue of the batch writer
+                    with db_utils.unit_of_work() as conn:
+                        conn.execute(
+                            """INSERT INTO activity_logs (user_id, activity_type, activity_details, timestamp)
+                               VALUES (?, ?, ?, ?)""",
+                            (user_id, "video_watched", json.dumps({"topic": "Lists", "position": i}),
+                             db_utils.now_ms())
+                        )
+            except Exception as e:
+                errors.append(str(e))
+        db_utils.close_thread_connection()
+
+    threads = [threading.Thread(target=session, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Let the quiz attempts' buffered activity events land before the process exits
+    db_utils.flush_activity_log(timeout=60)
+
+    # Failed writes don't count towards throughput
+    committed = sessions * writes - len(errors)
+    return {
+        "writes": committed,
+        "seconds": round(elapsed, 3),
+        "writes_per_second": round(committed / elapsed, 1) if elapsed else None,
+        "errors": len(errors),
+        "journal_mode": db_utils.get_thread_connection().execute("PRAGMA journal_mode").fetchone()[0],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent learner sessions")
+    parser.add_argument("--writes", type=int, default=200, help="writes per session")
+    parser.add_argument("--profiles", default="default,tuned", help="comma-separated profiles to compare")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_profile(args.sessions, args.writes)))
+        return
+
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as scratch:
+            env = dict(os.environ)
+            env["LEARNING_PLATFORM_DB"] = os.path.join(scratch, "bench.db")
+            env["LEARNING_PLATFORM_DB_PRAGMAS"] = PROFILES[profile]
+            completed = subprocess.run(
+                [sys.executable, __file__, "--run", profile,
+                 "--sessions", str(args.sessions), "--writes", str(args.writes)],
+                env=env, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            if completed.returncode != 0:
+                print(f"{profile}: failed\n{completed.stderr}")
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"{profile:>8}: {result['writes']} writes committed by {args.sessions} sessions in {result['seconds']}s "
+                  f"= {result['writes_per_second']} writes/s, {result['errors']} failed "
+                  f"(journal_mode={result['journal_mode']})")
+
+if __name__ == "__main__":
+    main()
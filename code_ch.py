@@ -3,12 +3,11 @@ import streamlit as st
 import time
 import json
 import random
-import datetime
-from db_utils import get_db_connection, log_activity
+from db_utils import unit_of_work, log_activity, invalidate_user_cache
+from time_utils import now_ms
 import streamlit_ace as ace
 import streamlit.components.v1 as components
 import re
-from db_utils import get_db_connection, init_challenges_tables, migrate_challenges_tables
 
 
 
@@ -245,20 +244,19 @@ def get_sample_challenges():
 
 def get_available_challenges(user_id):
     """Get a list of available challenges for the user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get all challenges with completion status for this user
-    cursor.execute("""
-        SELECT c.id, c.title, c.difficulty, c.category, c.xp_reward, c.badge_id,
-               uc.completed, uc.attempts
-        FROM code_challenges c
-        LEFT JOIN user_challenges uc ON c.id = uc.challenge_id AND uc.user_id = ?
-        ORDER BY c.difficulty, c.id
-    """, (user_id,))
-    
-    challenges = cursor.fetchall()
-    conn.close()
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        # Get all challenges with completion status for this user
+        cursor.execute("""
+            SELECT c.id, c.title, c.difficulty, c.category, c.xp_reward, c.badge_id,
+                   uc.completed, uc.attempts
+            FROM code_challenges c
+            LEFT JOIN user_challenges uc ON c.id = uc.challenge_id AND uc.user_id = ?
+            ORDER BY c.difficulty, c.id
+        """, (user_id,))
+        
+        challenges = cursor.fetchall()
     
     # Convert to list of dictionaries
     result = []
@@ -278,18 +276,17 @@ def get_available_challenges(user_id):
 
 def get_challenge_details(challenge_id):
     """Get detailed information about a specific challenge"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT id, title, story, description, difficulty, category, 
-               initial_code, solution_code, test_cases, hints, xp_reward, badge_id
-        FROM code_challenges
-        WHERE id = ?
-    """, (challenge_id,))
-    
-    challenge = cursor.fetchone()
-    conn.close()
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, title, story, description, difficulty, category, 
+                   initial_code, solution_code, test_cases, hints, xp_reward, badge_id
+            FROM code_challenges
+            WHERE id = ?
+        """, (challenge_id,))
+        
+        challenge = cursor.fetchone()
     
     if not challenge:
         return None
@@ -311,17 +308,16 @@ def get_challenge_details(challenge_id):
 
 def get_user_challenge_progress(user_id, challenge_id):
     """Get the user's progress on a specific challenge"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT completed, attempts, last_code, completed_at
-        FROM user_challenges
-        WHERE user_id = ? AND challenge_id = ?
-    """, (user_id, challenge_id))
-    
-    progress = cursor.fetchone()
-    conn.close()
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT completed, attempts, last_code, completed_at
+            FROM user_challenges
+            WHERE user_id = ? AND challenge_id = ?
+        """, (user_id, challenge_id))
+        
+        progress = cursor.fetchone()
     
     if not progress:
         return {
@@ -394,84 +390,68 @@ def submit_challenge(user_id, challenge_id, code):
         results["message"] = f"Error in testing: {str(e)}"
     
     # Save progress to database
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if record exists
-    cursor.execute("""
-        SELECT id FROM user_challenges
-        WHERE user_id = ? AND challenge_id = ?
-    """, (user_id, challenge_id))
-    
-    existing = cursor.fetchone()
-    
-    if existing:
-        # Update existing record
-        cursor.execute("""
-            UPDATE user_challenges
-            SET attempts = ?, 
-                last_code = ?,
-                completed = ?,
-                completed_at = ?
-            WHERE user_id = ? AND challenge_id = ?
-        """, (
-            attempts,
-            code,
-            1 if results["completed"] else progress["completed"],
-            datetime.datetime.now().isoformat() if results["completed"] and not progress["completed"] else progress["completed_at"],
-            user_id,
-            challenge_id
-        ))
-    else:
-        # Insert new record
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        # One statement records the attempt; a completion is never undone by a later failing attempt
         cursor.execute("""
             INSERT INTO user_challenges
             (user_id, challenge_id, completed, attempts, last_code, completed_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(user_id, challenge_id) DO UPDATE SET
+                attempts = attempts + 1,
+                last_code = excluded.last_code,
+                completed = MAX(completed, excluded.completed),
+                completed_at = CASE WHEN completed THEN completed_at ELSE excluded.completed_at END
         """, (
             user_id,
             challenge_id,
             1 if results["completed"] else 0,
-            attempts,
             code,
-            datetime.datetime.now().isoformat() if results["completed"] else None
+            now_ms() if results["completed"] else None
         ))
-    
-    # If challenge is completed for the first time, award XP and badge
-    if results["completed"] and not progress["completed"]:
-        try:
-            log_activity(
-                user_id, 
-                "challenge_completed", 
-                json.dumps({
-                    "challenge_id": challenge_id, 
-                    "challenge_title": challenge["title"],
-                    "xp_reward": challenge["xp_reward"]
-                })
-            )
-            
-            # Record badge earned
-            if challenge["badge_id"]:
+        # Read the count back in the same transaction (RETURNING would need SQLite 3.35)
+        cursor.execute(
+            "SELECT attempts FROM user_challenges WHERE user_id = ? AND challenge_id = ?",
+            (user_id, challenge_id)
+        )
+        results["attempts"] = cursor.fetchone()[0]
+        
+        # If challenge is completed for the first time, award XP and badge
+        if results["completed"] and not progress["completed"]:
+            try:
                 log_activity(
                     user_id, 
-                    "badge_earned", 
+                    "challenge_completed", 
                     json.dumps({
-                        "badge_id": challenge["badge_id"],
-                        "challenge_id": challenge_id
+                        "challenge_id": challenge_id, 
+                        "challenge_title": challenge["title"],
+                        "xp_reward": challenge["xp_reward"]
                     })
                 )
                 
-                # Add badge info to results
-                results["badge"] = {
-                    "id": challenge["badge_id"],
-                    "title": get_badge_title(challenge["badge_id"]),
-                    "description": f"Completed the '{challenge['title']}' challenge"
-                }
-        except Exception as e:
-            print(f"Error processing challenge reward: {e}")
-    
-    conn.commit()
-    conn.close()
+                # Record badge earned
+                if challenge["badge_id"]:
+                    log_activity(
+                        user_id, 
+                        "badge_earned", 
+                        json.dumps({
+                            "badge_id": challenge["badge_id"],
+                            "challenge_id": challenge_id
+                        })
+                    )
+                    
+                    # Add badge info to results
+                    results["badge"] = {
+                        "id": challenge["badge_id"],
+                        "title": get_badge_title(challenge["badge_id"]),
+                        "description": f"Completed the '{challenge['title']}' challenge"
+                    }
+            except Exception as e:
+                print(f"Error processing challenge reward: {e}")
+    
+    # The dashboard snapshot is rebuilt once the attempt is committed
+    invalidate_user_cache(user_id)
     
     return results
 
@@ -884,11 +864,6 @@ def coding_challenge_page():
     """Main coding challenges page with all fixes implemented"""
     st.title("🎮 Python Coding Adventures")
     
-    # Initialize database with proper schema
-    from db_utils import init_challenges_tables, migrate_challenges_tables
-    init_challenges_tables()
-    migrate_challenges_tables()
-    
     # Check if user is logged in
     if 'user' not in st.session_state or not st.session_state.user:
         st.warning("Please log in to access coding challenges.")
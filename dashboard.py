@@ -3,7 +3,9 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 import datetime
-from db_utils import get_user_progress, log_activity
+import os
+from db_utils import get_dashboard_snapshot, log_activity, DASHBOARD_TREND_DAYS
+from time_utils import from_epoch_ms
 
 def dashboard_page():
     """Display user's learning dashboard"""
@@ -17,8 +19,9 @@ def dashboard_page():
     username = st.session_state.user['username']
     log_activity(user_id, "view_dashboard")
     
-    # Get user progress data
-    progress = get_user_progress(user_id)
+    # Get user progress data; reruns without new activity are served from memory
+    snapshot = get_dashboard_snapshot(user_id)
+    progress = snapshot['progress']
     
     # Welcome message
     st.write(f"## Welcome back, {st.session_state.user['full_name'] or username}!")
@@ -72,6 +75,18 @@ def dashboard_page():
         )
         
         st.altair_chart(video_chart, use_container_width=True)
+        
+        # Poster images stand in for the videos, so the page loads in kilobytes
+        assets = snapshot['video_assets']
+        posters = [
+            (topic, asset['poster_path']) for topic, asset in assets.items()
+            if asset['poster_path'] and os.path.exists(asset['poster_path'])
+        ][:8]
+        if posters:
+            poster_columns = st.columns(min(4, len(posters)))
+            for i, (topic, poster_path) in enumerate(posters):
+                with poster_columns[i % len(poster_columns)]:
+                    st.image(poster_path, caption=topic, use_container_width=True)
     else:
         st.info("You haven't watched any videos yet. Start learning!")
     
@@ -97,13 +112,32 @@ def dashboard_page():
     else:
         st.info("You haven't taken any quizzes yet. Test your knowledge!")
     
+    # Activity trend section; days past the retention window come from the rollups
+    st.subheader("📈 Activity Trend")
+    
+    trend = snapshot['activity_trend']
+    if trend:
+        trend_df = pd.DataFrame(trend)
+        
+        trend_chart = alt.Chart(trend_df).mark_line(point=True).encode(
+            x=alt.X('day:T', title='Day'),
+            y=alt.Y('activities:Q', title='Activities'),
+            color=alt.value('#FF9800'),
+            tooltip=['day', 'activities', 'xp']
+        ).properties(
+            title=f'Daily Activity (last {DASHBOARD_TREND_DAYS} days)',
+            height=250
+        )
+        
+        st.altair_chart(trend_chart, use_container_width=True)
+    
     # Recent activity section
     st.subheader("🔍 Recent Activity")
     
     if progress['recent_activities']:
         for activity in progress['recent_activities']:
             activity_type = activity['activity_type'].replace('_', ' ').title()
-            timestamp = datetime.datetime.fromisoformat(str(activity['timestamp']).replace('Z', '+00:00'))
+            timestamp = from_epoch_ms(activity['timestamp'])
             time_ago = (datetime.datetime.now() - timestamp).days
             
             if time_ago == 0:
@@ -0,0 +1,121 @@
+# db_admin.py
+"""Maintenance commands for the learning platform database.
+
+    python db_admin.py migrate        apply pending schema migrations
+    python db_admin.py maintenance    checkpoint the WAL and run PRAGMA optimize
+    python db_admin.py check-plans    fail if a hot query path scans a whole table
+    python db_admin.py rebuild-stats  recompute user_stats and user_badges from activity_logs
+    python db_admin.py archive        roll up and archive activity events past the retention window
+    python db_admin.py query-stats    show the per-statement counters and slow queries the app dumped
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+
+import db_utils
+import query_stats
+
+def migrate(args):
+    if not db_utils.ensure_schema():
+        return 1
+    version = db_utils.get_thread_connection().execute("PRAGMA user_version").fetchone()[0]
+    print(f"Schema is at version {version}")
+    return 0
+
+def maintenance(args):
+    result = db_utils.run_db_maintenance()
+    if result is None:
+        return 1
+    print(f"Checkpointed {result['checkpointed']} of {result['wal_pages']} WAL pages")
+    return 0
+
+def check_plans(args):
+    with tempfile.TemporaryDirectory() as scratch:
+        # The check writes sample rows, so it runs against a copy of the database
+        scratch_path = os.path.join(scratch, "plans.db")
+        if os.path.exists(db_utils.DB_PATH):
+            source = sqlite3.connect(db_utils.DB_PATH)
+            target = sqlite3.connect(scratch_path)
+            source.backup(target)
+            source.close()
+            target.close()
+
+        failures = 0
+        for sql, plan, scans in db_utils.check_query_plans(scratch_path):
+            if scans or args.verbose:
+                print(" ".join(sql.split()))
+                for step in plan:
+                    print(f"    {step}")
+            if scans:
+                failures += 1
+                print(f"    FULL SCAN: {', '.join(scans)}")
+
+    print("No full table scans on the hot paths" if not failures else f"{failures} statement(s) scan a whole table")
+    return 1 if failures else 0
+
+def rebuild_stats(args):
+    db_utils.rebuild_user_stats(args.user)
+    print(f"Rebuilt stats for {'user ' + str(args.user) if args.user is not None else 'all users'}")
+    return 0
+
+def archive(args):
+    archived = db_utils.archive_activity_logs(args.days, args.archive_dir)
+    if archived is None:
+        return 1
+    print(f"Archived {archived} activity events older than {args.days} days")
+    return 0
+
+def show_query_stats(args):
+    data = query_stats.load_query_stats(args.input)
+    if data is None:
+        print(f"No query stats at {args.input}; the app writes them from its maintenance thread")
+        return 1
+    
+    statements = data["statements"][:args.top]
+    print(f"{'count':>7} {'total ms':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'rows':>8}  statement")
+    for entry in statements:
+        print(f"{entry['count']:>7} {entry['total_ms']:>10.1f} {entry['p50_ms']:>8.2f} {entry['p95_ms']:>8.2f} "
+              f"{entry['p99_ms']:>8.2f} {entry['rows']:>8}  {entry['fingerprint'][:100]}")
+        if args.verbose:
+            for caller, count in sorted(entry["callers"].items(), key=lambda item: -item[1]):
+                print(f"{'':>54}{count} x {caller}")
+    
+    slow = query_stats.read_slow_queries(limit=args.slow)
+    if slow:
+        print(f"\nLatest statements slower than {data['slow_ms']} ms:")
+        for entry in slow:
+            print(f"  {entry['ms']:.1f} ms, {entry['rows']} rows, {entry['caller']}: {entry['fingerprint'][:100]}")
+            for step in entry["plan"]:
+                print(f"      {step}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate").set_defaults(handler=migrate)
+    commands.add_parser("maintenance").set_defaults(handler=maintenance)
+    plans = commands.add_parser("check-plans")
+    plans.add_argument("--verbose", action="store_true", help="print every plan, not just the failing ones")
+    plans.set_defaults(handler=check_plans)
+    rebuild = commands.add_parser("rebuild-stats")
+    rebuild.add_argument("--user", type=int, help="only rebuild this user's stats")
+    rebuild.set_defaults(handler=rebuild_stats)
+    archive_parser = commands.add_parser("archive")
+    archive_parser.add_argument("--days", type=int, default=db_utils.ACTIVITY_RETENTION_DAYS,
+                                help="keep this many days of raw events in activity_logs")
+    archive_parser.add_argument("--archive-dir", default=db_utils.ACTIVITY_ARCHIVE_DIR,
+                                help="directory for the compressed archive files")
+    archive_parser.set_defaults(handler=archive)
+    stats = commands.add_parser("query-stats")
+    stats.add_argument("--input", default=query_stats.QUERY_STATS_PATH, help="stats path the app writes per-process files next to")
+    stats.add_argument("--top", type=int, default=20, help="statements to show, by total time")
+    stats.add_argument("--slow", type=int, default=10, help="slow-query log entries to show")
+    stats.add_argument("--verbose", action="store_true", help="list the calling functions of each statement")
+    stats.set_defaults(handler=show_query_stats)
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+if __name__ == "__main__":
+    main()
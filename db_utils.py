@@ -4,21 +4,204 @@ import hashlib
 import datetime
 import os
 import json
+import time
+import threading
+import contextlib
+import queue
+import atexit
+import copy
+import re
+import gzip
+import logging
+import bisect
+from time_utils import now_ms, to_epoch_ms
+from query_stats import InstrumentedConnection, dump_query_stats
 
-def get_db_connection():
-    """Create a connection to the SQLite database"""
+# zstandard compresses activity archives better; gzip is the fallback
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Path of the SQLite database file
+DB_PATH = os.getenv("LEARNING_PLATFORM_DB", os.path.join("data", "learning_platform.db"))
+
+# Prepared statements kept per connection (sqlite3 defaults to 128)
+STATEMENT_CACHE_SIZE = 512
+
+# Performance profile applied to every connection: WAL lets readers run alongside
+# the single writer, and the busy timeout makes writers queue instead of failing
+# with "database is locked". Override entries with LEARNING_PLATFORM_DB_PRAGMAS,
+# e.g. "synchronous=FULL,mmap_size=0".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative values are KiB, so 64 MB
+    "temp_store": "MEMORY",
+}
+
+# Record per-statement latency and the slow-query log (see query_stats.py); set to 0 to turn off
+QUERY_INSTRUMENTATION = os.getenv("LEARNING_PLATFORM_QUERY_INSTRUMENTATION", "1") != "0"
+
+# Seconds between WAL checkpoints and PRAGMA optimize runs in the maintenance thread
+DB_MAINTENANCE_SECONDS = int(os.getenv("LEARNING_PLATFORM_DB_MAINTENANCE_SECONDS", "300"))
+
+# Activity events older than this many days are rolled up and archived (0 keeps everything)
+ACTIVITY_RETENTION_DAYS = int(os.getenv("LEARNING_PLATFORM_ACTIVITY_RETENTION_DAYS", "90"))
+
+# Where archived activity events are written, as compressed JSON lines
+ACTIVITY_ARCHIVE_DIR = os.getenv("LEARNING_PLATFORM_ACTIVITY_ARCHIVE_DIR", os.path.join("data", "archive"))
+
+# Events moved per archive file and transaction
+ACTIVITY_ARCHIVE_BATCH_SIZE = 50000
+
+# Seconds between retention runs in the maintenance thread
+ACTIVITY_RETENTION_INTERVAL_SECONDS = 24 * 60 * 60
+
+def parse_pragma_overrides(value):
+    """Parse "name=value,name=value" into a dict of pragma settings"""
+    pragmas = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            name, setting = item.split("=", 1)
+            pragmas[name.strip()] = setting.strip()
+    return pragmas
+
+SQLITE_PRAGMAS.update(parse_pragma_overrides(os.getenv("LEARNING_PLATFORM_DB_PRAGMAS")))
+
+_thread_state = threading.local()
+
+# Open thread connections by owning thread. Streamlit runs every rerun on a new
+# thread, so connections left behind by finished threads are closed here
+# instead of waiting for garbage collection.
+_thread_connections = {}
+_thread_connections_lock = threading.Lock()
+
+def _connect(path=None, check_same_thread=True):
+    """Open a connection to DB_PATH (or another database file) without checking the schema"""
+    path = path or DB_PATH
     # Ensure the data directory exists
-    os.makedirs('data', exist_ok=True)
-    conn = sqlite3.connect('data/learning_platform.db')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=check_same_thread,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=InstrumentedConnection if QUERY_INSTRUMENTATION else sqlite3.Connection
+    )
     conn.row_factory = sqlite3.Row
+    for name, setting in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {setting}")
     return conn
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create users table
+def get_db_connection():
+    """Create a new, caller-owned connection to the SQLite database.
+
+    Prefer unit_of_work(), which reuses the calling thread's connection.
+    """
+    ensure_schema()
+    return _connect()
+
+def _close_finished_thread_connections():
+    """Close the connections of threads that exited without closing them"""
+    with _thread_connections_lock:
+        finished = [thread for thread in _thread_connections if not thread.is_alive()]
+        conns = [_thread_connections.pop(thread) for thread in finished]
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning("Could not close a finished thread's connection: %s", e)
+
+def get_thread_connection():
+    """Get the calling thread's reusable connection, opening it on first use"""
+    conn = getattr(_thread_state, "conn", None)
+    if conn is None:
+        ensure_schema()
+        _close_finished_thread_connections()
+        # Only this thread uses the connection; it may be closed from another
+        # thread once this one has finished
+        conn = _connect(check_same_thread=False)
+        with _thread_connections_lock:
+            _thread_connections[threading.current_thread()] = conn
+        _thread_state.conn = conn
+        _thread_state.depth = 0
+    return conn
+
+@contextlib.contextmanager
+def unit_of_work():
+    """Run a block of statements on the thread's connection as one unit of work.
+
+    Commits when the outermost block exits normally and rolls back if it raises.
+    Nested blocks (e.g. a helper called inside another write) join the outer unit.
+    """
+    conn = get_thread_connection()
+    _thread_state.depth += 1
+    try:
+        yield conn
+        if _thread_state.depth == 1:
+            conn.commit()
+    except BaseException:
+        if _thread_state.depth == 1:
+            conn.rollback()
+        raise
+    finally:
+        _thread_state.depth -= 1
+
+def close_thread_connection():
+    """Close the calling thread's connection, e.g. before a worker thread exits"""
+    conn = getattr(_thread_state, "conn", None)
+    if conn is not None:
+        with _thread_connections_lock:
+            _thread_connections.pop(threading.current_thread(), None)
+        conn.close()
+        _thread_state.conn = None
+
+def run_db_maintenance():
+    """Checkpoint the WAL into the database file and refresh the query planner statistics"""
+    conn = _connect()
+    try:
+        # PASSIVE never waits on readers or writers, so it is safe while sessions are active
+        busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        conn.execute("PRAGMA optimize")
+        return {"busy": busy, "wal_pages": wal_pages, "checkpointed": checkpointed}
+    except sqlite3.Error as e:
+        print(f"Database maintenance error: {e}")
+        return None
+    finally:
+        conn.close()
+
+_maintenance_thread = None
+_maintenance_lock = threading.Lock()
+
+def start_db_maintenance(interval=DB_MAINTENANCE_SECONDS):
+    """Start the background maintenance thread, once per process"""
+    global _maintenance_thread
+    with _maintenance_lock:
+        if _maintenance_thread is None and interval > 0:
+            def maintain():
+                last_retention = 0
+                while True:
+                    time.sleep(interval)
+                    run_db_maintenance()
+                    if QUERY_INSTRUMENTATION:
+                        try:
+                            dump_query_stats()
+                        except OSError as e:
+                            print(f"Error writing query stats: {e}")
+                    if ACTIVITY_RETENTION_DAYS > 0 and time.time() - last_retention >= ACTIVITY_RETENTION_INTERVAL_SECONDS:
+                        archive_activity_logs()
+                        last_retention = time.time()
+
+            _maintenance_thread = threading.Thread(target=maintain, name="db-maintenance", daemon=True)
+            _maintenance_thread.start()
+    return _maintenance_thread
+
+def _migrate_baseline(cursor):
+    """Create every table the platform uses, as they stood before versioned migrations"""
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -30,8 +213,7 @@ def init_db():
         last_login TIMESTAMP
     )
     ''')
-    
-    # Create activity_logs table
+
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS activity_logs (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,8 +224,7 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
-    
-    # Create videos_watched table
+
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS videos_watched (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -55,8 +236,7 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
-    
-    # Create quiz_attempts table - Fix comment format
+
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS quiz_attempts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -86,7 +266,7 @@ def init_db():
         badge_id TEXT
     )
     ''')
-    
+
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS user_challenges (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -101,10 +281,756 @@ def init_db():
         UNIQUE(user_id, challenge_id)
     )
     ''')
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chatbot_interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            query TEXT NOT NULL,
+            response TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chatbot_user_time
+        ON chatbot_interactions (user_id, timestamp)
+    """)
+
+    # Tables that coalesce and checkpoint concurrent tutorial generations
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            job_key TEXT PRIMARY KEY,
+            topic TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            owner TEXT,
+            result_path TEXT,
+            error TEXT,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job_key TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL,
+            PRIMARY KEY (job_key, stage)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS video_assets (
+            video_path TEXT PRIMARY KEY,
+            topic TEXT NOT NULL,
+            duration REAL,
+            poster_path TEXT,
+            sprite_path TEXT,
+            sprite_interval REAL,
+            sprite_columns INTEGER,
+            sprite_rows INTEGER,
+            tile_width INTEGER,
+            tile_height INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_video_assets_topic
+        ON video_assets (topic)
+    """)
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            user_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+def _migrate_challenge_test_cases(cursor):
+    """Add code_challenges.test_cases to databases created before the column existed"""
+    cursor.execute("PRAGMA table_info(code_challenges)")
+    columns = [col[1] for col in cursor.fetchall()]
+
+    if 'test_cases' not in columns:
+        cursor.execute("ALTER TABLE code_challenges ADD COLUMN test_cases TEXT")
+
+def _migrate_hot_path_indexes(cursor):
+    """Index the per-user read paths and make videos_watched unique per (user_id, topic)"""
+    # Merge duplicate watch records into the oldest one before adding the unique index
+    cursor.execute("""
+        UPDATE videos_watched
+        SET watch_count = (
+                SELECT SUM(watch_count) FROM videos_watched AS dup
+                WHERE dup.user_id = videos_watched.user_id AND dup.topic = videos_watched.topic
+            ),
+            completion_percentage = (
+                SELECT MAX(completion_percentage) FROM videos_watched AS dup
+                WHERE dup.user_id = videos_watched.user_id AND dup.topic = videos_watched.topic
+            ),
+            last_watched = (
+                SELECT MAX(last_watched) FROM videos_watched AS dup
+                WHERE dup.user_id = videos_watched.user_id AND dup.topic = videos_watched.topic
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM videos_watched
+            GROUP BY user_id, topic
+            HAVING COUNT(*) > 1
+        )
+    """)
+    cursor.execute("""
+        DELETE FROM videos_watched
+        WHERE id NOT IN (SELECT MIN(id) FROM videos_watched GROUP BY user_id, topic)
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_videos_watched_user_topic
+        ON videos_watched (user_id, topic)
+    """)
+
+    # Recent activity feed: WHERE user_id = ? ORDER BY timestamp DESC
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activity_logs_user_time
+        ON activity_logs (user_id, timestamp)
+    """)
+
+    # XP, badge and per-type lookups: WHERE user_id = ? AND activity_type = ?
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activity_logs_user_type
+        ON activity_logs (user_id, activity_type, timestamp)
+    """)
+
+    # Covers the per-topic quiz summary without touching the table rows
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_topic
+        ON quiz_attempts (user_id, topic, score, max_score)
+    """)
+
+    # The challenge list is read whole in (difficulty, id) order; this avoids the sort
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_code_challenges_difficulty
+        ON code_challenges (difficulty, id)
+    """)
+
+# XP granted by an activity event, as an SQL expression over the row alias `a`
+_ACTIVITY_XP_SQL = """
+    CASE WHEN a.activity_type IN ('challenge_completed', 'daily_challenge_completed')
+              AND json_valid(a.activity_details)
+         THEN COALESCE(CAST(json_extract(a.activity_details, '$.xp_reward') AS INTEGER), 0)
+         ELSE 0 END
+"""
+
+# Badge earned by an activity event, or NULL
+_ACTIVITY_BADGE_SQL = """
+    CASE WHEN a.activity_type = 'badge_earned' AND json_valid(a.activity_details)
+         THEN json_extract(a.activity_details, '$.badge_id') END
+"""
+
+# Local calendar day of an epoch-milliseconds column, for streaks
+def _day_sql(column, *modifiers):
+    extra = "".join(f", '{modifier}'" for modifier in modifiers)
+    return f"date({column} / 1000, 'unixepoch', 'localtime'{extra})"
+
+def _rebuild_user_stats(cursor, user_id=None):
+    """Recompute user_stats and user_badges from activity_logs and activity_rollups (all users, or one)"""
+    where = "WHERE a.user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    # Archived events only survive as daily rollups (added by a later migration)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'activity_rollups'")
+    has_rollups = cursor.fetchone() is not None
+    rollups = f"""
+        UNION ALL
+        SELECT a.user_id, a.activity_type, a.event_count, a.xp
+        FROM activity_rollups a
+        {where}
+    """ if has_rollups else ""
+
+    cursor.execute(f"DELETE FROM user_stats {where.replace('a.', '')}", params)
+    cursor.execute(f"""
+        INSERT INTO user_stats
+        (user_id, xp, level, total_activities, challenges_completed, quizzes_taken, videos_watched)
+        SELECT e.user_id,
+               SUM(e.xp),
+               1 + SUM(e.xp) / 100,
+               SUM(e.events),
+               SUM(CASE WHEN e.activity_type = 'challenge_completed' THEN e.events ELSE 0 END),
+               SUM(CASE WHEN e.activity_type = 'quiz_attempt' THEN e.events ELSE 0 END),
+               SUM(CASE WHEN e.activity_type = 'video_watched' THEN e.events ELSE 0 END)
+        FROM (
+            SELECT a.user_id, a.activity_type, COUNT(*) AS events, SUM({_ACTIVITY_XP_SQL}) AS xp
+            FROM activity_logs a
+            {where}
+            GROUP BY a.user_id, a.activity_type
+            {rollups}
+        ) e
+        GROUP BY e.user_id
+    """, params * (2 if has_rollups else 1))
+    # Badges are never taken away, and the events that earned archived ones are gone,
+    # so existing badges are kept and only the earliest earned_at is corrected
+    cursor.execute(f"""
+        INSERT INTO user_badges (user_id, badge_id, earned_at)
+        SELECT a.user_id, {_ACTIVITY_BADGE_SQL} AS badge_id, MIN(a.timestamp)
+        FROM activity_logs a
+        {where}
+        GROUP BY a.user_id, badge_id
+        HAVING badge_id IS NOT NULL
+        ON CONFLICT(user_id, badge_id) DO UPDATE SET earned_at = MIN(earned_at, excluded.earned_at)
+    """, params)
+    cursor.execute(f"""
+        UPDATE user_stats SET badge_count = (
+            SELECT COUNT(*) FROM user_badges WHERE user_badges.user_id = user_stats.user_id
+        )
+        {where.replace('a.', '')}
+    """, params)
+
+    # Streaks are runs of consecutive active days, replayed in day order
+    rollup_days = f"""
+        UNION
+        SELECT a.user_id, a.day
+        FROM activity_rollups a
+        {where}
+    """ if has_rollups else ""
+    cursor.execute(f"""
+        SELECT DISTINCT a.user_id, {_day_sql('a.timestamp')} AS day
+        FROM activity_logs a
+        {where}
+        {rollup_days}
+        ORDER BY 1, 2
+    """, params * (2 if has_rollups else 1))
+    streaks = {}
+    for row in cursor.fetchall():
+        if row[1] is None:
+            continue
+        day = datetime.date.fromisoformat(row[1])
+        current, longest, last_day = streaks.get(row[0], (0, 0, None))
+        current = current + 1 if last_day and (day - last_day).days == 1 else 1
+        streaks[row[0]] = (current, max(longest, current), day)
+    cursor.executemany(
+        "UPDATE user_stats SET current_streak = ?, longest_streak = ?, last_active_day = ? WHERE user_id = ?",
+        [(current, longest, last_day.isoformat(), uid) for uid, (current, longest, last_day) in streaks.items()]
+    )
+
+# Frozen copies of the stats SQL that migrations 4, 5 and 7 ran. An applied migration
+# has to replay the same way on a database that is still behind, so these never follow
+# later changes to _ACTIVITY_XP_SQL, _day_sql or _rebuild_user_stats.
+_ACTIVITY_XP_SQL_V4 = """
+    CASE WHEN a.activity_type IN ('challenge_completed', 'daily_challenge_completed')
+              AND json_valid(a.activity_details)
+         THEN COALESCE(CAST(json_extract(a.activity_details, '$.xp_reward') AS INTEGER), 0)
+         ELSE 0 END
+"""
+
+_ACTIVITY_BADGE_SQL_V4 = """
+    CASE WHEN a.activity_type = 'badge_earned' AND json_valid(a.activity_details)
+         THEN json_extract(a.activity_details, '$.badge_id') END
+"""
+
+# Calendar day of a text timestamp column (migration 4)
+def _day_sql_v4(column, *modifiers):
+    extra = "".join(f", '{modifier}'" for modifier in modifiers)
+    return f"date({column}{extra})"
+
+# Local calendar day of an epoch-milliseconds column (migrations 5 and 7)
+def _day_sql_v5(column, *modifiers):
+    extra = "".join(f", '{modifier}'" for modifier in modifiers)
+    return f"date({column} / 1000, 'unixepoch', 'localtime'{extra})"
+
+def _create_user_stats_trigger(cursor, day_sql):
+    """Create the trigger that folds each new activity event into user_stats and user_badges"""
+    xp = _ACTIVITY_XP_SQL_V4.replace("a.", "NEW.")
+    badge = _ACTIVITY_BADGE_SQL_V4.replace("a.", "NEW.")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_activity_logs_user_stats")
+    cursor.execute(f"""
+        CREATE TRIGGER trg_activity_logs_user_stats
+        AFTER INSERT ON activity_logs
+        BEGIN
+            INSERT INTO user_stats (user_id) VALUES (NEW.user_id)
+            ON CONFLICT(user_id) DO NOTHING;
+
+            UPDATE user_stats SET
+                xp = xp + {xp},
+                total_activities = total_activities + 1,
+                challenges_completed = challenges_completed + (NEW.activity_type = 'challenge_completed'),
+                quizzes_taken = quizzes_taken + (NEW.activity_type = 'quiz_attempt'),
+                videos_watched = videos_watched + (NEW.activity_type = 'video_watched'),
+                current_streak = CASE
+                    WHEN last_active_day IS NULL THEN 1
+                    WHEN {day_sql('NEW.timestamp')} <= last_active_day THEN current_streak
+                    WHEN {day_sql('NEW.timestamp', '-1 day')} = last_active_day THEN current_streak + 1
+                    ELSE 1 END,
+                last_active_day = MAX(COALESCE(last_active_day, ''), {day_sql('NEW.timestamp')})
+            WHERE user_id = NEW.user_id;
+
+            INSERT OR IGNORE INTO user_badges (user_id, badge_id, earned_at)
+            SELECT NEW.user_id, {badge}, NEW.timestamp
+            WHERE {badge} IS NOT NULL;
+
+            -- SET expressions see the row as it was, so derived columns need a second pass
+            UPDATE user_stats SET
+                level = 1 + xp / 100,
+                longest_streak = MAX(longest_streak, current_streak),
+                badge_count = (SELECT COUNT(*) FROM user_badges WHERE user_badges.user_id = NEW.user_id)
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+
+def _rebuild_user_stats_v4(cursor, day_sql):
+    """Recompute every user's stats and badges from activity_logs, as migrations 4, 5 and 7 did"""
+    cursor.execute("DELETE FROM user_stats")
+    cursor.execute("DELETE FROM user_badges")
+    cursor.execute(f"""
+        INSERT INTO user_stats
+        (user_id, xp, level, total_activities, challenges_completed, quizzes_taken, videos_watched)
+        SELECT a.user_id,
+               SUM({_ACTIVITY_XP_SQL_V4}),
+               1 + SUM({_ACTIVITY_XP_SQL_V4}) / 100,
+               COUNT(*),
+               SUM(a.activity_type = 'challenge_completed'),
+               SUM(a.activity_type = 'quiz_attempt'),
+               SUM(a.activity_type = 'video_watched')
+        FROM activity_logs a
+        GROUP BY a.user_id
+    """)
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO user_badges (user_id, badge_id, earned_at)
+        SELECT a.user_id, {_ACTIVITY_BADGE_SQL_V4} AS badge_id, MIN(a.timestamp)
+        FROM activity_logs a
+        GROUP BY a.user_id, badge_id
+        HAVING badge_id IS NOT NULL
+    """)
+    cursor.execute("""
+        UPDATE user_stats SET badge_count = (
+            SELECT COUNT(*) FROM user_badges WHERE user_badges.user_id = user_stats.user_id
+        )
+    """)
+
+    cursor.execute(f"""
+        SELECT DISTINCT a.user_id, {day_sql('a.timestamp')} AS day
+        FROM activity_logs a
+        ORDER BY a.user_id, day
+    """)
+    streaks = {}
+    for row in cursor.fetchall():
+        if row[1] is None:
+            continue
+        day = datetime.date.fromisoformat(row[1])
+        current, longest, last_day = streaks.get(row[0], (0, 0, None))
+        current = current + 1 if last_day and (day - last_day).days == 1 else 1
+        streaks[row[0]] = (current, max(longest, current), day)
+    cursor.executemany(
+        "UPDATE user_stats SET current_streak = ?, longest_streak = ?, last_active_day = ? WHERE user_id = ?",
+        [(current, longest, last_day.isoformat(), uid) for uid, (current, longest, last_day) in streaks.items()]
+    )
+
+def _migrate_user_stats(cursor):
+    """Materialize per-user XP, level, counts, badges and streaks, kept current by a trigger"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            xp INTEGER NOT NULL DEFAULT 0,
+            level INTEGER NOT NULL DEFAULT 1,
+            total_activities INTEGER NOT NULL DEFAULT 0,
+            challenges_completed INTEGER NOT NULL DEFAULT 0,
+            quizzes_taken INTEGER NOT NULL DEFAULT 0,
+            videos_watched INTEGER NOT NULL DEFAULT 0,
+            badge_count INTEGER NOT NULL DEFAULT 0,
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            last_active_day TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_badges (
+            user_id INTEGER NOT NULL,
+            badge_id TEXT NOT NULL,
+            earned_at TIMESTAMP,
+            PRIMARY KEY (user_id, badge_id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    _create_user_stats_trigger(cursor, _day_sql_v4)
+    _rebuild_user_stats_v4(cursor, _day_sql_v4)
+
+# Current time in epoch milliseconds, as an SQL expression for column defaults
+NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+# Time columns, all stored as integer epoch milliseconds (see time_utils)
+TIME_COLUMNS = {
+    "users": ["created_at", "last_login"],
+    "activity_logs": ["timestamp"],
+    "videos_watched": ["last_watched"],
+    "quiz_attempts": ["timestamp"],
+    "user_challenges": ["completed_at"],
+    "chatbot_interactions": ["timestamp"],
+    "generation_jobs": ["started_at", "heartbeat_at", "finished_at"],
+    "job_checkpoints": ["created_at"],
+    "video_assets": ["created_at"],
+    "user_sessions": ["updated_at"],
+    "user_badges": ["earned_at"],
+}
+
+def _rebuild_table(cursor, table, create_sql):
+    """Replace a table with one created by create_sql, keeping its rows, indexes and triggers.
+
+    This is SQLite's documented recipe for changes ALTER TABLE can't make,
+    such as a column's type or default.
+    """
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    )
+    dependents = [row[0] for row in cursor.fetchall()]
+    create_sql = re.sub(r'CREATE TABLE\s+(IF NOT EXISTS\s+)?"?\w+"?', f"CREATE TABLE {table}__rebuild", create_sql, count=1)
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table}__rebuild SELECT * FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}__rebuild RENAME TO {table}")
+    for sql in dependents:
+        cursor.execute(sql)
+
+def _fill_unparseable_times(table, column, rows, converted, position):
+    """Give legacy time values to_epoch_ms can't read the nearest readable value of their column.
+
+    Rows are in rowid (insertion) order, so the previous row's time, or else
+    the next one's, is the closest estimate; with neither, the current time
+    is used. Each replaced value is logged, since NOT NULL columns would
+    otherwise fail the whole migration.
+    """
+    bad = [i for i, row in enumerate(rows) if row[position] is not None and converted[i][position - 1] is None]
+    if not bad:
+        return
+    good = [i for i, values in enumerate(converted) if values[position - 1] is not None]
+    for i in bad:
+        nearest = bisect.bisect_left(good, i)
+        if nearest > 0:
+            fallback = converted[good[nearest - 1]][position - 1]
+        elif nearest < len(good):
+            fallback = converted[good[nearest]][position - 1]
+        else:
+            fallback = now_ms()
+        logger.warning("%s.%s of row %s is not a readable time (%r); using %s instead",
+                       table, column, rows[i][0], rows[i][position], fallback)
+        converted[i][position - 1] = fallback
+
+def _migrate_epoch_ms_timestamps(cursor):
+    """Store every time column as integer epoch milliseconds, converting the legacy text formats"""
+    # The stats trigger spans several of the rebuilt tables; it is recreated below
+    cursor.execute("DROP TRIGGER IF EXISTS trg_activity_logs_user_stats")
+    for table, columns in TIME_COLUMNS.items():
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = cursor.fetchone()[0]
+        for column in columns:
+            # CREATE statements list one column per line; retype it and swap CURRENT_TIMESTAMP defaults
+            create_sql = re.sub(
+                rf"(?m)^(\s*{column})\s+(?:TIMESTAMP|TEXT|REAL)(\s+NOT NULL)?(\s+DEFAULT\s+CURRENT_TIMESTAMP)?",
+                lambda m: f"{m.group(1)} INTEGER{m.group(2) or ''}" + (f" DEFAULT ({NOW_MS_SQL})" if m.group(3) else ""),
+                create_sql
+            )
+        _rebuild_table(cursor, table, create_sql)
+
+        cursor.execute(f"SELECT rowid, {', '.join(columns)} FROM {table} ORDER BY rowid")
+        rows = cursor.fetchall()
+        converted = [[to_epoch_ms(value) for value in row[1:]] for row in rows]
+        for index, column in enumerate(columns):
+            _fill_unparseable_times(table, column, rows, converted, index + 1)
+        updates = [
+            values + [row[0]]
+            for row, values in zip(rows, converted)
+            if values != list(row[1:])
+        ]
+        cursor.executemany(
+            f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE rowid = ?",
+            updates
+        )
+
+    # The streak trigger and the stats derived from the old text timestamps follow the new format
+    _create_user_stats_trigger(cursor, _day_sql_v5)
+    _rebuild_user_stats_v4(cursor, _day_sql_v5)
+
+def question_hash(question):
+    """Content hash that identifies a quiz question across attempts"""
+    content = {key: question.get(key) for key in ("question", "options", "correct_answer", "category")}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def _store_attempt_answers(cursor, attempt_id, questions, answers):
+    """Store an attempt's questions (deduplicated by content hash) and one row per answer"""
+    rows = []
+    for position, question in enumerate(questions):
+        content_hash = question_hash(question)
+        cursor.execute("""
+            INSERT INTO questions (content_hash, question, options, correct_answer, category)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO NOTHING
+        """, (
+            content_hash,
+            question.get("question", ""),
+            json.dumps(question.get("options", [])),
+            question.get("correct_answer"),
+            question.get("category", "General")
+        ))
+        # Look the id up rather than use RETURNING, which needs SQLite 3.35
+        cursor.execute("SELECT id FROM questions WHERE content_hash = ?", (content_hash,))
+        question_id = cursor.fetchone()[0]
+        
+        # Answers are keyed by question index; JSON round trips turn the keys into strings
+        answer = answers.get(position, answers.get(str(position)))
+        is_correct = answer is not None and answer == question.get("correct_answer")
+        rows.append((attempt_id, position, question_id, answer, int(is_correct)))
     
-    # Commit the changes
-    conn.commit()
-    conn.close()
+    cursor.executemany("""
+        INSERT OR REPLACE INTO attempt_answers (attempt_id, position, question_id, answer, is_correct)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+def _question_hash_v6(question):
+    """Question content hash as migration 6 computed it (frozen copy of question_hash)"""
+    content = {key: question.get(key) for key in ("question", "options", "correct_answer", "category")}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def _store_attempt_answers_v6(cursor, attempt_id, questions, answers):
+    """Store an attempt's questions and answers as migration 6 did (frozen copy of _store_attempt_answers)"""
+    rows = []
+    for position, question in enumerate(questions):
+        content_hash = _question_hash_v6(question)
+        cursor.execute("""
+            INSERT INTO questions (content_hash, question, options, correct_answer, category)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO NOTHING
+        """, (
+            content_hash,
+            question.get("question", ""),
+            json.dumps(question.get("options", [])),
+            question.get("correct_answer"),
+            question.get("category", "General")
+        ))
+        # Look the id up rather than use RETURNING, which needs SQLite 3.35
+        cursor.execute("SELECT id FROM questions WHERE content_hash = ?", (content_hash,))
+        question_id = cursor.fetchone()[0]
+        
+        # Answers are keyed by question index; JSON round trips turn the keys into strings
+        answer = answers.get(position, answers.get(str(position)))
+        is_correct = answer is not None and answer == question.get("correct_answer")
+        rows.append((attempt_id, position, question_id, answer, int(is_correct)))
+    
+    cursor.executemany("""
+        INSERT OR REPLACE INTO attempt_answers (attempt_id, position, question_id, answer, is_correct)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+def _migrate_normalized_questions(cursor):
+    """Move quiz questions and answers out of per-attempt JSON blobs into shared tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY,
+            content_hash TEXT UNIQUE NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT,
+            category TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attempt_answers (
+            attempt_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer TEXT,
+            is_correct INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (attempt_id, position),
+            FOREIGN KEY (attempt_id) REFERENCES quiz_attempts (id),
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )
+    ''')
+
+    # Per-question analytics aggregate over this index
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attempt_answers_question
+        ON attempt_answers (question_id, is_correct)
+    """)
+
+    cursor.execute("SELECT id, question_data FROM quiz_attempts WHERE question_data IS NOT NULL")
+    migrated = []
+    for attempt_id, question_data in cursor.fetchall():
+        try:
+            data = json.loads(question_data)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        
+        questions = data.get("questions") or []
+        answers = data.get("answers") or {}
+        if questions:
+            _store_attempt_answers_v6(cursor, attempt_id, questions, answers)
+        elif answers:
+            # Answers without their questions can't be normalized; keep the blob
+            continue
+        migrated.append((attempt_id,))
+
+    cursor.executemany("UPDATE quiz_attempts SET question_data = NULL WHERE id = ?", migrated)
+
+# Identical attempts logged within this many milliseconds of each other are results-page reruns
+DUPLICATE_ATTEMPT_WINDOW_MS = 10 * 60 * 1000
+
+def _migrate_quiz_attempt_keys(cursor):
+    """Key quiz attempts so finishing a quiz records it once, and collapse the duplicates already stored"""
+    cursor.execute("PRAGMA table_info(quiz_attempts)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'attempt_key' not in columns:
+        cursor.execute("ALTER TABLE quiz_attempts ADD COLUMN attempt_key TEXT")
+
+    # Results-page reruns re-logged the same attempt: same user, topic, score, questions and answers
+    cursor.execute("""
+        SELECT qa.id, qa.user_id, qa.topic, qa.score, qa.max_score, qa.timestamp,
+               COALESCE(
+                   (SELECT group_concat(aa.question_id || ':' || COALESCE(aa.answer, ''), '|')
+                    FROM (SELECT * FROM attempt_answers WHERE attempt_id = qa.id ORDER BY position) aa),
+                   qa.question_data
+               ) AS signature
+        FROM quiz_attempts qa
+        ORDER BY qa.id
+    """)
+    # Only rows logged shortly after the kept one are reruns; a later identical
+    # attempt is a learner retaking the quiz and getting the same answers
+    first_seen = {}
+    duplicates = []
+    for row in cursor.fetchall():
+        if row[6] is None:
+            continue
+        key = (row[1], row[2], row[3], row[4], row[6])
+        first_timestamp = first_seen.get(key)
+        if (first_timestamp is not None and row[5] is not None
+                and 0 <= row[5] - first_timestamp <= DUPLICATE_ATTEMPT_WINDOW_MS):
+            duplicates.append(row)
+        else:
+            first_seen[key] = row[5]
+
+    for attempt_id, user_id, topic, score, max_score, timestamp, _ in duplicates:
+        cursor.execute("DELETE FROM attempt_answers WHERE attempt_id = ?", (attempt_id,))
+        cursor.execute("DELETE FROM quiz_attempts WHERE id = ?", (attempt_id,))
+        # Each duplicate also logged an activity; drop the one written alongside it
+        cursor.execute("""
+            DELETE FROM activity_logs WHERE id = (
+                SELECT id FROM activity_logs
+                WHERE user_id = ? AND activity_type = 'quiz_attempt'
+                  AND json_valid(activity_details)
+                  AND json_extract(activity_details, '$.topic') = ?
+                  AND json_extract(activity_details, '$.score') = ?
+                  AND json_extract(activity_details, '$.max_score') = ?
+                ORDER BY ABS(timestamp - ?) LIMIT 1
+            )
+        """, (user_id, topic, score, max_score, timestamp))
+
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_quiz_attempts_attempt_key
+        ON quiz_attempts (attempt_key)
+    """)
+
+    # user_stats counted the removed activities
+    if duplicates:
+        _rebuild_user_stats_v4(cursor, _day_sql_v5)
+
+def _migrate_activity_rollups(cursor):
+    """Add daily per-user, per-type rollups that keep the totals of archived activity events"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_rollups (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            activity_type TEXT NOT NULL,
+            event_count INTEGER NOT NULL DEFAULT 0,
+            xp INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, activity_type),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID
+    """)
+
+# Numbered schema migrations, applied in order. PRAGMA user_version records the
+# last one applied, so append new migrations here and never edit applied ones,
+# including helpers they call: give a migration its own frozen copy instead.
+MIGRATIONS = [
+    (1, "baseline schema", _migrate_baseline),
+    (2, "add code_challenges.test_cases", _migrate_challenge_test_cases),
+    (3, "hot path indexes and unique videos_watched", _migrate_hot_path_indexes),
+    (4, "materialized user_stats and user_badges", _migrate_user_stats),
+    (5, "integer epoch-millisecond timestamps", _migrate_epoch_ms_timestamps),
+    (6, "normalized questions and attempt_answers", _migrate_normalized_questions),
+    (7, "quiz attempt keys and duplicate attempt cleanup", _migrate_quiz_attempt_keys),
+    (8, "activity_rollups for archived activity", _migrate_activity_rollups),
+]
+
+# Oldest SQLite the queries run on (INSERT ... ON CONFLICT DO UPDATE arrived in 3.24)
+MIN_SQLITE_VERSION = (3, 24, 0)
+
+# None until the migrations have run, then whether they succeeded
+_schema_ready = None
+_schema_lock = threading.Lock()
+
+def ensure_schema():
+    """Bring the database schema up to date, once per process.
+
+    A failed migration marks the schema unusable until the process restarts,
+    so it is logged once instead of being retried on every page load.
+    """
+    global _schema_ready
+    if _schema_ready is None:
+        with _schema_lock:
+            if _schema_ready is None:
+                _schema_ready = apply_migrations()
+    return _schema_ready
+
+def apply_migrations(path=None):
+    """Apply every pending migration to DB_PATH (or another database file), each in its own transaction"""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        logger.error("SQLite %s is too old; the schema and its UPSERTs need %s or newer",
+                     sqlite3.sqlite_version, ".".join(map(str, MIN_SQLITE_VERSION)))
+        return False
+    conn = None
+    latest = MIGRATIONS[-1][0]
+
+    try:
+        conn = _connect(path)
+        # Manage transactions explicitly so each migration's DDL and version bump commit together
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        if cursor.execute("PRAGMA user_version").fetchone()[0] >= latest:
+            return True
+
+        for version, description, migrate in MIGRATIONS:
+            # Re-read the version under the write lock; another process may have migrated already
+            cursor.execute("BEGIN IMMEDIATE")
+            if cursor.execute("PRAGMA user_version").fetchone()[0] >= version:
+                cursor.execute("ROLLBACK")
+                continue
+            try:
+                migrate(cursor)
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            print(f"Applied migration {version}: {description}")
+        return True
+    except Exception:
+        # Not only sqlite3.Error: a migration's Python code can fail on unexpected data too
+        logger.exception("Migrating %s failed; the database schema is not usable", path or DB_PATH)
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
+
+def init_db():
+    """Initialize the database with required tables"""
+    # The versioned migrations own the schema; this only makes sure they ran
+    return ensure_schema()
 
 def hash_password(password):
     """Hash a password for storing"""
@@ -112,58 +1038,212 @@ def hash_password(password):
 
 def register_user(username, email, password, full_name=""):
     """Register a new user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     password_hash = hash_password(password)
     
     try:
-        cursor.execute(
-            "INSERT INTO users (username, email, password_hash, full_name) VALUES (?, ?, ?, ?)",
-            (username, email, password_hash, full_name)
-    
-    )
-        conn.commit()
+        with unit_of_work() as conn:
+            conn.execute(
+                "INSERT INTO users (username, email, password_hash, full_name) VALUES (?, ?, ?, ?)",
+                (username, email, password_hash, full_name)
+            )
         success = True
     except sqlite3.IntegrityError:
         # Username or email already exists
         success = False
-    finally:
-        conn.close()
     
     return success
 
 def authenticate_user(username, password):
     """Check if username and password match"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    password_hash = hash_password(password)
-    
-    cursor.execute(
-        "SELECT id, username, email, full_name FROM users WHERE username = ? AND password_hash = ?",
-        (username, password_hash)
-    )
-    user = cursor.fetchone()
-    
-    if user:
-        # Update last login time
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        password_hash = hash_password(password)
+        
         cursor.execute(
-            "UPDATE users SET last_login = ? WHERE id = ?",
-            (datetime.datetime.now(), user['id'])
+            "SELECT id, username, email, full_name FROM users WHERE username = ? AND password_hash = ?",
+            (username, password_hash)
         )
-        conn.commit()
+        user = cursor.fetchone()
         
-        # Log login activity
-        log_activity(user['id'], "login")
-    
-    conn.close()
+        if user:
+            # Update last login time
+            cursor.execute(
+                "UPDATE users SET last_login = ? WHERE id = ?",
+                (now_ms(), user['id'])
+            )
+            
+            # Log login activity
+            log_activity(user['id'], "login")
     return dict(user) if user else None
 
+# Activity events are written by a background thread in batches of up to this size
+ACTIVITY_BATCH_SIZE = 200
+
+# Seconds an event may wait in the buffer before its batch is written
+ACTIVITY_FLUSH_SECONDS = 1.0
+
+# Identical view_* events from a user within this many seconds are logged once
+ACTIVITY_DEDUP_SECONDS = 30
+
+# Attempts at writing a batch before its events are dropped, and the first retry delay
+# (doubled after each failure), so a locked or briefly unavailable database loses nothing
+ACTIVITY_WRITE_ATTEMPTS = 5
+ACTIVITY_RETRY_SECONDS = 0.5
+
+# Marker queued by flush() so the writer doesn't wait out the flush interval
+_FLUSH = object()
+
+_INSERT_ACTIVITY_SQL = """
+    INSERT INTO activity_logs (user_id, activity_type, activity_details, timestamp)
+    VALUES (?, ?, ?, ?)
+"""
+
+class ActivityLogWriter:
+    """Buffers activity events and writes them with executemany, one transaction per batch.
+
+    The writer thread starts on the first event and the buffer is drained at
+    interpreter exit. Readers of activity_logs call flush() first so they see
+    every event logged before the read.
+    """
+
+    def __init__(self, batch_size=ACTIVITY_BATCH_SIZE, flush_seconds=ACTIVITY_FLUSH_SECONDS,
+                 dedup_seconds=ACTIVITY_DEDUP_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.dedup_seconds = dedup_seconds
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._pending = 0
+        self._recent_views = {}
+        self._thread = None
+        self._atexit_registered = False
+
+    def log(self, user_id, activity_type, activity_details, timestamp):
+        """Queue an event; returns False when it repeats a recent view event and was dropped"""
+        with self._lock:
+            if activity_type.startswith("view_") and self._is_repeat_view(user_id, activity_type, activity_details):
+                return False
+            # Counted and queued under one lock, so flush() never sees the count without the event
+            self._pending += 1
+            self._queue.put((user_id, activity_type, activity_details, timestamp))
+            if self._thread is None:
+                self._start()
+        return True
+
+    def _is_repeat_view(self, user_id, activity_type, activity_details):
+        now = time.monotonic()
+        key = (user_id, activity_type, activity_details)
+        last_seen = self._recent_views.get(key)
+        if last_seen is not None and now - last_seen < self.dedup_seconds:
+            return True
+        self._recent_views[key] = now
+        # Keep the dedup table bounded by dropping entries outside the window
+        if len(self._recent_views) > 10000:
+            self._recent_views = {
+                k: seen for k, seen in self._recent_views.items() if now - seen < self.dedup_seconds
+            }
+        return False
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+        self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [] if item is _FLUSH else [item]
+                deadline = time.monotonic() + self.flush_seconds
+                # Gather more events until the batch is full, the interval ends or a flush is requested
+                while batch and len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    if item is _FLUSH:
+                        break
+                    batch.append(item)
+                if batch:
+                    self._write(batch)
+        finally:
+            close_thread_connection()
+
+    def _write(self, batch):
+        try:
+            for attempt in range(1, ACTIVITY_WRITE_ATTEMPTS + 1):
+                try:
+                    with unit_of_work() as conn:
+                        conn.executemany(_INSERT_ACTIVITY_SQL, batch)
+                    return
+                except sqlite3.Error as e:
+                    # Reopen the connection in case it is the connection that broke
+                    close_thread_connection()
+                    if attempt == ACTIVITY_WRITE_ATTEMPTS:
+                        logger.error("Dropping %d activity log events after %d failed writes: %s",
+                                     len(batch), attempt, e)
+                        return
+                    delay = ACTIVITY_RETRY_SECONDS * 2 ** (attempt - 1)
+                    logger.warning("Writing %d activity log events failed (%s); retrying in %.1fs",
+                                   len(batch), e, delay)
+                    time.sleep(delay)
+        finally:
+            with self._written:
+                self._pending -= len(batch)
+                self._written.notify_all()
+
+    def flush(self, timeout=5):
+        """Block until every event queued so far has been written"""
+        with self._written:
+            if not self._pending:
+                return True
+            self._queue.put(_FLUSH)
+            return self._written.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=10):
+        """Write out the buffered events and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+class _InlineActivityWriter:
+    """Writes each event at once in the calling thread's unit of work, with the ActivityLogWriter interface.
+
+    check_query_plans swaps it in so its sample events are written, and traced,
+    on the scratch connection instead of by the writer thread.
+    """
+
+    def log(self, user_id, activity_type, activity_details, timestamp):
+        with unit_of_work() as conn:
+            conn.execute(_INSERT_ACTIVITY_SQL, (user_id, activity_type, activity_details, timestamp))
+        return True
+
+    def flush(self, timeout=5):
+        return True
+
+_activity_writer = ActivityLogWriter()
+
+def flush_activity_log(timeout=5):
+    """Write out buffered activity events before reading activity_logs"""
+    return _activity_writer.flush(timeout)
+
 def log_activity(user_id, activity_type, activity_details=None):
-    """Log user activity in the database with error handling"""
+    """Log user activity in the database with error handling.
+
+    Any activity other than a page view invalidates the user's cached dashboard.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Convert activity_details to string if it's not already
         if activity_details is not None and not isinstance(activity_details, str):
             try:
@@ -173,56 +1253,29 @@ def log_activity(user_id, activity_type, activity_details=None):
                 # If that fails, convert to string representation
                 activity_details = str(activity_details)
         
-        # Insert activity log
-        cursor.execute(
-            """
-            INSERT INTO activity_logs (user_id, activity_type, activity_details, timestamp)
-            VALUES (?, ?, ?, ?)
-            """,
-            (user_id, activity_type, activity_details, datetime.datetime.now().isoformat())
-        )
-        
-        conn.commit()
-        conn.close()
+        # Queue the activity log; the writer thread inserts it with the next batch
+        _activity_writer.log(user_id, activity_type, activity_details, now_ms())
+        if not activity_type.startswith("view_"):
+            invalidate_user_cache(user_id)
         return True
     except Exception as e:
         print(f"Error logging activity: {e}")
-        try:
-            conn.close()
-        except:
-            pass
         return False
 
 def log_video_watched(user_id, topic, completion_percentage=100):
     """Log when a user watches a video"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if this video was watched before
-    cursor.execute(
-        "SELECT id, watch_count FROM videos_watched WHERE user_id = ? AND topic = ?",
-        (user_id, topic)
-    )
-    existing = cursor.fetchone()
-    
-    if existing:
-        # Update existing record
-        cursor.execute(
-            """UPDATE videos_watched 
-               SET completion_percentage = ?, last_watched = ?, watch_count = ? 
-               WHERE id = ?""",
-            (completion_percentage, datetime.datetime.now(), existing['watch_count'] + 1, existing['id'])
-        )
-    else:
-        # Create new record
-        cursor.execute(
-            "INSERT INTO videos_watched (user_id, topic, completion_percentage) VALUES (?, ?, ?)",
-            (user_id, topic, completion_percentage)
+    with unit_of_work() as conn:
+        # One statement creates the record or bumps the existing one
+        conn.execute(
+            """INSERT INTO videos_watched (user_id, topic, completion_percentage)
+               VALUES (?, ?, ?)
+               ON CONFLICT(user_id, topic) DO UPDATE SET
+                   completion_percentage = excluded.completion_percentage,
+                   last_watched = ?,
+                   watch_count = watch_count + 1""",
+            (user_id, topic, completion_percentage, now_ms())
         )
     
-    conn.commit()
-    conn.close()
-    
     # Log the activity
     details = {
         "topic": topic,
@@ -230,23 +1283,39 @@ def log_video_watched(user_id, topic, completion_percentage=100):
     }
     log_activity(user_id, "video_watched", details)
 
-def log_quiz_attempt(user_id, topic, score, max_score, question_data):
-    """Log quiz attempt details"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if isinstance(question_data, dict) or isinstance(question_data, list):
+def log_quiz_attempt(user_id, topic, score, max_score, question_data, attempt_key=None):
+    """Log quiz attempt details.
+
+    A question_data dict with "questions" and "answers" is stored as rows in
+    questions and attempt_answers; anything else is kept as a JSON blob.
+    An attempt_key (created when the quiz starts) is recorded only once, so calling
+    this again for the same attempt is a no-op. Returns whether it was recorded.
+    """
+    questions = []
+    answers = {}
+    if isinstance(question_data, dict) and question_data.get("questions"):
+        questions = question_data["questions"]
+        answers = question_data.get("answers") or {}
+        question_data = None
+    elif isinstance(question_data, dict) or isinstance(question_data, list):
         question_data = json.dumps(question_data)
     
-    cursor.execute(
-        """INSERT INTO quiz_attempts 
-           (user_id, topic, score, max_score, question_data) 
-           VALUES (?, ?, ?, ?, ?)""",
-        (user_id, topic, score, max_score, question_data)
-    )
-    
-    conn.commit()
-    conn.close()
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            """INSERT INTO quiz_attempts 
+               (user_id, topic, score, max_score, question_data, attempt_key) 
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(attempt_key) DO NOTHING""",
+            (user_id, topic, score, max_score, question_data, attempt_key)
+        )
+        if cursor.rowcount == 0:
+            # Already finalized
+            return False
+        
+        if questions:
+            _store_attempt_answers(cursor, cursor.lastrowid, questions, answers)
     
     # Log the activity
     details = {
@@ -255,257 +1324,599 @@ def log_quiz_attempt(user_id, topic, score, max_score, question_data):
         "max_score": max_score
     }
     log_activity(user_id, "quiz_attempt", details)
+    return True
 
-def get_user_progress(user_id):
-    """Get a summary of the user's learning progress"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_question_stats(topic=None, user_id=None):
+    """Get how often each quiz question was answered and answered correctly"""
+    filters = []
+    params = []
+    if topic is not None:
+        filters.append("qa.topic = ?")
+        params.append(topic)
+    if user_id is not None:
+        filters.append("qa.user_id = ?")
+        params.append(user_id)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
     
-    # Get videos watched
-    cursor.execute(
-        "SELECT topic, completion_percentage, watch_count FROM videos_watched WHERE user_id = ?",
-        (user_id,)
-    )
-    videos_watched = [dict(row) for row in cursor.fetchall()]
-    
-    # Get quiz performance
-    cursor.execute(
-        """SELECT topic, AVG(score * 100.0 / max_score) as avg_percentage, 
-           COUNT(*) as attempt_count, MAX(score) as high_score
-           FROM quiz_attempts 
-           WHERE user_id = ? 
-           GROUP BY topic""",
-        (user_id,)
-    )
-    quiz_performance = [dict(row) for row in cursor.fetchall()]
-    
-    # Get recent activities
-    cursor.execute(
-        """SELECT activity_type, activity_details, timestamp 
-           FROM activity_logs 
-           WHERE user_id = ? 
-           ORDER BY timestamp DESC LIMIT 10""",
-        (user_id,)
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT q.id, q.question, q.category,
+                   COUNT(*) AS times_answered, SUM(aa.is_correct) AS times_correct,
+                   AVG(aa.is_correct) * 100.0 AS correct_percentage
+            FROM attempt_answers aa
+            JOIN quiz_attempts qa ON qa.id = aa.attempt_id
+            JOIN questions q ON q.id = aa.question_id
+            {where}
+            GROUP BY q.id
+            ORDER BY correct_percentage, times_answered DESC
+        """, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+# Seconds a dashboard snapshot is served from memory; the user's writes invalidate it sooner
+DASHBOARD_CACHE_SECONDS = float(os.getenv("LEARNING_PLATFORM_DASHBOARD_CACHE_SECONDS", "60"))
+
+# Snapshots kept before stale and expired ones are pruned
+DASHBOARD_CACHE_MAX_ENTRIES = 1000
+
+# Days of activity trend in a dashboard snapshot: twice the retention window, so the
+# older half of the chart comes from activity_rollups once events are archived
+DASHBOARD_TREND_DAYS = 2 * (ACTIVITY_RETENTION_DAYS or 90)
+
+# Daily activity count and XP: recent days from activity_logs, archived ones from activity_rollups
+_ACTIVITY_TREND_SQL = f"""
+    SELECT day, SUM(activities) AS activities, SUM(xp) AS xp
+    FROM (
+        SELECT {_day_sql('a.timestamp')} AS day, COUNT(*) AS activities, SUM({_ACTIVITY_XP_SQL}) AS xp
+        FROM activity_logs a
+        WHERE a.user_id = :user_id AND a.timestamp >= :since
+        GROUP BY day
+        UNION ALL
+        SELECT day, SUM(event_count), SUM(xp)
+        FROM activity_rollups
+        WHERE user_id = :user_id AND day >= :since_day
+        GROUP BY day
     )
-    recent_activities = [dict(row) for row in cursor.fetchall()]
+    GROUP BY day
+    ORDER BY day
+"""
+
+# Everything the dashboard shows, as JSON columns of a single row
+_DASHBOARD_SNAPSHOT_SQL = f"""
+    SELECT
+        (SELECT json_group_array(json_object(
+                    'topic', topic, 'completion_percentage', completion_percentage, 'watch_count', watch_count))
+         FROM videos_watched WHERE user_id = :user_id) AS videos_watched,
+        (SELECT json_group_array(json_object(
+                    'topic', topic, 'avg_percentage', avg_percentage,
+                    'attempt_count', attempt_count, 'high_score', high_score))
+         FROM (SELECT topic, AVG(score * 100.0 / max_score) AS avg_percentage,
+                      COUNT(*) AS attempt_count, MAX(score) AS high_score
+               FROM quiz_attempts
+               WHERE user_id = :user_id
+               GROUP BY topic)) AS quiz_performance,
+        (SELECT json_group_array(json_object(
+                    'activity_type', activity_type, 'activity_details', activity_details, 'timestamp', timestamp))
+         FROM (SELECT activity_type, activity_details, timestamp
+               FROM activity_logs
+               WHERE user_id = :user_id
+               ORDER BY timestamp DESC LIMIT 10)) AS recent_activities,
+        (SELECT json_object(
+                    'level', level, 'xp', xp, 'total_activities', total_activities,
+                    -- The stored streak only changes on activity; a gap since yesterday has broken it
+                    'current_streak', CASE WHEN last_active_day >= date('now', 'localtime', '-1 day')
+                                           THEN current_streak ELSE 0 END,
+                    'longest_streak', longest_streak)
+         FROM user_stats WHERE user_id = :user_id) AS stats,
+        (SELECT json_group_array(badge_id)
+         FROM (SELECT badge_id FROM user_badges WHERE user_id = :user_id ORDER BY earned_at)) AS badges,
+        (SELECT json_group_object(topic, json_object(
+                    'video_path', video_path, 'topic', topic, 'duration', duration, 'poster_path', poster_path,
+                    'sprite_path', sprite_path, 'sprite_interval', sprite_interval,
+                    'sprite_columns', sprite_columns, 'sprite_rows', sprite_rows,
+                    'tile_width', tile_width, 'tile_height', tile_height, 'created_at', created_at))
+         FROM (SELECT * FROM video_assets
+               WHERE topic IN (SELECT topic FROM videos_watched WHERE user_id = :user_id)
+               ORDER BY created_at)) AS video_assets,
+        (SELECT json_group_array(json_object('day', day, 'activities', activities, 'xp', xp))
+         FROM ({_ACTIVITY_TREND_SQL})) AS activity_trend
+"""
+
+_user_versions = {}
+_dashboard_cache = {}
+_dashboard_cache_lock = threading.Lock()
+
+def invalidate_user_cache(user_id):
+    """Start a new cache version for a user, after a write that changes their dashboard"""
+    with _dashboard_cache_lock:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+
+def _trend_params(user_id, days):
+    return {
+        "user_id": user_id,
+        "since": now_ms() - days * 24 * 60 * 60 * 1000,
+        "since_day": (datetime.date.today() - datetime.timedelta(days=days)).isoformat(),
+    }
+
+def get_dashboard_snapshot(user_id):
+    """Get everything the dashboard shows for a user, cached in memory.
+
+    Snapshots are keyed by (user_id, version). Writes bump the user's version
+    through invalidate_user_cache(), so reruns without a write are served from
+    memory and a miss is filled by one combined query. Returns a dict with
+    "progress", "stats", "video_assets" and "activity_trend".
+    """
+    with _dashboard_cache_lock:
+        version = _user_versions.get(user_id, 0)
+        cached = _dashboard_cache.get((user_id, version))
+    if cached and cached[0] > time.monotonic():
+        # Callers get their own copy, so they can't change the cached one
+        return copy.deepcopy(cached[1])
     
-    conn.close()
+    flush_activity_log()
+    with unit_of_work() as conn:
+        row = conn.execute(_DASHBOARD_SNAPSHOT_SQL, _trend_params(user_id, DASHBOARD_TREND_DAYS)).fetchone()
     
-    return {
-        "videos_watched": videos_watched,
-        "quiz_performance": quiz_performance,
-        "recent_activities": recent_activities
+    stats = json.loads(row['stats']) if row['stats'] else {
+        "level": 1,
+        "xp": 0,
+        "total_activities": 0,
+        "current_streak": 0,
+        "longest_streak": 0
+    }
+    stats["badges"] = json.loads(row['badges'])
+    snapshot = {
+        "progress": {
+            "videos_watched": json.loads(row['videos_watched']),
+            "quiz_performance": json.loads(row['quiz_performance']),
+            "recent_activities": json.loads(row['recent_activities'])
+        },
+        "stats": stats,
+        "video_assets": json.loads(row['video_assets']),
+        "activity_trend": json.loads(row['activity_trend'])
     }
+    
+    with _dashboard_cache_lock:
+        if len(_dashboard_cache) >= DASHBOARD_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for key, (expires_at, _) in list(_dashboard_cache.items()):
+                if expires_at <= now or key[1] != _user_versions.get(key[0], 0):
+                    del _dashboard_cache[key]
+        _dashboard_cache[(user_id, version)] = (time.monotonic() + DASHBOARD_CACHE_SECONDS, snapshot)
+    return copy.deepcopy(snapshot)
+
+def get_user_progress(user_id):
+    """Get a summary of the user's learning progress"""
+    return get_dashboard_snapshot(user_id)["progress"]
+
 def init_chatbot_db():
     """Initialize database tables for the chatbot"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create tables if they don't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chatbot_interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                query TEXT NOT NULL,
-                response TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # Create index for faster queries
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_chatbot_user_time
-            ON chatbot_interactions (user_id, timestamp)
-        """)
-        
-        conn.commit()
-        conn.close()
-        
-        return True
-    except Exception as e:
-        print(f"Error initializing chatbot database: {e}")
-        return False
-    
+    # The versioned migrations own the schema; this only makes sure they ran
+    return ensure_schema()
+
 # Add these new functions to db_utils.py
 
 def get_user_stats(user_id):
     """Get comprehensive user statistics including XP and level"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Calculate total XP from activities
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_activities,
-            SUM(CASE 
-                WHEN activity_type = 'challenge_completed' THEN json_extract(activity_details, '$.xp_reward')
-                WHEN activity_type = 'daily_challenge_completed' THEN json_extract(activity_details, '$.xp_reward')
-                ELSE 0 
-            END) as total_xp
-        FROM activity_logs
-        WHERE user_id = ?
-    """, (user_id,))
-    
-    stats = cursor.fetchone()
-    
-    if not stats:
-        return {
-            "level": 1,
-            "xp": 0,
-            "total_activities": 0,
-            "badges": []
-        }
-    
-    # Calculate level (1 level per 100 XP)
-    level = 1 + (stats['total_xp'] or 0) // 100
-    
-    # Get earned badges
-    cursor.execute("""
-        SELECT json_extract(activity_details, '$.badge_id') as badge_id
-        FROM activity_logs
-        WHERE user_id = ? AND activity_type = 'badge_earned'
-    """, (user_id,))
+    # user_stats is maintained by a trigger on activity_logs; the snapshot reads its one row
+    return get_dashboard_snapshot(user_id)["stats"]
+
+def rebuild_user_stats(user_id=None):
+    """Backfill or repair the materialized stats of one user, or of everyone"""
+    flush_activity_log()
+    with unit_of_work() as conn:
+        _rebuild_user_stats(conn.cursor(), user_id)
+    return True
+
+def get_activity_trend(user_id, days=DASHBOARD_TREND_DAYS):
+    """Get a user's daily activity count and XP for the last `days` days.
+
+    Recent days come from activity_logs and archived ones from activity_rollups.
+    """
+    flush_activity_log()
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(_ACTIVITY_TREND_SQL, _trend_params(user_id, days))
+        return [dict(row) for row in cursor.fetchall()]
+
+def _write_activity_archive(rows, archive_dir):
+    """Write activity rows to a compressed JSON-lines file and return its path"""
+    os.makedirs(archive_dir, exist_ok=True)
+    data = "".join(json.dumps(dict(row)) + "\n" for row in rows).encode("utf-8")
+    if zstandard is not None:
+        data = zstandard.ZstdCompressor().compress(data)
+        extension = "jsonl.zst"
+    else:
+        data = gzip.compress(data)
+        extension = "jsonl.gz"
     
-    badges = [row['badge_id'] for row in cursor.fetchall() if row['badge_id']]
+    path = os.path.join(archive_dir, f"activity_logs-{rows[0]['id']}-{rows[-1]['id']}.{extension}")
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return path
+
+def read_activity_archive(path):
+    """Read back the activity rows of an archive file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst archives")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = gzip.decompress(data)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+def archive_activity_logs(retention_days=ACTIVITY_RETENTION_DAYS, archive_dir=ACTIVITY_ARCHIVE_DIR,
+                          batch_size=ACTIVITY_ARCHIVE_BATCH_SIZE):
+    """Roll up activity events older than retention_days and move them to archive files.
+
+    Each batch is added to activity_rollups, written to a compressed archive and
+    deleted from activity_logs in one transaction, so the live table only holds
+    recent events. Returns the number of archived events, or None on error.
+    """
+    if retention_days <= 0:
+        return 0
     
-    conn.close()
+    flush_activity_log()
+    cutoff = now_ms() - retention_days * 24 * 60 * 60 * 1000
+    archived = 0
     
-    return {
-        "level": level,
-        "xp": stats['total_xp'] or 0,
-        "total_activities": stats['total_activities'] or 0,
-        "badges": badges
-    }
+    try:
+        while True:
+            path = None
+            try:
+                with unit_of_work() as conn:
+                    cursor = conn.cursor()
+                    
+                    # Hold the write lock so the batch can't change between the reads and the delete
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute(
+                        "SELECT * FROM activity_logs WHERE timestamp < ? ORDER BY id LIMIT ?",
+                        (cutoff, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1]['id']
+                    
+                    cursor.execute(f"""
+                        INSERT INTO activity_rollups (user_id, day, activity_type, event_count, xp)
+                        SELECT a.user_id, {_day_sql('a.timestamp')} AS day, a.activity_type,
+                               COUNT(*), SUM({_ACTIVITY_XP_SQL})
+                        FROM activity_logs a
+                        WHERE a.id <= ? AND a.timestamp < ?
+                        GROUP BY a.user_id, day, a.activity_type
+                        ON CONFLICT(user_id, day, activity_type) DO UPDATE SET
+                            event_count = event_count + excluded.event_count,
+                            xp = xp + excluded.xp
+                    """, (last_id, cutoff))
+                    path = _write_activity_archive(rows, archive_dir)
+                    cursor.execute("DELETE FROM activity_logs WHERE id <= ? AND timestamp < ?", (last_id, cutoff))
+                    archived += len(rows)
+            except Exception:
+                # The rows are still live, so don't leave a second copy in the archive
+                if path and os.path.exists(path):
+                    os.remove(path)
+                raise
+            print(f"Archived {len(rows)} activity events to {path}")
+        return archived
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error archiving activity logs: {e}")
+        return None
 
 def get_user_challenges_progress(user_id):
     """Get all challenges progress for a user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            c.id, c.title, c.difficulty, c.category, c.xp_reward, c.badge_id,
-            uc.completed, uc.attempts, uc.completed_at
-        FROM code_challenges c
-        LEFT JOIN user_challenges uc ON c.id = uc.challenge_id AND uc.user_id = ?
-        ORDER BY c.difficulty, c.id
-    """, (user_id,))
-    
-    challenges = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 
+                c.id, c.title, c.difficulty, c.category, c.xp_reward, c.badge_id,
+                uc.completed, uc.attempts, uc.completed_at
+            FROM code_challenges c
+            LEFT JOIN user_challenges uc ON c.id = uc.challenge_id AND uc.user_id = ?
+            ORDER BY c.difficulty, c.id
+        """, (user_id,))
+        
+        challenges = [dict(row) for row in cursor.fetchall()]
     
     return challenges
 
 def update_user_challenge(user_id, challenge_id, completed=False, code=None):
     """Update or create a user challenge record"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if record exists
-    cursor.execute("""
-        SELECT id FROM user_challenges
-        WHERE user_id = ? AND challenge_id = ?
-    """, (user_id, challenge_id))
-    
-    existing = cursor.fetchone()
-    
-    if existing:
-        # Update existing record
-        cursor.execute("""
-            UPDATE user_challenges
-            SET attempts = attempts + 1,
-                completed = ?,
-                last_code = ?,
-                completed_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE completed_at END
-            WHERE id = ?
-        """, (completed, code, completed, existing['id']))
-    else:
-        # Create new record
-        cursor.execute("""
+    with unit_of_work() as conn:
+        conn.execute("""
             INSERT INTO user_challenges
             (user_id, challenge_id, completed, attempts, last_code, completed_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(user_id, challenge_id) DO UPDATE SET
+                attempts = attempts + 1,
+                completed = excluded.completed,
+                last_code = excluded.last_code,
+                completed_at = CASE WHEN excluded.completed THEN excluded.completed_at ELSE completed_at END
         """, (
             user_id,
             challenge_id,
             completed,
-            1,  # first attempt
             code,
-            datetime.datetime.now().isoformat() if completed else None
+            now_ms() if completed else None
         ))
-    
-    conn.commit()
-    conn.close()
+    invalidate_user_cache(user_id)
     return True
 
 def init_challenges_tables():
     """Initialize the challenge-specific tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # The versioned migrations own the schema; this only makes sure they ran
+    return ensure_schema()
+
+def migrate_challenges_tables():
+    """Migrate existing tables if needed"""
+    # The versioned migrations own the schema; this only makes sure they ran
+    return ensure_schema()
+
+# Seconds without a heartbeat after which a running generation job is considered abandoned
+JOB_STALE_SECONDS = 120
+
+# Seconds a finished job's artifact is handed to late requests for the same key
+JOB_RESULT_TTL_SECONDS = 300
+
+# Seconds a failed job's stage checkpoints can be resumed from before a new attempt starts over
+JOB_CHECKPOINT_TTL_SECONDS = 60 * 60
+
+def claim_generation_job(job_key, topic, owner):
+    """Try to become the owner of a generation job.
+
+    Returns True when the caller now owns the job and must do the work, or False
+    when another live owner is already running it (or just finished it).
+    """
+    now = now_ms()
     
-    try:
-        # Create code_challenges table if not exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS code_challenges (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                story TEXT NOT NULL,
-                description TEXT NOT NULL,
-                difficulty TEXT NOT NULL,
-                category TEXT NOT NULL,
-                initial_code TEXT,
-                solution_code TEXT,
-                test_cases TEXT,
-                hints TEXT,
-                xp_reward INTEGER NOT NULL,
-                badge_id TEXT
-            )
-        ''')
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
         
-        # Create user_challenges table if not exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_challenges (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                challenge_id INTEGER NOT NULL,
-                completed BOOLEAN DEFAULT 0,
-                attempts INTEGER DEFAULT 0,
-                last_code TEXT,
-                completed_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (challenge_id) REFERENCES code_challenges (id),
-                UNIQUE(user_id, challenge_id)
-            )
-        ''')
+        # Take the write lock up front so only one process can claim the key
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "SELECT status, heartbeat_at, finished_at, result_path FROM generation_jobs WHERE job_key = ?",
+            (job_key,)
+        )
+        job = cursor.fetchone()
+        
+        if job:
+            if job['status'] == 'running' and now - (job['heartbeat_at'] or 0) < JOB_STALE_SECONDS * 1000:
+                return False
+            if (job['status'] == 'done' and job['result_path'] and os.path.exists(job['result_path'])
+                    and now - (job['finished_at'] or 0) < JOB_RESULT_TTL_SECONDS * 1000):
+                return False
+        
+        cursor.execute("""
+            INSERT INTO generation_jobs
+            (job_key, topic, status, stage, owner, result_path, error, started_at, heartbeat_at, finished_at)
+            VALUES (?, ?, 'running', NULL, ?, NULL, NULL, ?, ?, NULL)
+            ON CONFLICT(job_key) DO UPDATE SET
+                topic = excluded.topic,
+                status = 'running',
+                stage = NULL,
+                owner = excluded.owner,
+                result_path = NULL,
+                error = NULL,
+                started_at = excluded.started_at,
+                heartbeat_at = excluded.heartbeat_at,
+                finished_at = NULL
+        """, (job_key, topic, owner, now, now))
+        
+        # Checkpoints only get cleared when a job succeeds; expire those a failed attempt left long ago
+        cursor.execute(
+            "DELETE FROM job_checkpoints WHERE job_key = ? AND created_at < ?",
+            (job_key, now - JOB_CHECKPOINT_TTL_SECONDS * 1000)
+        )
         
-        conn.commit()
         return True
-    except sqlite3.Error as e:
-        print(f"Database initialization error: {e}")
-        return False
-    finally:
-        conn.close()
 
-def migrate_challenges_tables():
-    """Migrate existing tables if needed"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def update_generation_job(job_key, owner, stage=None):
+    """Refresh the owner's heartbeat and optionally record the current stage"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            UPDATE generation_jobs
+            SET heartbeat_at = ?, stage = COALESCE(?, stage)
+            WHERE job_key = ? AND owner = ? AND status = 'running'
+        """, (now_ms(), stage, job_key, owner))
+        
+        updated = cursor.rowcount > 0
+    return updated
+
+def finish_generation_job(job_key, owner, result_path=None, error=None):
+    """Mark a generation job as done (with its artifact) or failed"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        now = now_ms()
+        
+        cursor.execute("""
+            UPDATE generation_jobs
+            SET status = ?, result_path = ?, error = ?, heartbeat_at = ?, finished_at = ?
+            WHERE job_key = ? AND owner = ?
+        """, ('done' if result_path else 'failed', result_path, error, now, now, job_key, owner))
+
+def get_generation_job(job_key):
+    """Get the current state of a generation job"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM generation_jobs WHERE job_key = ?", (job_key,))
+        job = cursor.fetchone()
     
-    try:
-        # Check if test_cases column exists
-        cursor.execute("PRAGMA table_info(code_challenges)")
-        columns = [col[1] for col in cursor.fetchall()]
+    if not job:
+        return None
+    
+    job = dict(job)
+    job['stale'] = job['status'] == 'running' and now_ms() - (job['heartbeat_at'] or 0) >= JOB_STALE_SECONDS * 1000
+    return job
+
+def save_job_checkpoint(job_key, stage, value):
+    """Record the artifact (text or file path) produced by a finished pipeline stage"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
         
-        if 'test_cases' not in columns:
-            print("Adding missing test_cases column...")
-            cursor.execute("ALTER TABLE code_challenges ADD COLUMN test_cases TEXT")
-            conn.commit()
-            print("Migration complete!")
+        cursor.execute("""
+            INSERT OR REPLACE INTO job_checkpoints (job_key, stage, value, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (job_key, stage, value, now_ms()))
+
+def get_job_checkpoints(job_key):
+    """Get the recorded stage artifacts of a job as a dict of stage -> value"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT stage, value FROM job_checkpoints WHERE job_key = ?", (job_key,))
+        checkpoints = {row['stage']: row['value'] for row in cursor.fetchall()}
+    return checkpoints
+
+def clear_job_checkpoints(job_key):
+    """Forget a job's stage artifacts once it has completed"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM job_checkpoints WHERE job_key = ?", (job_key,))
+
+def save_video_assets(video_path, topic, duration, poster_path, sprite_path, sprite_interval,
+                      sprite_columns, sprite_rows, tile_width, tile_height):
+    """Record the poster and thumbnail sprite generated for a video"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT OR REPLACE INTO video_assets
+            (video_path, topic, duration, poster_path, sprite_path, sprite_interval,
+             sprite_columns, sprite_rows, tile_width, tile_height)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (video_path, topic, duration, poster_path, sprite_path, sprite_interval,
+              sprite_columns, sprite_rows, tile_width, tile_height))
+
+def get_video_assets(topics):
+    """Get the most recent preview assets for each of the given topics"""
+    if not topics:
+        return {}
+    
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        placeholders = ", ".join("?" for _ in topics)
+        cursor.execute(f"""
+            SELECT * FROM video_assets
+            WHERE topic IN ({placeholders})
+            ORDER BY created_at
+        """, list(topics))
+        
+        # Later rows win, so each topic maps to its newest video
+        assets = {row['topic']: dict(row) for row in cursor.fetchall()}
+    return assets
+
+def save_user_session(user_id, state):
+    """Store a user's in-progress state (a dict or a JSON string)"""
+    if isinstance(state, dict):
+        state = json.dumps(state)
+    
+    try:
+        with unit_of_work() as conn:
+            conn.execute("""
+                INSERT INTO user_sessions (user_id, state, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    state = excluded.state,
+                    updated_at = excluded.updated_at
+            """, (user_id, state, now_ms()))
         return True
     except sqlite3.Error as e:
-        print(f"Migration error: {e}")
+        print(f"Error saving session state: {e}")
         return False
+
+def load_user_session(user_id):
+    """Get a user's stored in-progress state, or None if there is none"""
+    with unit_of_work() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT state FROM user_sessions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+    
+    if not row:
+        return None
+    try:
+        return json.loads(row['state'])
+    except json.JSONDecodeError:
+        return None
+
+def explain_query_plan(conn, sql):
+    """Get the EXPLAIN QUERY PLAN steps of a statement"""
+    return [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+def find_full_scans(plan):
+    """Return the plan steps that read a whole table instead of using an index"""
+    # "SCAN (subquery-N)" reads an already-filtered subquery result and "SCAN CONSTANT ROW"
+    # a SELECT without FROM, neither of them a table
+    return [step for step in plan if step.startswith("SCAN ") and "INDEX" not in step
+            and not step.startswith(("SCAN (subquery", "SCAN CONSTANT ROW"))]
+
+def check_query_plans(scratch_path, user_id=1):
+    """Run the hot-path helpers with SQL tracing and return the plan of every statement.
+
+    The helpers write sample rows, so they run on a connection to scratch_path,
+    a throwaway database or a copy of the real one (db_admin.py check-plans
+    makes one); it is migrated first. Returns a list of (sql, plan, full_scans).
+    """
+    if os.path.abspath(scratch_path) == os.path.abspath(DB_PATH):
+        raise ValueError("check_query_plans writes sample rows; pass a scratch database, not DB_PATH")
+    if not apply_migrations(scratch_path):
+        raise RuntimeError(f"could not migrate {scratch_path}")
+
+    global _activity_writer
+    conn = _connect(scratch_path)
+    # Point this thread's helpers at the scratch connection for the duration of the check,
+    # with activity events written in the helpers' own units of work
+    outer = getattr(_thread_state, "conn", None), getattr(_thread_state, "depth", 0)
+    _thread_state.conn, _thread_state.depth = conn, 0
+    outer_writer, _activity_writer = _activity_writer, _InlineActivityWriter()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        log_video_watched(user_id, "Query Plan Check")
+        log_quiz_attempt(user_id, "Query Plan Check", 1, 1, {
+            "questions": [{"question": "Query Plan Check?", "options": ["a", "b"], "correct_answer": "a"}],
+            "answers": {0: "a"}
+        })
+        update_user_challenge(user_id, 1, completed=False, code="")
+        save_user_session(user_id, {})
+        load_user_session(user_id)
+        get_user_progress(user_id)
+        get_user_stats(user_id)
+        get_question_stats(user_id=user_id)
+        get_activity_trend(user_id)
+        get_user_challenges_progress(user_id)
+        get_video_assets(["Query Plan Check"])
+        get_job_checkpoints("query-plan-check")
+        get_generation_job("query-plan-check")
+    finally:
+        conn.set_trace_callback(None)
+        _thread_state.conn, _thread_state.depth = outer
+        _activity_writer = outer_writer
+        # The dashboard cache now holds the scratch database's view of the user
+        invalidate_user_cache(user_id)
+    
+    try:
+        results = []
+        for sql in dict.fromkeys(statements):
+            if not sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE")):
+                continue
+            plan = explain_query_plan(conn, sql)
+            results.append((sql, plan, find_full_scans(plan)))
+        return results
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
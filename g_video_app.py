@@ -0,0 +1,155 @@
+# g_video_app.py - standalone Streamlit entry point for the tutorial video generator
+import streamlit as st
+from g_video_gen import (
+    setup_gemini_api, generate_script, generate_manim_code,
+    render_manim_animation, generate_audio, merge_video_audio
+)
+
+# Set page config
+st.set_page_config(
+    page_title="Python Tutorial Generator",
+    page_icon="🐍",
+    layout="wide"
+)
+
+# App title and description
+st.title("🐍 Python Tutorial Video Generator")
+st.markdown("""
+This application generates educational Python tutorial videos using AI. 
+It creates a script, Manim animation, and voice narration for any Python topic you choose.
+""")
+
+# Session state initialization
+if 'script' not in st.session_state:
+    st.session_state.script = None
+if 'manim_code' not in st.session_state:
+    st.session_state.manim_code = None
+if 'video_path' not in st.session_state:
+    st.session_state.video_path = None
+if 'audio_path' not in st.session_state:
+    st.session_state.audio_path = None
+if 'final_video_path' not in st.session_state:
+    st.session_state.final_video_path = None
+if 'api_key_valid' not in st.session_state:
+    st.session_state.api_key_valid = False
+
+# Sidebar for configuration
+with st.sidebar:
+    st.header("Configuration")
+    
+    # API Key input
+    api_key = st.text_input("Gemini API Key", type="password",  help="Get your Gemini API key from Google AI Studio")
+    
+    if st.button("Validate API Key"):
+        if api_key:
+            if setup_gemini_api(api_key):
+                st.session_state.api_key_valid = True
+                st.success("API key is valid!")
+            else:
+                st.session_state.api_key_valid = False
+                st.error("Invalid API key. Please check and try again.")
+        else:
+            st.warning("Please enter an API key.")
+    
+    # Topic input
+    topic = st.text_input("Python Topic",  help="Enter a Python topic (e.g., 'Python Lists', 'Recursion', 'For Loops')")
+    
+    # Generation button
+    generate_button = st.button("Generate Tutorial", disabled=not (st.session_state.api_key_valid and topic))
+
+# Main content area
+if generate_button and topic:
+    # Reset session state for a new generation
+    st.session_state.script = None
+    st.session_state.manim_code = None
+    st.session_state.video_path = None
+    st.session_state.audio_path = None
+    st.session_state.final_video_path = None
+    
+    # Step 1: Generate script
+    st.header("Step 1: Generate Script")
+    st.session_state.script = generate_script(topic)
+    
+    if st.session_state.script:
+        st.success("Script generated successfully!")
+        st.subheader("Generated Script")
+        st.text_area("Script", st.session_state.script, height=300)
+        
+        # Step 2: Generate Manim code
+        st.header("Step 2: Generate Animation Code")
+        st.session_state.manim_code = generate_manim_code(topic, st.session_state.script)
+        
+        if st.session_state.manim_code:
+            st.success("Animation code generated successfully!")
+            st.subheader("Generated Manim Code")
+            st.code(st.session_state.manim_code, language="python")
+            
+            # Step 3: Render animation
+            st.header("Step 3: Render Animation")
+            st.session_state.video_path = render_manim_animation(st.session_state.manim_code, topic)
+            
+            if st.session_state.video_path:
+                st.success("Animation rendered successfully!")
+                st.subheader("Generated Animation")
+                st.video(st.session_state.video_path)
+                
+                # Step 4: Generate audio
+                st.header("Step 4: Generate Voice Narration")
+                st.session_state.audio_path = generate_audio(st.session_state.script, topic)
+                
+                if st.session_state.audio_path:
+                    st.success("Voice narration generated successfully!")
+                    st.subheader("Generated Audio")
+                    st.audio(st.session_state.audio_path)
+                    
+                    # Step 5: Merge video and audio
+                    st.header("Step 5: Create Final Tutorial")
+                    st.session_state.final_video_path = merge_video_audio(
+                        st.session_state.video_path, 
+                        st.session_state.audio_path, 
+                        topic
+                    )
+                    
+                    if st.session_state.final_video_path:
+                        st.success("🎉 Tutorial video created successfully!")
+                        st.subheader("Final Tutorial Video")
+                        st.video(st.session_state.final_video_path)
+                        
+                        # Download button
+                        with open(st.session_state.final_video_path, "rb") as file:
+                            st.download_button(
+                                label="Download Tutorial Video",
+                                data=file,
+                                file_name=f"{topic.replace(' ', '_')}_tutorial.mp4",
+                                mime="video/mp4"
+                            )
+                    else:
+                        st.error("Failed to merge video and audio.")
+                else:
+                    st.error("Failed to generate audio narration.")
+            else:
+                st.error("Failed to render animation.")
+        else:
+            st.error("Failed to generate animation code.")
+    else:
+        st.error("Failed to generate script.")
+
+# If nothing has been generated yet, show instructions
+if not st.session_state.script:
+    st.info("""
+    ### How to use this app:
+    1. Enter your Gemini API key in the sidebar
+    2. Enter a Python topic you want to learn about
+    3. Click 'Generate Tutorial' to create your custom tutorial video
+    4. Wait for the process to complete (it may take a few minutes)
+    5. Download your finished tutorial video
+    
+    This app will create a complete educational video with:
+    - A detailed script explaining the Python topic
+    - Animated visualizations created with Manim
+    - Professional voice narration
+    """)
+
+# Footer
+st.markdown("---")
+st.markdown("Made with ❤️ using Streamlit, Gemini AI, Manim, and gTTS")
\ No newline at end of file
@@ -1,5 +1,4 @@
 import os
-import google.generativeai as genai
 import subprocess
 import json
 import hashlib
@@ -7,28 +6,28 @@ import glob
 import shutil
 import re
 import sys
+import ast
+import asyncio
+import textwrap
+import concurrent.futures
 import threading
 import tempfile
-import streamlit as st
-from gtts import gTTS
-from pydub import AudioSegment
-from moviepy.editor import VideoFileClip, AudioFileClip
-from moviepy.editor import vfx
-import tempfile  # Add this if not already imported
-
-# Set page config
-st.set_page_config(
-    page_title="Python Tutorial Generator",
-    page_icon="🐍",
-    layout="wide"
+import time
+import uuid
+import socket
+from genai_client import get_genai
+from manim_templates import build_template_sections, SHARED_SEGMENT_SCENES
+from db_utils import (
+    claim_generation_job, update_generation_job,
+    finish_generation_job, get_generation_job, save_video_assets,
+    save_job_checkpoint, get_job_checkpoints, clear_job_checkpoints, close_thread_connection
 )
 
-# App title and description
-st.title("🐍 Python Tutorial Video Generator")
-st.markdown("""
-This application generates educational Python tutorial videos using AI. 
-It creates a script, Manim animation, and voice narration for any Python topic you choose.
-""")
+# The pipeline also runs in workers without Streamlit; status output goes to the console there
+try:
+    import streamlit as st
+except ImportError:
+    from headless_ui import st
 
 # Configure Gemini API
 def setup_gemini_api(api_key=None):
@@ -36,14 +35,13 @@ def setup_gemini_api(api_key=None):
     try:
         # If no API key is provided, try to get it from environment variables
         if api_key is None:
-            import os
             api_key = os.getenv("GEMINI_API_KEY")
             if not api_key:
                 st.error("No API key found in environment variables")
                 return False
         
         # Configure Gemini with the API key
-        genai.configure(api_key=api_key)
+        get_genai().configure(api_key=api_key)
         return True
     except Exception as e:
         st.error(f"Failed to configure Gemini API: {str(e)}")
@@ -53,7 +51,7 @@ def setup_gemini_api(api_key=None):
 def generate_script(topic):
     try:
         with st.spinner("Generating script with Gemini..."):
-            model = genai.GenerativeModel('gemini-1.5-pro')
+            model = get_genai().GenerativeModel('gemini-1.5-pro')
             generation_config = {
                 "temperature": 0.2,
                 "max_output_tokens": 8192
@@ -243,10 +241,16 @@ class {safe_topic}(Scene):
 """
 
 # Generate Manim code using Gemini API
-def generate_manim_code(topic, script):
+def generate_manim_code(topic, script, mode=None):
+    if MANIM_TEMPLATES_ENABLED:
+        template_code = generate_template_manim_code(topic, script)
+        if template_code:
+            return template_code
+    if (mode or MANIM_CODEGEN_MODE) == "per_section":
+        return generate_manim_code_per_section(topic, script)
     try:
         with st.spinner("Generating Manim animation code with Gemini..."):
-            model = genai.GenerativeModel('gemini-1.5-pro')
+            model = get_genai().GenerativeModel('gemini-1.5-pro')
             generation_config = {
                 "temperature": 0.2,
                 "max_output_tokens": 8192
@@ -280,6 +284,7 @@ def generate_manim_code(topic, script):
               14. CRITICAL: Each method must properly clean up all elements with FadeOut before ending
               15.VERY CRITICAL: Do not overwrite,Make sure you donot overwrite
               16.VERY VERY CRITICAL : Each section should be around 50 seconds which is very important
+            {SHARED_INTRO_NOTE if SHARED_SEGMENTS_ENABLED else ""}
 
             Your response should contain only the complete Python code with no explanations, like this:
 
@@ -344,53 +349,420 @@ def generate_manim_code(topic, script):
         st.error(f"Failed to generate Manim code: {str(e)}")
         return f"Error generating Manim code for {topic}. Please try again."
 
-def render_manim_animation(manim_code, topic):
+# Splice the shared, pre-rendered intro and outro around every tutorial at merge time
+SHARED_SEGMENTS_ENABLED = os.getenv("SHARED_SEGMENTS", "1") != "0"
+
+# Tells the LLM not to spend render time on a title card the shared intro already provides
+SHARED_INTRO_NOTE = """
+            A shared branded intro showing the topic title and a shared outro are added
+            automatically, so do not create a separate title card or closing credits."""
+
+# Code generation mode: "single" (one call for the whole scene, the default) or
+# "per_section" (scaffold + concurrent section calls); opt in with MANIM_CODEGEN_MODE
+MANIM_CODEGEN_MODE = os.getenv("MANIM_CODEGEN_MODE", "single")
+
+# Extra attempts for a section whose generated method fails validation
+MANIM_SECTION_RETRIES = 2
+
+# Rules shared by every section prompt
+MANIM_SECTION_RULES = """
+              1. Write ONLY one method of an existing Manim Scene class, starting with "def {method}(self):"
+              2. The method should be 40-50 seconds in animation length; add self.wait() to reach that
+              3. Include engaging visual elements (arrows, highlights, color changes)
+              4. Use a clean, educational style with good typography
+              5. DO NOT use the Code class, ONLY use Text class for code examples
+              6. DO NOT use the t2c parameter in Text objects; color separate Text objects and group them with VGroup
+              7. Do not include any SVGs or images
+              8. Clean up every element with FadeOut before the method ends
+              9. Do not reference attributes or objects created by other methods
+"""
+
+def extract_code_block(text):
+    """Return the largest fenced code block in an LLM response, or the stripped text"""
+    code_blocks = re.findall(r'```(?:python|json)?(.*?)```', text, re.DOTALL)
+    if code_blocks:
+        return max(code_blocks, key=len).strip()
+    return text.strip()
+
+def create_default_scaffold(topic, script):
+    """Build a section plan from the script's paragraphs without calling the LLM"""
+    paragraphs = [p.strip() for p in script.split('\n\n') if p.strip()]
+    titles = ["Introduction", "Core Concepts", "Examples", "Common Operations", "Recap"]
+    chunk_size = max(1, -(-len(paragraphs) // len(titles)))
+    sections = []
+    for i, title in enumerate(titles):
+        chunk = paragraphs[i * chunk_size:(i + 1) * chunk_size]
+        if not chunk and sections:
+            break
+        sections.append({
+            "method": f"section_{i + 1}_{title.lower().replace(' ', '_')}",
+            "title": title if i else f"{topic}: {title}",
+            "summary": "\n".join(chunk) or topic
+        })
+    return sections
+
+def generate_manim_scaffold(topic, script):
+    """Ask the LLM for a short section plan: method name, title and summary per section"""
+    model = get_genai().GenerativeModel('gemini-1.5-pro')
+    generation_config = {
+        "temperature": 0.2,
+        "max_output_tokens": 1024
+    }
+
+    prompt = f"""
+            Plan a Manim educational video about "{topic}" based on this script:
+
+            {script}
+
+            Split the script into 5-6 consecutive sections.{SHARED_INTRO_NOTE if SHARED_SEGMENTS_ENABLED else ""}
+            Respond with ONLY a JSON array, where each element has:
+              - "method": a snake_case Python method name for the section
+              - "title": a short on-screen title
+              - "summary": the script content and code examples this section must show
+            """
+
     try:
-        with st.spinner("Rendering animation (this may take a few minutes)..."):
-            # Create a unique temporary directory for rendering
-            temp_dir = tempfile.mkdtemp()
-            
-            # Status placeholder for tracking progress
-            status_placeholder = st.empty()
-            status_placeholder.info("Setting up Manim rendering environment...")
-            
-            try:
-                # Validate the code
-                is_valid, result = validate_manim_code(manim_code)
-                if not is_valid:
-                    status_placeholder.error(f"Generated Manim code has syntax errors: {result}")
-                    status_placeholder.info("Attempting to fix the code...")
-                    fixed_code = manim_code
-                    for delimiter in ["```python", "```", "'''python", "'''"]:
-                        if delimiter in fixed_code:
-                            parts = fixed_code.split(delimiter)
-                            if len(parts) > 1:
-                                fixed_code = parts[1]
-                                break
-                    fixed_code = fixed_code.strip()
-                    is_valid, result = validate_manim_code(fixed_code)
-                    if not is_valid:
-                        status_placeholder.error(f"Could not fix code: {result}")
-                        return None
-                    manim_code = fixed_code
-                else:
-                    manim_code = result
+        response = model.generate_content(prompt, generation_config=generation_config)
+        sections = json.loads(extract_code_block(response.text))
+        plan = []
+        for section in sections:
+            # The LLM's name only supplies a slug: the section_{n}_ prefix keeps names unique
+            # and clear of Scene's own methods (setup, render, play, wait, ...)
+            slug = re.sub(r'\W+', '_', str(section.get("method", ""))).strip('_').lower()[:40].strip('_')
+            method = f"section_{len(plan) + 1}_{slug}" if slug else f"section_{len(plan) + 1}"
+            plan.append({
+                "method": method,
+                "title": str(section.get("title") or topic),
+                "summary": str(section.get("summary") or "")
+            })
+        if plan:
+            return plan
+    except Exception as e:
+        print(f"Scaffold generation failed, using script paragraphs: {e}")
+    return create_default_scaffold(topic, script)
 
-                # Prepare class and file names
-                safe_topic = topic.replace(' ', '_').replace("'", "").replace('"', '')
-                class_name = topic.replace(' ', '').replace('-', '_')
+def validate_section_method(method_code, method_name):
+    """Check that generated code is exactly one valid method with the expected name.
 
-                # Ensure we use absolute paths for media output
-                media_dir = os.path.join(temp_dir, "media")
-                os.makedirs(media_dir, exist_ok=True)
-                
-                # Create the necessary subdirectories
-                for quality in ["720p30", "1080p60", "480p15"]:
-                    os.makedirs(os.path.join(media_dir, "videos", quality), exist_ok=True)
-                    os.makedirs(os.path.join(media_dir, "videos", quality, "partial_movie_files", class_name), exist_ok=True)
-                
-                # Add rendering code with explicit quality and output path settings
-                render_code = f"""
+    Returns (is_valid, normalized method source indented for the class body, or error).
+    """
+    code = textwrap.dedent(extract_code_block(method_code)).strip()
+    # Drop imports or class wrappers the model may add around the method
+    def_match = re.search(rf'^\s*def\s+{re.escape(method_name)}\s*\(', code, re.MULTILINE)
+    if not def_match:
+        return False, f"No method named {method_name} found"
+    code = textwrap.dedent(code[def_match.start():])
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return False, f"Syntax error: {e}"
+
+    functions = [node for node in tree.body if isinstance(node, ast.FunctionDef)]
+    if len(functions) != 1 or len(tree.body) != 1 or functions[0].name != method_name:
+        return False, "Response must contain exactly one method definition"
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.keyword) and node.arg == "t2c":
+            return False, "The t2c parameter is not allowed"
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("Code", "SVGMobject", "ImageMobject"):
+            return False, f"{node.func.id} is not allowed"
+
+    return True, textwrap.indent(code, "    ")
+
+def create_fallback_section_method(method_name, title, summary):
+    """Create a simple, always-valid section method showing a title and key lines"""
+    points = [line.strip() for line in summary.splitlines() if line.strip()][:3] or [title]
+    lines = [
+        f"    def {method_name}(self):",
+        f"        title = Text({title[:50]!r}, font_size=40, color=BLUE)",
+        "        title.to_edge(UP)",
+        "        self.play(Write(title))",
+        "        self.wait(2)",
+        "",
+        "        points = VGroup(",
+    ]
+    for point in points:
+        lines.append(f"            Text({('• ' + point[:60])!r}, font_size=24),")
+    lines += [
+        "        ).arrange(DOWN, aligned_edge=LEFT, buff=0.5)",
+        "        points.next_to(title, DOWN, buff=1)",
+        "",
+        "        for point in points:",
+        "            self.play(Write(point))",
+        "            self.wait(8)",
+        "",
+        "        self.wait(10)",
+        "        self.play(FadeOut(title), FadeOut(points))",
+    ]
+    return "\n".join(lines)
+
+def assemble_manim_class(safe_topic, sections, methods):
+    """Join section methods into a Scene class whose construct calls each in order"""
+    construct_lines = [f"class {safe_topic}(Scene):", "    def construct(self):"]
+    for section in sections:
+        construct_lines.append(f"        self.{section['method']}()")
+        construct_lines.append("        self.wait(0.1)")
+    body = "\n\n".join(methods[section["method"]] for section in sections)
+    return "from manim import *\n\n" + "\n".join(construct_lines) + "\n\n" + body + "\n"
+
+async def _generate_section_method(model, topic, section, previous_error=None):
+    """Generate and validate one section method with an async LLM call"""
+    generation_config = {
+        "temperature": 0.2,
+        "max_output_tokens": 2048
+    }
+
+    prompt = f"""
+            Write one section of a Manim educational video about "{topic}".
+
+            Section title: {section['title']}
+            Section content:
+            {section['summary']}
+
+            Requirements:
+            {MANIM_SECTION_RULES.format(method=section['method'])}
+
+            Respond with only the Python code of the method "{section['method']}".
+            """
+    if previous_error:
+        prompt += f"\n            Your previous attempt was rejected: {previous_error}. Fix this.\n"
+
+    try:
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        return validate_section_method(response.text, section["method"])
+    except Exception as e:
+        return False, str(e)
+
+async def _generate_section_methods(topic, sections):
+    """Generate every section concurrently, retrying only the sections that failed"""
+    model = get_genai().GenerativeModel('gemini-1.5-pro')
+    methods = {}
+    errors = {}
+    pending = list(sections)
+
+    for attempt in range(1 + MANIM_SECTION_RETRIES):
+        if not pending:
+            break
+        results = await asyncio.gather(*[
+            _generate_section_method(model, topic, section, errors.get(section["method"]))
+            for section in pending
+        ])
+        still_pending = []
+        for section, (is_valid, result) in zip(pending, results):
+            if is_valid:
+                methods[section["method"]] = result
+            else:
+                print(f"Section {section['method']} failed attempt {attempt + 1}: {result}")
+                errors[section["method"]] = result
+                still_pending.append(section)
+        pending = still_pending
+
+    # Sections that never validated get a deterministic method instead of sinking the video
+    for section in pending:
+        methods[section["method"]] = create_fallback_section_method(
+            section["method"], section["title"], section["summary"]
+        )
+    return methods
+
+def generate_manim_code_per_section(topic, script):
+    """Generate Manim code as a small scaffold plus concurrently generated section methods"""
+    try:
+        with st.spinner("Generating Manim animation code section by section with Gemini..."):
+            safe_topic = topic.replace(' ', '').replace('-', '_')
+            sections = generate_manim_scaffold(topic, script)
+            methods = asyncio.run(_generate_section_methods(topic, sections))
+            return assemble_manim_class(safe_topic, sections, methods)
+    except Exception as e:
+        st.error(f"Failed to generate Manim code: {str(e)}")
+        return f"Error generating Manim code for {topic}. Please try again."
+
+# Use the template library for common topics instead of LLM code generation
+MANIM_TEMPLATES_ENABLED = os.getenv("MANIM_TEMPLATES", "1") != "0"
+
+# Rendered scenes and sections, keyed by a hash of their source and render settings
+RENDER_CACHE_DIR = os.path.join("output", "cache")
+RENDER_SETTINGS = "medium_quality@30fps"
+
+# Size the render cache is pruned back to, least recently used clips first
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Clips used within this many seconds are never evicted, so renders in progress keep their parts
+RENDER_CACHE_MIN_AGE_SECONDS = 60 * 60
+
+# Attempts at an LLM repair of a failing section before using the fallback scene
+MANIM_REPAIR_ATTEMPTS = 2
+
+# Trailing stderr lines sent to the LLM when asking for a repair
+REPAIR_TRACEBACK_LINES = 40
+
+def find_scene_class(manim_code, default_name):
+    """Return the name of the first Scene subclass in the code, or default_name"""
+    try:
+        tree = ast.parse(manim_code)
+    except SyntaxError:
+        return default_name
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any(getattr(base, "id", None) == "Scene" for base in node.bases):
+            return node.name
+    return default_name
+
+def _find_class_node(tree, class_name):
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            return node
+    return None
+
+def split_manim_sections(manim_code, class_name):
+    """Return the section methods construct() calls, in order.
+
+    Returns an empty list when construct() does anything other than call
+    section methods and wait, in which case the scene must be rendered whole.
+    """
+    try:
+        class_node = _find_class_node(ast.parse(manim_code), class_name)
+    except SyntaxError:
+        return []
+    if not class_node:
+        return []
+
+    methods = {item.name: item for item in class_node.body if isinstance(item, ast.FunctionDef)}
+    construct = methods.get("construct")
+    if not construct:
+        return []
+
+    sections = []
+    for stmt in construct.body:
+        if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)):
+            return []
+        func = stmt.value.func
+        if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "self"):
+            return []
+        if func.attr == "wait":
+            continue
+        if func.attr not in methods or func.attr in sections:
+            return []
+        sections.append(func.attr)
+    return sections
+
+def sections_share_state(manim_code, class_name, sections):
+    """Whether a section reads a self attribute another section sets, so it can't render on its own"""
+    class_node = _find_class_node(ast.parse(manim_code), class_name)
+    methods = {item.name: item for item in class_node.body if isinstance(item, ast.FunctionDef)}
+
+    def self_attributes(method, ctx):
+        for node in ast.walk(method):
+            if (isinstance(node, ast.Attribute) and isinstance(node.ctx, ctx)
+                    and isinstance(node.value, ast.Name) and node.value.id == "self"):
+                yield node.attr
+
+    setters = {}
+    for name in sections:
+        for attr in self_attributes(methods[name], ast.Store):
+            setters.setdefault(attr, set()).add(name)
+    return any(
+        setters.get(attr, {name}) - {name}
+        for name in sections
+        for attr in self_attributes(methods[name], ast.Load)
+    )
+
+def plan_scene_sections(manim_code, class_name):
+    """Return the section methods that can each render on their own, in order.
+
+    Returns an empty list when the scene must be rendered whole: construct()
+    does more than call sections, or a section reads state an earlier one left
+    on self.
+    """
+    sections = split_manim_sections(manim_code, class_name)
+    if sections and sections_share_state(manim_code, class_name, sections):
+        return []
+    return sections
+
+def get_method_source(manim_code, class_name, method_name):
+    """Return the source of one method of the scene class"""
+    class_node = _find_class_node(ast.parse(manim_code), class_name)
+    for item in class_node.body:
+        if isinstance(item, ast.FunctionDef) and item.name == method_name:
+            lines = manim_code.splitlines()
+            return "\n".join(lines[item.lineno - 1:item.end_lineno])
+    return None
+
+def replace_method_source(manim_code, class_name, method_name, method_source):
+    """Swap one method of the scene class for new, already indented source"""
+    class_node = _find_class_node(ast.parse(manim_code), class_name)
+    for item in class_node.body:
+        if isinstance(item, ast.FunctionDef) and item.name == method_name:
+            lines = manim_code.splitlines()
+            lines[item.lineno - 1:item.end_lineno] = method_source.splitlines()
+            return "\n".join(lines) + "\n"
+    return manim_code
+
+def repair_manim_code(topic, source, error_lines, method_name=None):
+    """Ask the LLM to fix a section (or whole scene) that failed to render.
+
+    Returns (is_valid, fixed source or error) validated the same way as newly
+    generated code.
+    """
+    model = get_genai().GenerativeModel('gemini-1.5-pro')
+    generation_config = {
+        "temperature": 0.2,
+        "max_output_tokens": 2048 if method_name else 8192
+    }
+    target = f'the method "{method_name}"' if method_name else "the complete Scene class"
+    traceback_text = "\n".join(error_lines[-REPAIR_TRACEBACK_LINES:])
+
+    prompt = f"""
+            The following Manim code for an educational video about "{topic}" failed to render.
+
+            Code:
+            ```python
+            {source}
+            ```
+
+            Error output:
+            {traceback_text}
+
+            Fix the error with the smallest possible change. Keep the same animations,
+            text and timing. DO NOT use the Code class or the t2c parameter.
+            Respond with only the corrected Python code of {target}.
+            """
+
+    try:
+        response = model.generate_content(prompt, generation_config=generation_config)
+        if method_name:
+            return validate_section_method(response.text, method_name)
+        return validate_manim_code(extract_code_block(response.text))
+    except Exception as e:
+        return False, str(e)
+
+def render_manim_scene(manim_code, class_name, work_dir, section_method=None, section_index=0):
+    """Render the scene class, or only one of its section methods, in a subprocess.
+
+    Returns (video_path or None, stdout lines, stderr lines).
+    """
+    scene_name = f"{class_name}Section{section_index + 1}" if section_method else class_name
+    cache_path = os.path.join(RENDER_CACHE_DIR, f"{render_cache_key(manim_code, class_name, section_method)}.mp4")
+    if use_cached_render(cache_path):
+        return cache_path, [], []
+
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+
+    # Create the necessary subdirectories
+    for quality in ["720p30", "1080p60", "480p15"]:
+        os.makedirs(os.path.join(media_dir, "videos", quality, "partial_movie_files", scene_name), exist_ok=True)
+
+    section_code = ""
+    if section_method:
+        # A subclass whose construct only plays this one section
+        section_code = f"""
+class {scene_name}({class_name}):
+    def construct(self):
+        self.{section_method}()
+"""
+
+    # Add rendering code with explicit quality and output path settings
+    render_code = f"""
 # Configure Manim with explicit paths
 import os
 from manim import config
@@ -399,111 +771,280 @@ from manim import config
 config.quality = "medium_quality"  # 720p30, less resource-intensive
 config.frame_rate = 30
 config.media_dir = r"{media_dir.replace(os.sep, '/')}"
-config.output_file = r"{class_name}"
+config.output_file = r"{scene_name}"
 
 # Render the scene
 if __name__ == "__main__":
-    scene = {class_name}()
+    scene = {scene_name}()
     scene.render()
 """
-                manim_code = manim_code.rstrip() + "\n\n" + render_code
-
-                # Save the Manim code to a file in the temp directory with UTF-8 encoding
-                script_file = os.path.join(temp_dir, f"{safe_topic}.py")
-                with open(script_file, 'w', encoding='utf-8') as f:
-                    f.write(manim_code)
+    script_file = os.path.join(work_dir, f"{scene_name}.py")
+    with open(script_file, 'w', encoding='utf-8') as f:
+        f.write(manim_code.rstrip() + "\n\n" + section_code + "\n" + render_code)
+
+    # Execute the Python script inside the work directory
+    process = subprocess.Popen(
+        [sys.executable, script_file],
+        cwd=work_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1,
+        universal_newlines=True
+    )
+
+    # Read output without updating the Streamlit UI
+    stdout_output, stderr_output = [], []
+    def read_output(pipe, store):
+        for line in iter(pipe.readline, ''):
+            message = line.strip()
+            store.append(message)
+            print(f"Rendering: {message}")  # Only print to console, not to Streamlit
+
+    stdout_thread = threading.Thread(target=read_output, args=(process.stdout, stdout_output))
+    stderr_thread = threading.Thread(target=read_output, args=(process.stderr, stderr_output))
+    stdout_thread.start()
+    stderr_thread.start()
+    process.wait()
+    stdout_thread.join()
+    stderr_thread.join()
+
+    if process.returncode != 0:
+        return None, stdout_output, stderr_output
+    video_path = find_rendered_video(media_dir, scene_name)
+    if not video_path:
+        return None, stdout_output, stderr_output
+
+    # Publish to the cache atomically so concurrent renders never see a partial file
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    temp_cache_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    shutil.copy(video_path, temp_cache_path)
+    os.replace(temp_cache_path, cache_path)
+    prune_render_cache()
+    return cache_path, stdout_output, stderr_output
+
+def render_cache_key(manim_code, class_name, section_method=None):
+    """Hash what determines a render's output: the code and the render settings.
+
+    A section's key covers the whole module (imports, constants, the class and
+    its helpers) except the other section methods, so repairing one section
+    keeps the other sections' clips while any change to shared code misses.
+    """
+    source = manim_code
+    if section_method:
+        other_sections = set(split_manim_sections(manim_code, class_name)) - {section_method}
+        source = remove_methods(manim_code, class_name, other_sections)
+    key_text = f"{RENDER_SETTINGS}\n{section_method or class_name}\n{source}"
+    return hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+
+def remove_methods(manim_code, class_name, method_names):
+    """Return the code without the named methods of the scene class"""
+    class_node = _find_class_node(ast.parse(manim_code), class_name)
+    if not class_node or not method_names:
+        return manim_code
+    lines = manim_code.splitlines()
+    for item in sorted(class_node.body, key=lambda node: node.lineno, reverse=True):
+        if isinstance(item, ast.FunctionDef) and item.name in method_names:
+            start = min([item.lineno] + [decorator.lineno for decorator in item.decorator_list])
+            del lines[start - 1:item.end_lineno]
+    return "\n".join(lines)
+
+def use_cached_render(path):
+    """Return path if the clip is cached, marking it as recently used"""
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
 
-                # Change to the temp directory for rendering
-                original_cwd = os.getcwd()
-                os.chdir(temp_dir)
-                
-                status_placeholder.info(f"Starting Manim rendering process (check console for progress)...")
-                
-                # Execute the Python script with properly configured environment
-                command = f"{sys.executable} {script_file}"
-                
-                process = subprocess.Popen(
-                    command,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True
-                )
+def prune_render_cache(max_bytes=RENDER_CACHE_MAX_BYTES):
+    """Evict the least recently used clips until the render cache fits in max_bytes"""
+    entries = []
+    for path in glob.glob(os.path.join(RENDER_CACHE_DIR, "*.mp4")):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - RENDER_CACHE_MIN_AGE_SECONDS
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime > cutoff:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def find_rendered_video(media_dir, scene_name):
+    """Locate the MP4 Manim wrote for a scene"""
+    # Define potential paths with the absolute media directory
+    for quality in ["720p30", "1080p60", "480p15"]:
+        path = os.path.join(media_dir, "videos", quality, f"{scene_name}.mp4")
+        if os.path.exists(path):
+            return path
+
+    # If no direct match, search for partial movie files
+    for quality in ["720p30", "1080p60", "480p15"]:
+        partial_dir = os.path.join(media_dir, "videos", quality, "partial_movie_files", scene_name)
+        mp4_files = glob.glob(os.path.join(partial_dir, "*.mp4"))
+        if mp4_files:
+            return max(mp4_files, key=os.path.getctime)
+
+    # Last resort: recursive search for an MP4 named after the scene
+    mp4_files = glob.glob(os.path.join(media_dir, "**", f"{scene_name}*.mp4"), recursive=True)
+    if mp4_files:
+        return max(mp4_files, key=os.path.getctime)
+    return None
+
+def render_section_with_repair(manim_code, class_name, topic, work_dir, status_placeholder,
+                               section_method=None, section_index=0, failed_render=None):
+    """Render one section, repairing only that section with the LLM when it fails.
+
+    After MANIM_REPAIR_ATTEMPTS failed repairs the section is replaced by a
+    fallback scene. failed_render is the (stdout, stderr) of a render of this
+    exact code that already failed, so it isn't rendered again before the first
+    repair. Returns (video_path or None, possibly repaired manim_code).
+    """
+    label = section_method or class_name
+    if failed_render:
+        video_path, (stdout_output, stderr_output) = None, failed_render
+    else:
+        video_path, stdout_output, stderr_output = render_manim_scene(
+            manim_code, class_name, work_dir, section_method, section_index
+        )
+
+    for attempt in range(MANIM_REPAIR_ATTEMPTS):
+        if video_path:
+            return video_path, manim_code
+        status_placeholder.warning(
+            f"Rendering '{label}' failed, asking Gemini for a fix "
+            f"(attempt {attempt + 1} of {MANIM_REPAIR_ATTEMPTS})..."
+        )
+        source = get_method_source(manim_code, class_name, section_method) if section_method else manim_code
+        is_valid, fixed = repair_manim_code(topic, source, stderr_output or stdout_output, section_method)
+        if not is_valid:
+            print(f"Repair of {label} was rejected: {fixed}")
+            continue
+        if section_method:
+            manim_code = replace_method_source(manim_code, class_name, section_method, fixed)
+        else:
+            manim_code = fixed
+            class_name = find_scene_class(manim_code, class_name)
+        video_path, stdout_output, stderr_output = render_manim_scene(
+            manim_code, class_name, work_dir, section_method, section_index
+        )
+
+    if video_path:
+        return video_path, manim_code
+
+    # Out of repair attempts: use the fallback scene for this section
+    status_placeholder.warning(f"Using a simple fallback animation for '{label}'")
+    if section_method:
+        fallback = create_fallback_section_method(section_method, section_method.replace('_', ' ').title(), topic)
+        manim_code = replace_method_source(manim_code, class_name, section_method, fallback)
+    else:
+        manim_code = create_fallback_manim_class(topic, class_name)
+    video_path, stdout_output, stderr_output = render_manim_scene(
+        manim_code, class_name, work_dir, section_method, section_index
+    )
+    if not video_path:
+        status_placeholder.error(f"Manim render failed for '{label}'")
+        for line in (stderr_output or stdout_output)[-5:]:  # Show last 5 error lines
+            st.error(line)
+    return video_path, manim_code
+
+def generate_template_manim_code(topic, script):
+    """Build Manim code from the template library, or None when the topic needs the LLM"""
+    built = build_template_sections(topic, script, include_title_card=not SHARED_SEGMENTS_ENABLED)
+    if not built:
+        return None
+    sections, methods = built
+    class_name = re.sub(r'\W', '_', topic.replace(' ', '').replace('-', '_'))
+    if not class_name or class_name[0].isdigit():
+        class_name = f"Topic{class_name}"
+    return assemble_manim_class(class_name, sections, methods)
+
+def prepare_manim_code(manim_code, status_placeholder):
+    """Validate generated Manim code, stripping markdown wrappers; returns the code or None"""
+    is_valid, result = validate_manim_code(manim_code)
+    if is_valid:
+        return result
+
+    status_placeholder.error(f"Generated Manim code has syntax errors: {result}")
+    status_placeholder.info("Attempting to fix the code...")
+    fixed_code = manim_code
+    for delimiter in ["```python", "```", "'''python", "'''"]:
+        if delimiter in fixed_code:
+            parts = fixed_code.split(delimiter)
+            if len(parts) > 1:
+                fixed_code = parts[1]
+                break
+    fixed_code = fixed_code.strip()
+    is_valid, result = validate_manim_code(fixed_code)
+    if not is_valid:
+        status_placeholder.error(f"Could not fix code: {result}")
+        return None
+    return fixed_code
 
-                # Modified read_output function that doesn't update Streamlit UI
-                stdout_output, stderr_output = [], []
-                def read_output(pipe, store):
-                    for line in iter(pipe.readline, ''):
-                        message = line.strip()
-                        store.append(message)
-                        print(f"Rendering: {message}")  # Only print to console, not to Streamlit
-
-                stdout_thread = threading.Thread(target=read_output, args=(process.stdout, stdout_output))
-                stderr_thread = threading.Thread(target=read_output, args=(process.stderr, stderr_output))
-                stdout_thread.start()
-                stderr_thread.start()
-
-                # Wait for the process to complete
-                process.wait()
-                stdout_thread.join()
-                stderr_thread.join()
-
-                # Change back to original directory
-                os.chdir(original_cwd)
-
-                # Update status after threads are done
-                if process.returncode != 0:
-                    status_placeholder.error(f"Manim render failed with return code {process.returncode}")
-                    for line in stderr_output[-5:]:  # Show last 5 error lines
-                        st.error(line)
+def render_manim_animation(manim_code, topic):
+    try:
+        with st.spinner("Rendering animation (this may take a few minutes)..."):
+            # Create a unique temporary directory for rendering
+            temp_dir = tempfile.mkdtemp()
+            
+            # Status placeholder for tracking progress
+            status_placeholder = st.empty()
+            status_placeholder.info("Setting up Manim rendering environment...")
+            
+            try:
+                # Validate the code
+                manim_code = prepare_manim_code(manim_code, status_placeholder)
+                if not manim_code:
                     return None
-                else:
-                    status_placeholder.success("Manim rendering completed successfully!")
 
-                # Find the generated video file with absolute paths
-                video_path = None
-                
-                # Define potential paths with the absolute temp directory
-                potential_paths = [
-                    os.path.join(media_dir, "videos", "720p30", f"{class_name}.mp4"),
-                    os.path.join(media_dir, "videos", "1080p60", f"{class_name}.mp4"),
-                    os.path.join(media_dir, "videos", "480p15", f"{class_name}.mp4"),
-                ]
-                
-                for path in potential_paths:
-                    if os.path.exists(path):
-                        video_path = path
-                        break
-                
-                # If no direct match, search for partial movie files
-                if not video_path:
-                    for quality in ["720p30", "1080p60", "480p15"]:
-                        partial_dir = os.path.join(media_dir, "videos", quality, "partial_movie_files", class_name)
-                        if os.path.exists(partial_dir):
-                            mp4_files = glob.glob(os.path.join(partial_dir, "*.mp4"))
-                            if mp4_files:
-                                video_path = max(mp4_files, key=os.path.getctime)
-                                break
-                
-                # Last resort: Recursive search for any MP4 in the media directory
+                # Prepare class and file names
+                safe_topic = topic.replace(' ', '_').replace("'", "").replace('"', '')
+                class_name = find_scene_class(manim_code, topic.replace(' ', '').replace('-', '_'))
+
+                # Render the whole scene first; sections only render on their own to repair a failure
+                status_placeholder.info(f"Rendering {class_name} (check console for progress)...")
+                video_path, stdout_output, stderr_output = render_manim_scene(manim_code, class_name, temp_dir)
+                section_videos = [video_path] if video_path else []
                 if not video_path:
-                    mp4_files = glob.glob(os.path.join(media_dir, "**", "*.mp4"), recursive=True)
-                    if mp4_files:
-                        video_path = max(mp4_files, key=os.path.getctime)
+                    sections = plan_scene_sections(manim_code, class_name)
+                    if not sections:
+                        video_path, manim_code = render_section_with_repair(
+                            manim_code, class_name, topic, temp_dir, status_placeholder,
+                            failed_render=(stdout_output, stderr_output)
+                        )
+                        if not video_path:
+                            return None
+                        section_videos.append(video_path)
+                    # Otherwise render each section on its own, so only the failing one is repaired
+                    for index, section_method in enumerate(sections):
+                        status_placeholder.info(
+                            f"Rendering section {index + 1} of {len(sections)}: "
+                            f"{section_method} (check console for progress)..."
+                        )
+                        video_path, manim_code = render_section_with_repair(
+                            manim_code, class_name, topic, temp_dir, status_placeholder,
+                            section_method, index
+                        )
+                        if not video_path:
+                            return None
+                        section_videos.append(video_path)
                 
-                if not video_path or not os.path.exists(video_path):
-                    status_placeholder.error("Could not find rendered video file")
-                    for line in stdout_output[-10:]:  # Show last 10 lines of output
-                        st.error(f"Output: {line}")
-                    return None
-                
-                # Copy to a more permanent location in the Streamlit app directory
+                # Join the sections into a more permanent location in the Streamlit app directory
                 output_dir = "output"
                 os.makedirs(output_dir, exist_ok=True)
                 final_path = os.path.join(output_dir, f"{safe_topic}.mp4")
-                shutil.copy(video_path, final_path)
+                if len(section_videos) == 1:
+                    shutil.copy(section_videos[0], final_path)
+                else:
+                    concat_media_files(section_videos, final_path)
                 
                 status_placeholder.success(f"Video rendered successfully!")
                 return final_path
@@ -535,11 +1076,460 @@ def split_script_into_sections(script):
     paragraphs = [p for p in script.split('\n\n') if p.strip()]
     return {f"part{i+1}": section for i, section in enumerate(paragraphs)}
 
+# Extension -> codec ffmpeg uses for stream copy into that container
+AUDIO_CONTAINER_CODECS = {
+    ".mp3": "mp3",
+    ".m4a": "aac",
+    ".aac": "aac",
+    ".wav": "pcm_s16le",
+}
+
+# Chunk size used when piping PCM between ffmpeg processes
+PCM_CHUNK_SIZE = 64 * 1024
+
+def run_ffmpeg(args):
+    """Run ffmpeg with the given arguments and raise with its stderr on failure"""
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-v", "error"] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+
+def probe_audio_format(path):
+    """Return (codec, sample_rate, channels) of the first audio stream, or None"""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "a:0",
+            "-show_entries", "stream=codec_name,sample_rate,channels",
+            "-of", "json", path
+        ],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return None
+    streams = json.loads(result.stdout or "{}").get("streams", [])
+    if not streams:
+        return None
+    stream = streams[0]
+    return stream.get("codec_name"), stream.get("sample_rate"), stream.get("channels")
+
+def write_concat_list(paths, list_path):
+    """Write an ffmpeg concat demuxer list file for the given media paths"""
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+def concat_media_files(paths, output_path):
+    """Join media files that share a format using the concat demuxer (no re-encode)"""
+    list_fd, list_path = tempfile.mkstemp(suffix=".txt")
+    os.close(list_fd)
+    try:
+        write_concat_list(paths, list_path)
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
+
+def stream_pcm_concat(paths, output_path, sample_rate=24000, channels=1):
+    """Decode each file to PCM and stream it into a single encoder process"""
+    pcm_args = ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels)]
+    # The encoder's stderr goes to a file: an unread pipe would fill up and stall
+    # the encoder while we are still writing PCM to its stdin
+    with tempfile.TemporaryFile() as encoder_log:
+        encoder = subprocess.Popen(
+            ["ffmpeg", "-y", "-v", "error"] + pcm_args + ["-i", "pipe:0", output_path],
+            stdin=subprocess.PIPE,
+            stderr=encoder_log
+        )
+        try:
+            for path in paths:
+                decoder = subprocess.Popen(
+                    ["ffmpeg", "-v", "error", "-i", path] + pcm_args + ["pipe:1"],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL
+                )
+                try:
+                    shutil.copyfileobj(decoder.stdout, encoder.stdin, PCM_CHUNK_SIZE)
+                    returncode = decoder.wait()
+                except BrokenPipeError:
+                    # The encoder exited; its log below says why
+                    break
+                finally:
+                    # Never leave a decoder behind when the copy fails part way
+                    decoder.kill()
+                    decoder.wait()
+                    decoder.stdout.close()
+                if returncode != 0:
+                    raise RuntimeError(f"ffmpeg could not decode {path}")
+        finally:
+            try:
+                encoder.stdin.close()
+            except BrokenPipeError:
+                pass
+            encoder.wait()
+            encoder_log.seek(0)
+            encoder_error = encoder_log.read().decode(errors="replace")
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {encoder_error.strip()[-500:]}")
+    return output_path
+
+def concat_audio_files(audio_files, output_path):
+    """Join audio files in one pass with flat memory use.
+
+    When every input has the same codec, sample rate and channel layout and that
+    codec fits the output container, the files are joined with the concat demuxer
+    without re-encoding. Otherwise each file is decoded to PCM and piped into a
+    single encoder.
+    """
+    if not audio_files:
+        raise ValueError("No audio files to combine")
+
+    formats = {probe_audio_format(path) for path in audio_files}
+    output_codec = AUDIO_CONTAINER_CODECS.get(os.path.splitext(output_path)[1].lower())
+    if len(formats) == 1 and None not in formats:
+        codec, sample_rate, channels = formats.pop()
+        if codec == output_codec:
+            return concat_media_files(audio_files, output_path)
+        return stream_pcm_concat(audio_files, output_path, sample_rate, channels)
+    return stream_pcm_concat(audio_files, output_path)
+
+# Font file for title overlays; ffmpeg uses its default font when unset
+TITLE_OVERLAY_FONT_FILE = os.getenv("TITLE_OVERLAY_FONT_FILE")
+
+def get_shared_segment(name):
+    """Return the path of a shared segment (intro or outro), rendering it only once"""
+    class_name, scene_code = SHARED_SEGMENT_SCENES[name]
+    work_dir = tempfile.mkdtemp()
+    try:
+        video_path, _, stderr_output = render_manim_scene(scene_code, class_name, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if not video_path:
+        raise RuntimeError(f"Could not render shared segment '{name}': {' '.join(stderr_output[-3:])}")
+    return video_path
+
+def probe_media_format(path):
+    """Return the stream parameters a segment needs to be concatenated with this video"""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "stream=codec_type,width,height,r_frame_rate,pix_fmt,sample_rate,channels",
+            "-of", "json", path
+        ],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    media_format = {"sample_rate": "44100", "channels": 2}
+    for stream in json.loads(result.stdout).get("streams", []):
+        if stream.get("codec_type") == "video":
+            media_format.update(
+                width=stream["width"],
+                height=stream["height"],
+                frame_rate=stream["r_frame_rate"],
+                pix_fmt=stream.get("pix_fmt", "yuv420p")
+            )
+        elif stream.get("codec_type") == "audio":
+            media_format.update(sample_rate=stream["sample_rate"], channels=stream["channels"])
+    return media_format
+
+def _escape_filter_value(value):
+    """Make a path safe to place inside a single-quoted ffmpeg filter argument"""
+    return value.replace("\\", "/").replace("'", "")
+
+def prepare_segment(segment_path, reference_path, title=None):
+    """Encode a shared segment to match the reference video, with an optional title overlay.
+
+    The result is cached, so each segment/title/format combination is encoded once.
+    """
+    media_format = probe_media_format(reference_path)
+    key_text = f"{segment_path}\n{title}\n{json.dumps(media_format, sort_keys=True)}"
+    output_path = os.path.join(RENDER_CACHE_DIR, f"{hashlib.sha256(key_text.encode('utf-8')).hexdigest()}.mp4")
+    if use_cached_render(output_path):
+        return output_path
+
+    filters = [
+        f"scale={media_format['width']}:{media_format['height']}",
+        f"fps={media_format['frame_rate']}",
+        f"format={media_format['pix_fmt']}"
+    ]
+    text_fd, text_path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(text_fd, "w", encoding="utf-8") as f:
+        f.write(title or "")
+    if title:
+        drawtext = (
+            f"drawtext=textfile='{_escape_filter_value(text_path)}'"
+            ":fontcolor=white:fontsize=h/16:x=(w-text_w)/2:y=h*0.75"
+            ":alpha='min(1,max(0,(t-0.5)*2))'"
+        )
+        if TITLE_OVERLAY_FONT_FILE:
+            drawtext += f":fontfile='{_escape_filter_value(TITLE_OVERLAY_FONT_FILE)}'"
+        filters.append(drawtext)
+
+    layout = "mono" if int(media_format["channels"]) == 1 else "stereo"
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    temp_output = f"{output_path}.{uuid.uuid4().hex}.mp4"
+    try:
+        run_ffmpeg([
+            "-i", segment_path,
+            "-f", "lavfi", "-i", f"anullsrc=r={media_format['sample_rate']}:cl={layout}",
+            "-vf", ",".join(filters),
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c:v", "libx264", "-c:a", "aac", "-shortest",
+            temp_output
+        ])
+        os.replace(temp_output, output_path)
+        prune_render_cache()
+    finally:
+        os.remove(text_path)
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+    return output_path
+
+def splice_shared_segments(video_path, topic, output_path):
+    """Join the titled shared intro, the tutorial and the titled outro.
+
+    Only the short shared segments are encoded (to match the tutorial's format);
+    the tutorial itself is copied without re-encoding. Returns the time at which
+    the tutorial content starts.
+    """
+    intro = prepare_segment(get_shared_segment("intro"), video_path, title=topic)
+    outro = prepare_segment(get_shared_segment("outro"), video_path, title=f"You finished: {topic}")
+    concat_media_files([intro, video_path, outro], output_path)
+    return probe_duration(intro)
+
+# Narration languages offered to learners (gTTS language codes)
+NARRATION_LANGUAGES = {
+    "en": "English",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "pt": "Portuguese",
+    "hi": "Hindi",
+    "ta": "Tamil",
+    "zh-CN": "Chinese (Simplified)",
+    "ja": "Japanese"
+}
+
+# ISO 639-2 tags written into the audio track metadata of multi-language videos
+AUDIO_TRACK_LANGUAGE_TAGS = {
+    "en": "eng", "es": "spa", "fr": "fra", "de": "deu", "pt": "por",
+    "hi": "hin", "ta": "tam", "zh-CN": "zho", "ja": "jpn"
+}
+
+# Translated scripts, keyed by a hash of the English script and the language
+TRANSLATION_CACHE_DIR = os.path.join("output", "cache", "translations")
+
+def _lang_suffix(lang):
+    """File name suffix for narration in a language (English keeps the original names)"""
+    return "" if lang == "en" else f"_{lang}"
+
+def translate_script(script, lang):
+    """Translate a tutorial script for narration, caching the result on disk"""
+    if lang == "en":
+        return script
+
+    script_hash = hashlib.sha256(script.encode("utf-8")).hexdigest()
+    cache_path = os.path.join(TRANSLATION_CACHE_DIR, f"{script_hash}_{lang}.txt")
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return f.read()
+
+    with st.spinner(f"Translating script to {NARRATION_LANGUAGES.get(lang, lang)}..."):
+        model = get_genai().GenerativeModel('gemini-1.5-pro')
+        generation_config = {
+            "temperature": 0.2,
+            "max_output_tokens": 8192
+        }
+
+        prompt = f"""
+            Translate this Python tutorial narration script into {NARRATION_LANGUAGES.get(lang, lang)}.
+
+            Rules:
+            1. Keep the exact paragraph structure: the same number of paragraphs separated by blank lines
+            2. Do not translate Python code, identifiers or keywords
+            3. Respond with only the translated script
+
+            {script}
+            """
+
+        response = model.generate_content(prompt, generation_config=generation_config)
+        translated = response.text.strip()
+
+    os.makedirs(TRANSLATION_CACHE_DIR, exist_ok=True)
+    temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(translated)
+    os.replace(temp_path, cache_path)
+    return translated
+
+def probe_duration(path):
+    """Return a media file's duration in seconds"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+def tutorial_manifest_path(final_video_path):
+    """Path of the JSON manifest stored next to a final tutorial video"""
+    return os.path.splitext(final_video_path)[0] + ".json"
+
+def read_tutorial_manifest(final_video_path):
+    """Read the manifest of a final tutorial video, or an empty dict"""
+    try:
+        with open(tutorial_manifest_path(final_video_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_tutorial_manifest(final_video_path, **fields):
+    """Merge fields into the manifest stored next to a final tutorial video"""
+    manifest = read_tutorial_manifest(final_video_path)
+    manifest.update(fields)
+    manifest_path = tutorial_manifest_path(final_video_path)
+    temp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+def _fit_narration_filter(input_index, label, narration_duration, content_start, content_duration, total_duration):
+    """Build a filter that fits a narration track to the narrated part of the video.
+
+    The narration is time-stretched to the content's length, delayed past the
+    intro and padded to the full video length.
+    """
+    tempo = narration_duration / content_duration if content_duration > 0 else 1.0
+    tempo_filters = []
+    # atempo accepts factors between 0.5 and 2.0, so chain it for larger changes
+    while tempo > 2.0:
+        tempo_filters.append("atempo=2.0")
+        tempo /= 2.0
+    while tempo < 0.5:
+        tempo_filters.append("atempo=0.5")
+        tempo /= 0.5
+    tempo_filters.append(f"atempo={tempo:.6f}")
+    delay_ms = int(content_start * 1000)
+    return (
+        f"[{input_index}:a]{','.join(tempo_filters)},adelay={delay_ms}:all=1,"
+        f"apad,atrim=0:{total_duration:.3f}[{label}]"
+    )
+
+# Localized tutorials, one subdirectory per mux_language_tracks call
+LOCALIZED_DIR = os.path.join("output", "localized")
+
+# Localized call directories older than this are removed when a new call starts
+LOCALIZED_RETENTION_SECONDS = 24 * 60 * 60
+
+def prune_old_dirs(parent_dir, max_age_seconds):
+    """Remove the entries of parent_dir last modified more than max_age_seconds ago"""
+    cutoff = time.time() - max_age_seconds
+    for path in glob.glob(os.path.join(parent_dir, "*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+def mux_language_tracks(final_video_path, narration_paths, topic):
+    """Add narration tracks to an already merged tutorial without re-encoding its video.
+
+    narration_paths maps language codes to narration files. Returns a dict of
+    per-language MP4 files (video stream copied, one audio track each) plus a
+    "multi" entry holding a single MP4 with every language as its own audio track.
+    """
+    manifest = read_tutorial_manifest(final_video_path)
+    total_duration = probe_duration(final_video_path)
+    content_start = manifest.get("content_start", 0.0)
+    content_duration = manifest.get("content_duration", total_duration - content_start)
+    safe_topic = topic.replace(' ', '_').replace("'", "").replace('"', '')
+    # A directory per call, so concurrent sessions localizing the same topic never share files
+    output_dir = os.path.join(LOCALIZED_DIR, f"{safe_topic}_{uuid.uuid4().hex[:12]}")
+    prune_old_dirs(LOCALIZED_DIR, LOCALIZED_RETENTION_SECONDS)
+    os.makedirs(output_dir, exist_ok=True)
+
+    outputs = {}
+    filters = []
+    for i, (lang, narration_path) in enumerate(narration_paths.items()):
+        narration_filter = _fit_narration_filter(
+            1, "narration", probe_duration(narration_path),
+            content_start, content_duration, total_duration
+        )
+        output_path = os.path.join(output_dir, f"{safe_topic}_final_{lang}.mp4")
+        run_ffmpeg([
+            "-i", final_video_path, "-i", narration_path,
+            "-filter_complex", narration_filter,
+            "-map", "0:v:0", "-map", "[narration]",
+            "-c:v", "copy", "-c:a", "aac",
+            "-metadata:s:a:0", f"language={AUDIO_TRACK_LANGUAGE_TAGS.get(lang, 'und')}",
+            output_path
+        ])
+        outputs[lang] = output_path
+        filters.append(_fit_narration_filter(
+            i + 1, f"a{i + 1}", probe_duration(narration_path),
+            content_start, content_duration, total_duration
+        ))
+
+    # One file with the original track first and every translation after it
+    args = ["-i", final_video_path]
+    for narration_path in narration_paths.values():
+        args += ["-i", narration_path]
+    args += ["-filter_complex", ";".join(filters), "-map", "0:v:0", "-map", "0:a:0"]
+    for i in range(len(narration_paths)):
+        args += ["-map", f"[a{i + 1}]"]
+    args += ["-c:v", "copy", "-c:a:0", "copy", "-metadata:s:a:0", "language=eng"]
+    for i, lang in enumerate(narration_paths):
+        args += [f"-c:a:{i + 1}", "aac", f"-metadata:s:a:{i + 1}", f"language={AUDIO_TRACK_LANGUAGE_TAGS.get(lang, 'und')}"]
+    outputs["multi"] = os.path.join(output_dir, f"{safe_topic}_final_multilang.mp4")
+    run_ffmpeg(args + [outputs["multi"]])
+    return outputs
+
+def localize_tutorial(final_video_path, topic, languages):
+    """Narrate a finished tutorial in more languages, reusing its single rendered video.
+
+    Each language costs one cached translation and one TTS pass; the video
+    stream is copied, never rendered or re-encoded. Returns the dict from
+    mux_language_tracks, or an empty dict on failure.
+    """
+    languages = [lang for lang in languages if lang != "en"]
+    if not languages:
+        return {}
+    # Narration goes to a directory of this call's own, so concurrent sessions never share files
+    narration_dir = tempfile.mkdtemp()
+    try:
+        script = read_tutorial_manifest(final_video_path).get("script")
+        if not script:
+            raise ValueError("The tutorial's script is not available for translation")
+
+        narration_paths = {}
+        for lang in languages:
+            narration_path = generate_audio(translate_script(script, lang), topic, lang, audio_dir=narration_dir)
+            if not narration_path:
+                raise RuntimeError(f"Could not generate {NARRATION_LANGUAGES.get(lang, lang)} narration")
+            narration_paths[lang] = narration_path
+
+        with st.spinner("Adding narration tracks to the video..."):
+            return mux_language_tracks(final_video_path, narration_paths, topic)
+    except Exception as e:
+        st.error(f"Error creating localized narration: {str(e)}")
+        return {}
+    finally:
+        shutil.rmtree(narration_dir, ignore_errors=True)
+
 # Function to generate TTS audio from script
-def generate_audio(script, topic):
+def generate_audio(script, topic, lang='en', audio_dir="audio"):
     try:
-        with st.spinner("Generating voice narration..."):
-            audio_dir = "audio"
+        # Imported here so the module stays cheap to import
+        from gtts import gTTS
+
+        with st.spinner(f"Generating voice narration ({NARRATION_LANGUAGES.get(lang, lang)})..."):
             os.makedirs(audio_dir, exist_ok=True)
 
             # Split the script into sections
@@ -550,28 +1540,22 @@ def generate_audio(script, topic):
             total_sections = len(sections)
 
             for i, (section_name, section_text) in enumerate(sections.items()):
-                section_filename = f"{audio_dir}/{topic.replace(' ', '')}{section_name}.mp3"
+                section_filename = os.path.join(audio_dir, f"{topic.replace(' ', '')}{section_name}{_lang_suffix(lang)}.mp3")
 
                 # Clean the text for TTS
                 clean_text = clean_text_for_tts(section_text)
 
                 # Generate the audio
-                tts = gTTS(text=clean_text, lang='en', slow=False)
+                tts = gTTS(text=clean_text, lang=lang, slow=False)
                 tts.save(section_filename)
                 audio_files.append(section_filename)
 
                 # Update progress
                 progress_bar.progress((i + 1) / total_sections)
 
-            # Combine all audio files
-            combined_audio = AudioSegment.empty()
-            for audio_file in audio_files:
-                sound = AudioSegment.from_mp3(audio_file)
-                combined_audio += sound
-
-            # Export the combined audio
-            final_audio_path = f"{audio_dir}/{topic.replace(' ', '_')}_complete.mp3"
-            combined_audio.export(final_audio_path, format="mp3")
+            # Combine all audio files in a single pass
+            final_audio_path = os.path.join(audio_dir, f"{topic.replace(' ', '_')}_complete{_lang_suffix(lang)}.mp3")
+            concat_audio_files(audio_files, final_audio_path)
 
             return final_audio_path
 
@@ -581,10 +1565,282 @@ def generate_audio(script, topic):
         st.error(traceback.format_exc())
         return None
     
+# Play each section as soon as it is rendered and narrated; off by default because
+# sections are then rendered one by one and fitted to their narration, opt in
+# with STREAMING_PLAYBACK=1
+STREAMING_PLAYBACK_ENABLED = os.getenv("STREAMING_PLAYBACK", "0") == "1"
+
+# Per-topic directories holding, per generation, the playable segments and their playlist
+STREAM_DIR = os.path.join("output", "streams")
+
+# Streamed segments older than this are removed when a new stream of the topic starts
+STREAM_RETENTION_SECONDS = 24 * 60 * 60
+
+# Frame rate segments are encoded at (matches the Manim render settings)
+SEGMENT_FRAME_RATE = 30
+
+def stream_playlist_path(topic, stream_id):
+    """Path of the growing M3U playlist for one generation's streamed segments of a topic"""
+    safe_topic = topic.replace(' ', '_').replace("'", "").replace('"', '')
+    return os.path.join(STREAM_DIR, safe_topic, stream_id, "playlist.m3u")
+
+def stream_id_for(owner):
+    """Stream directory name of a job owner, so sessions waiting on the job can find its playlist"""
+    return hashlib.sha256(owner.encode("utf-8")).hexdigest()[:16]
+
+def prune_stream_dirs(topic_dir):
+    """Remove a topic's streams that finished more than STREAM_RETENTION_SECONDS ago"""
+    prune_old_dirs(topic_dir, STREAM_RETENTION_SECONDS)
+
+def append_to_playlist(playlist_path, segment_path, duration, title):
+    """Append a playable segment to an extended M3U playlist"""
+    new_playlist = not os.path.exists(playlist_path)
+    with open(playlist_path, "a", encoding="utf-8") as f:
+        if new_playlist:
+            f.write("#EXTM3U\n")
+        f.write(f"#EXTINF:{duration:.1f},{title}\n")
+        f.write(f"{os.path.relpath(segment_path, os.path.dirname(playlist_path))}\n")
+
+def read_playlist(playlist_path):
+    """Return the (title, path) entries of an extended M3U playlist written by append_to_playlist"""
+    entries = []
+    try:
+        with open(playlist_path, encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except OSError:
+        return entries
+    title = None
+    for line in lines:
+        if line.startswith("#EXTINF:"):
+            title = line.split(",", 1)[1] if "," in line else ""
+        elif not line.startswith("#"):
+            entries.append((title or line, os.path.join(os.path.dirname(playlist_path), line)))
+            title = None
+    return entries
+
+def split_script_for_sections(script, section_count):
+    """Split the script's paragraphs into consecutive groups, one per video section.
+
+    Groups are balanced by length so each section's narration is roughly
+    proportional to its share of the script.
+    """
+    paragraphs = [p for p in script.split('\n\n') if p.strip()]
+    groups = [[] for _ in range(section_count)]
+    total_chars = sum(len(p) for p in paragraphs) or 1
+    section, written = 0, 0
+    for i, paragraph in enumerate(paragraphs):
+        remaining_paragraphs = len(paragraphs) - i
+        remaining_sections = section_count - section
+        # Move on once this section has its share, keeping a paragraph for every later section
+        if groups[section] and section < section_count - 1 and (
+            written >= total_chars * (section + 1) / section_count
+            or remaining_paragraphs <= remaining_sections - 1
+        ):
+            section += 1
+        groups[section].append(paragraph)
+        written += len(paragraph)
+    return ["\n\n".join(group) for group in groups]
+
+def generate_section_narration(text, topic, index, audio_dir, lang='en'):
+    """Narrate one section's text into audio_dir; returns an MP3 path, or None when there is nothing to say"""
+    from gtts import gTTS
+
+    clean_text = clean_text_for_tts(text)
+    if not clean_text:
+        return None
+    os.makedirs(audio_dir, exist_ok=True)
+    section_filename = os.path.join(audio_dir, f"{topic.replace(' ', '')}stream{index + 1}{_lang_suffix(lang)}.mp3")
+    gTTS(text=clean_text, lang=lang, slow=False).save(section_filename)
+    return section_filename
+
+def mux_section_segment(video_path, narration_path, output_path):
+    """Mux one section and its narration into a playable MP4, fitting the video to the narration"""
+    encode_args = [
+        "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-ar", "44100", "-ac", "2",
+        "-shortest", "-movflags", "+faststart"
+    ]
+    if narration_path:
+        speed_factor = probe_duration(narration_path) / probe_duration(video_path)
+        run_ffmpeg([
+            "-i", video_path, "-i", narration_path,
+            "-filter:v", f"setpts={speed_factor:.6f}*PTS,fps={SEGMENT_FRAME_RATE}",
+            "-map", "0:v:0", "-map", "1:a:0"
+        ] + encode_args + [output_path])
+    else:
+        # No narration for this section: play it at its own pace over silence
+        run_ffmpeg([
+            "-i", video_path, "-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo",
+            "-filter:v", f"fps={SEGMENT_FRAME_RATE}",
+            "-map", "0:v:0", "-map", "1:a:0"
+        ] + encode_args + [output_path])
+    return output_path
+
+def render_and_stream_sections(manim_code, script, topic, segment_callback, stream_id=None):
+    """Render, narrate and mux each section as soon as it is ready so playback can start early.
+
+    Every playable part (shared intro, sections, shared outro) is appended to the
+    M3U playlist of this stream (stream_id, or a new id) and passed to
+    segment_callback(title, path) as soon as it exists. Narration for all sections is synthesized in the background while the
+    sections render, into the stream's own directory. Returns a dict with video_path, audio_path and final_video_path.
+    """
+    results = {"video_path": None, "audio_path": None, "final_video_path": None}
+    try:
+        with st.spinner("Rendering sections (each one plays as soon as it is ready)..."):
+            temp_dir = tempfile.mkdtemp()
+            status_placeholder = st.empty()
+            try:
+                manim_code = prepare_manim_code(manim_code, status_placeholder)
+                if not manim_code:
+                    return results
+
+                safe_topic = topic.replace(' ', '_').replace("'", "").replace('"', '')
+                class_name = find_scene_class(manim_code, topic.replace(' ', '').replace('-', '_'))
+                sections = plan_scene_sections(manim_code, class_name) or [None]
+                narration_texts = split_script_for_sections(script, len(sections))
+
+                # A directory per stream, so a concurrent stream of the topic keeps its segments
+                playlist_path = stream_playlist_path(topic, stream_id or uuid.uuid4().hex[:16])
+                stream_dir = os.path.dirname(playlist_path)
+                prune_stream_dirs(os.path.dirname(stream_dir))
+                os.makedirs(stream_dir, exist_ok=True)
+
+                parts = []
+                def publish(title, path):
+                    append_to_playlist(playlist_path, path, probe_duration(path), title)
+                    parts.append(path)
+                    segment_callback(title, path)
+
+                def publish_shared(name, title, reference_path, overlay):
+                    try:
+                        publish(title, prepare_segment(get_shared_segment(name), reference_path, title=overlay))
+                    except Exception as e:
+                        # The tutorial is still usable without the branded segments
+                        print(f"Warning: Failed to add shared segment '{name}': {e}")
+
+                section_videos, section_segments, narrations = [], [], []
+                with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+                    narration_futures = [
+                        pool.submit(generate_section_narration, text, topic, index, stream_dir)
+                        for index, text in enumerate(narration_texts)
+                    ]
+                    for index, section_method in enumerate(sections):
+                        status_placeholder.info(
+                            f"Rendering section {index + 1} of {len(sections)}: "
+                            f"{section_method or class_name} (check console for progress)..."
+                        )
+                        video_path, manim_code = render_section_with_repair(
+                            manim_code, class_name, topic, temp_dir, status_placeholder,
+                            section_method, index
+                        )
+                        if not video_path:
+                            return results
+                        section_videos.append(video_path)
+
+                        narration_path = narration_futures[index].result()
+                        if narration_path:
+                            narrations.append(narration_path)
+                        segment_path = mux_section_segment(
+                            video_path, narration_path,
+                            os.path.join(stream_dir, f"section_{index + 1:03d}.mp4")
+                        )
+                        section_segments.append(segment_path)
+
+                        if index == 0 and SHARED_SEGMENTS_ENABLED:
+                            publish_shared("intro", "Intro", segment_path, topic)
+                        publish(f"Part {index + 1}", segment_path)
+
+                if SHARED_SEGMENTS_ENABLED:
+                    publish_shared("outro", "Outro", section_segments[-1], f"You finished: {topic}")
+
+                # Keep the silent render and full narration for the other stages
+                output_dir = "output"
+                os.makedirs(output_dir, exist_ok=True)
+                results["video_path"] = concat_media_files(section_videos, os.path.join(output_dir, f"{safe_topic}.mp4"))
+                if narrations:
+                    results["audio_path"] = concat_audio_files(
+                        narrations, os.path.join(stream_dir, f"{topic.replace(' ', '_')}_complete.mp3")
+                    )
+
+                # The playlist parts already match, so the full video is a stream copy
+                final_path = concat_media_files(parts, f"{safe_topic}_final.mp4")
+                write_tutorial_manifest(
+                    final_path,
+                    topic=topic,
+                    content_start=probe_duration(parts[0]) if parts[0] != section_segments[0] else 0.0,
+                    content_duration=sum(probe_duration(path) for path in section_segments)
+                )
+                results["final_video_path"] = final_path
+                status_placeholder.success("All sections are ready!")
+                return results
+
+            finally:
+                # Clean up the temporary directory
+                try:
+                    shutil.rmtree(temp_dir)
+                except Exception as e:
+                    print(f"Warning: Failed to clean up temp directory: {e}")
+
+    except Exception as e:
+        st.error(f"Error streaming tutorial sections: {str(e)}")
+        import traceback
+        st.error(traceback.format_exc())
+        return results
+
+# Thumbnail sprite layout used for scrubbing previews
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_MAX_TILES = 100
+
+# Width of the poster image shown on catalog and history pages
+POSTER_WIDTH = 640
+
+def generate_video_previews(video_path, topic):
+    """Extract a poster image and a thumbnail sprite sheet next to a video and record them.
+
+    The poster is taken a few seconds into the narrated content. The sprite
+    holds up to SPRITE_MAX_TILES evenly spaced low-resolution frames in a
+    SPRITE_COLUMNS-wide grid; the tile geometry is stored with it so a page can
+    show the frame for any time without loading the video.
+    """
+    media_format = probe_media_format(video_path)
+    duration = probe_duration(video_path)
+    base_path = os.path.splitext(video_path)[0]
+    poster_path = f"{base_path}_poster.jpg"
+    sprite_path = f"{base_path}_sprite.jpg"
+
+    content_start = read_tutorial_manifest(video_path).get("content_start", 0.0)
+    poster_time = min(content_start + 5, duration / 2)
+    run_ffmpeg([
+        "-ss", f"{poster_time:.2f}", "-i", video_path,
+        "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2", "-q:v", "3",
+        poster_path
+    ])
+
+    interval = max(1.0, duration / SPRITE_MAX_TILES)
+    tile_count = max(1, min(SPRITE_MAX_TILES, int(duration // interval)))
+    sprite_rows = -(-tile_count // SPRITE_COLUMNS)
+    tile_height = 2 * round(SPRITE_TILE_WIDTH * media_format["height"] / media_format["width"] / 2)
+    run_ffmpeg([
+        "-i", video_path,
+        "-vf", f"fps=1/{interval:.3f},scale={SPRITE_TILE_WIDTH}:{tile_height},tile={SPRITE_COLUMNS}x{sprite_rows}",
+        "-frames:v", "1", "-q:v", "5",
+        sprite_path
+    ])
+
+    save_video_assets(
+        video_path, topic, duration, poster_path, sprite_path, interval,
+        SPRITE_COLUMNS, sprite_rows, SPRITE_TILE_WIDTH, tile_height
+    )
+    return poster_path, sprite_path
+
 # Combine video and audio using MoviePy
 
 def merge_video_audio(video_path, audio_path, topic):
     try:
+        # moviepy is slow to import, so only load it when merging
+        from moviepy.editor import VideoFileClip, AudioFileClip, vfx
+
         with st.spinner("Merging video and audio..."):
             if not video_path or not audio_path:
                 raise ValueError("Video or audio path is missing")
@@ -597,6 +1853,8 @@ def merge_video_audio(video_path, audio_path, topic):
 
             safe_topic = topic.replace(' ', '_').replace("'", "").replace('"', '')
             output_path = f"{safe_topic}_final.mp4"
+            # The narrated content is written first when the shared segments are spliced around it
+            content_path = f"{safe_topic}_content.mp4" if SHARED_SEGMENTS_ENABLED else output_path
 
             # Load the video and audio
             video_clip = VideoFileClip(video_path)
@@ -618,7 +1876,7 @@ def merge_video_audio(video_path, audio_path, topic):
 
             # Write the result to a file
             final_clip.write_videofile(
-                output_path,
+                content_path,
                 codec='libx264',
                 audio_codec='aac',
                 temp_audiofile='temp-audio.m4a',
@@ -631,6 +1889,24 @@ def merge_video_audio(video_path, audio_path, topic):
             adjusted_video.close()
             final_clip.close()
 
+            content_start = 0.0
+            if SHARED_SEGMENTS_ENABLED:
+                try:
+                    content_start = splice_shared_segments(content_path, topic, output_path)
+                    os.remove(content_path)
+                except Exception as e:
+                    # The tutorial is still usable without the branded segments
+                    print(f"Warning: Failed to splice shared segments: {e}")
+                    os.replace(content_path, output_path)
+
+            # Record where the narrated content sits so other languages can be muxed in later
+            write_tutorial_manifest(
+                output_path,
+                topic=topic,
+                content_start=content_start,
+                content_duration=audio_duration
+            )
+
             return output_path
 
     except Exception as e:
@@ -639,137 +1915,224 @@ def merge_video_audio(video_path, audio_path, topic):
         st.error(traceback.format_exc())
         return None
 
-# Session state initialization
-if 'script' not in st.session_state:
-    st.session_state.script = None
-if 'manim_code' not in st.session_state:
-    st.session_state.manim_code = None
-if 'video_path' not in st.session_state:
-    st.session_state.video_path = None
-if 'audio_path' not in st.session_state:
-    st.session_state.audio_path = None
-if 'final_video_path' not in st.session_state:
-    st.session_state.final_video_path = None
-if 'api_key_valid' not in st.session_state:
-    st.session_state.api_key_valid = False
-
-# Sidebar for configuration
-with st.sidebar:
-    st.header("Configuration")
-    
-    # API Key input
-    api_key = st.text_input("Gemini API Key", type="password",  help="Get your Gemini API key from Google AI Studio")
-    
-    if st.button("Validate API Key"):
-        if api_key:
-            if setup_gemini_api(api_key):
-                st.session_state.api_key_valid = True
-                st.success("API key is valid!")
-            else:
-                st.session_state.api_key_valid = False
-                st.error("Invalid API key. Please check and try again.")
-        else:
-            st.warning("Please enter an API key.")
-    
-    # Topic input
-    topic = st.text_input("Python Topic",  help="Enter a Python topic (e.g., 'Python Lists', 'Recursion', 'For Loops')")
-    
-    # Generation button
-    generate_button = st.button("Generate Tutorial", disabled=not (st.session_state.api_key_valid and topic))
-
-# Main content area
-if generate_button and topic:
-    # Reset session state for a new generation
-    st.session_state.script = None
-    st.session_state.manim_code = None
-    st.session_state.video_path = None
-    st.session_state.audio_path = None
-    st.session_state.final_video_path = None
-    
+# Pipeline stages in execution order
+PIPELINE_STAGES = ["script", "manim_code", "video", "audio", "final_video"]
+
+# Seconds between heartbeats while this process owns a generation job
+JOB_HEARTBEAT_SECONDS = 15
+
+# Seconds between progress checks while waiting on another owner's job
+JOB_POLL_SECONDS = 2
+
+def make_job_key(topic):
+    """Normalize a topic into the key used to coalesce identical requests"""
+    normalized = " ".join(topic.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+# Result keys that are checkpointed, in pipeline order
+CHECKPOINT_KEYS = ["script", "manim_code", "video_path", "audio_path", "final_video_path"]
+
+def is_usable_checkpoint(key, value):
+    """Whether a stage artifact is worth checkpointing, or reusing on a retry"""
+    if not value:
+        return False
+    if key.endswith("_path"):
+        # A file that was cleaned up since, or left empty by an interrupted write, has to be made again
+        return os.path.isfile(value) and os.path.getsize(value) > 0
+    # The generators report failures as text instead of raising
+    if value.startswith("Error generating "):
+        return False
+    if key == "manim_code":
+        try:
+            ast.parse(value)
+        except SyntaxError:
+            return False
+    return True
+
+def load_pipeline_checkpoints(job_key):
+    """Load the artifacts an earlier attempt at a job finished, up to the first unusable one"""
+    stored = get_job_checkpoints(job_key)
+    checkpoints = {}
+    for key in CHECKPOINT_KEYS:
+        value = stored.get(key)
+        if not is_usable_checkpoint(key, value):
+            break
+        checkpoints[key] = value
+    return checkpoints
+
+def run_tutorial_pipeline(topic, progress_callback=None, segment_callback=None, job_key=None, stream_id=None):
+    """Run script -> Manim code -> render -> narration -> merge for a topic.
+
+    Returns a dict with the artifact of every stage that completed; the
+    final_video_path key is None when any stage failed. With a segment_callback
+    and streaming playback enabled, each section is rendered, narrated and
+    handed to segment_callback(title, path) as soon as it is playable, through
+    the stream directory named stream_id. With a job_key, every finished stage is checkpointed and a retry of a failed job
+    resumes from the first stage that did not finish.
+    """
+    results = {
+        "script": None,
+        "manim_code": None,
+        "video_path": None,
+        "audio_path": None,
+        "final_video_path": None
+    }
+
+    def report(stage):
+        if progress_callback:
+            progress_callback(stage)
+
+    def checkpoint(*keys):
+        if job_key:
+            for key in keys:
+                if is_usable_checkpoint(key, results[key]):
+                    save_job_checkpoint(job_key, key, results[key])
+
+    def failed(key):
+        # Don't hand a failure message on as if it were the stage's artifact
+        if not is_usable_checkpoint(key, results[key]):
+            results[key] = None
+            return True
+        return False
+
+    if job_key:
+        resumed = load_pipeline_checkpoints(job_key)
+        if resumed:
+            results.update(resumed)
+            st.info(f"Resuming the previous attempt: reusing {', '.join(resumed)}.")
+
     # Step 1: Generate script
-    st.header("Step 1: Generate Script")
-    st.session_state.script = generate_script(topic)
-    
-    if st.session_state.script:
-        st.success("Script generated successfully!")
-        st.subheader("Generated Script")
-        st.text_area("Script", st.session_state.script, height=300)
-        
-        # Step 2: Generate Manim code
-        st.header("Step 2: Generate Animation Code")
-        st.session_state.manim_code = generate_manim_code(topic, st.session_state.script)
-        
-        if st.session_state.manim_code:
-            st.success("Animation code generated successfully!")
-            st.subheader("Generated Manim Code")
-            st.code(st.session_state.manim_code, language="python")
-            
-            # Step 3: Render animation
-            st.header("Step 3: Render Animation")
-            st.session_state.video_path = render_manim_animation(st.session_state.manim_code, topic)
-            
-            if st.session_state.video_path:
-                st.success("Animation rendered successfully!")
-                st.subheader("Generated Animation")
-                st.video(st.session_state.video_path)
-                
-                # Step 4: Generate audio
-                st.header("Step 4: Generate Voice Narration")
-                st.session_state.audio_path = generate_audio(st.session_state.script, topic)
-                
-                if st.session_state.audio_path:
-                    st.success("Voice narration generated successfully!")
-                    st.subheader("Generated Audio")
-                    st.audio(st.session_state.audio_path)
-                    
-                    # Step 5: Merge video and audio
-                    st.header("Step 5: Create Final Tutorial")
-                    st.session_state.final_video_path = merge_video_audio(
-                        st.session_state.video_path, 
-                        st.session_state.audio_path, 
-                        topic
-                    )
-                    
-                    if st.session_state.final_video_path:
-                        st.success("🎉 Tutorial video created successfully!")
-                        st.subheader("Final Tutorial Video")
-                        st.video(st.session_state.final_video_path)
-                        
-                        # Download button
-                        with open(st.session_state.final_video_path, "rb") as file:
-                            st.download_button(
-                                label="Download Tutorial Video",
-                                data=file,
-                                file_name=f"{topic.replace(' ', '_')}_tutorial.mp4",
-                                mime="video/mp4"
-                            )
-                    else:
-                        st.error("Failed to merge video and audio.")
-                else:
-                    st.error("Failed to generate audio narration.")
-            else:
-                st.error("Failed to render animation.")
-        else:
-            st.error("Failed to generate animation code.")
-    else:
-        st.error("Failed to generate script.")
-
-# If nothing has been generated yet, show instructions
-if not st.session_state.script:
-    st.info("""
-    ### How to use this app:
-    1. Enter your Gemini API key in the sidebar
-    2. Enter a Python topic you want to learn about
-    3. Click 'Generate Tutorial' to create your custom tutorial video
-    4. Wait for the process to complete (it may take a few minutes)
-    5. Download your finished tutorial video
-    
-    This app will create a complete educational video with:
-    - A detailed script explaining the Python topic
-    - Animated visualizations created with Manim
-    - Professional voice narration
-    """)
-
-# Footer
-st.markdown("---")
-st.markdown("Made with ❤️ using Streamlit, Gemini AI, Manim, and gTTS")
\ No newline at end of file
+    if not results["script"]:
+        report("script")
+        results["script"] = generate_script(topic)
+        if failed("script"):
+            return results
+        checkpoint("script")
+
+    # Step 2: Generate Manim code
+    if not results["manim_code"]:
+        report("manim_code")
+        results["manim_code"] = generate_manim_code(topic, results["script"])
+        if failed("manim_code"):
+            return results
+        checkpoint("manim_code")
+
+    # Steps 3-5 per section, so the learner can start watching early
+    if segment_callback and STREAMING_PLAYBACK_ENABLED and not results["video_path"]:
+        report("video")
+        results.update(render_and_stream_sections(
+            results["manim_code"], results["script"], topic, segment_callback, stream_id
+        ))
+        checkpoint("video_path", "audio_path", "final_video_path")
+        return _finish_pipeline(results, topic, report, job_key)
+
+    # Step 3: Render animation
+    if not results["video_path"]:
+        report("video")
+        results["video_path"] = render_manim_animation(results["manim_code"], topic)
+        if not results["video_path"]:
+            return results
+        checkpoint("video_path")
+
+    # Step 4: Generate audio
+    if not results["audio_path"]:
+        report("audio")
+        results["audio_path"] = generate_audio(results["script"], topic)
+        if not results["audio_path"]:
+            return results
+        checkpoint("audio_path")
+
+    # Step 5: Merge video and audio
+    if not results["final_video_path"]:
+        report("final_video")
+        results["final_video_path"] = merge_video_audio(results["video_path"], results["audio_path"], topic)
+        checkpoint("final_video_path")
+    return _finish_pipeline(results, topic, report, job_key)
+
+def _finish_pipeline(results, topic, report, job_key=None):
+    """Post-render stage: record the script and precompute preview images"""
+    if not results["final_video_path"]:
+        return results
+    if job_key:
+        # The job is complete, so the next request for the topic starts fresh
+        clear_job_checkpoints(job_key)
+    write_tutorial_manifest(results["final_video_path"], script=results["script"])
+    report("previews")
+    try:
+        generate_video_previews(results["final_video_path"], topic)
+    except Exception as e:
+        # Previews are an optimization; the tutorial itself is ready
+        print(f"Warning: Failed to generate video previews: {e}")
+    return results
+
+def generate_tutorial_coalesced(topic):
+    """Generate a tutorial, sharing the work with concurrent requests for the same topic.
+
+    The first request for a topic (across sessions and worker processes) owns the
+    job and runs the pipeline. Later requests wait on the owner's progress through
+    the database and receive the same final video. If the owner stops sending
+    heartbeats, a waiter takes the job over.
+    """
+    job_key = make_job_key(topic)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+    status_placeholder = st.empty()
+    segments_container = st.container()
+    shown_segments = []
+
+    def show_segment(title, path):
+        shown_segments.append(path)
+        segments_container.caption(title)
+        segments_container.video(path)
+
+    while True:
+        if claim_generation_job(job_key, topic, owner):
+            return _run_owned_job(job_key, owner, topic, show_segment)
+
+        # Another session owns this topic: follow its progress and its streamed sections
+        job = get_generation_job(job_key)
+        while job and job["status"] == "running" and not job["stale"]:
+            stage = job["stage"] or "starting"
+            status_placeholder.info(f"Another learner is generating '{job['topic']}' (current step: {stage}). Waiting for it to finish...")
+            if STREAMING_PLAYBACK_ENABLED and job["owner"]:
+                for title, path in read_playlist(stream_playlist_path(job["topic"], stream_id_for(job["owner"]))):
+                    if path not in shown_segments:
+                        show_segment(title, path)
+            time.sleep(JOB_POLL_SECONDS)
+            job = get_generation_job(job_key)
+
+        if job and job["status"] == "done":
+            status_placeholder.empty()
+            return {"final_video_path": job["result_path"]}
+        if job and job["status"] == "failed":
+            status_placeholder.error(f"Tutorial generation failed: {job['error'] or 'unknown error'}")
+            return {"final_video_path": None}
+        # Owner went away; loop round and try to take the job over
+
+def _run_owned_job(job_key, owner, topic, segment_callback=None):
+    """Run the pipeline for a claimed job while keeping its heartbeat fresh"""
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        try:
+            while not stop_heartbeat.wait(JOB_HEARTBEAT_SECONDS):
+                update_generation_job(job_key, owner)
+        finally:
+            close_thread_connection()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    results = {"final_video_path": None}
+    try:
+        results = run_tutorial_pipeline(
+            topic,
+            progress_callback=lambda stage: update_generation_job(job_key, owner, stage),
+            segment_callback=segment_callback,
+            job_key=job_key,
+            stream_id=stream_id_for(owner)
+        )
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+        error = None if results.get("final_video_path") else "pipeline did not produce a video"
+        finish_generation_job(job_key, owner, results.get("final_video_path"), error)
+    return results
@@ -0,0 +1,33 @@
+# genai_client.py
+import os
+import threading
+
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_api_key():
+    """Get the Gemini API key from config.API_KEY or the GEMINI_API_KEY environment variable"""
+    try:
+        from config import API_KEY
+        if API_KEY:
+            return API_KEY
+    except ImportError:
+        pass
+    return os.getenv("GEMINI_API_KEY")
+
+def get_genai():
+    """Import and configure google.generativeai on first use.
+
+    The import is deferred so modules that only need the Gemini client for some
+    functions stay cheap to import, and configuration happens once per process.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                api_key = get_api_key()
+                if api_key:
+                    genai.configure(api_key=api_key)
+                _genai = genai
+    return _genai
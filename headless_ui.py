@@ -0,0 +1,62 @@
+# headless_ui.py
+import contextlib
+
+class _Placeholder:
+    """Console stand-in for st.empty() and st.container() outside Streamlit"""
+
+    def __getattr__(self, name):
+        def show(*args, **kwargs):
+            if args and isinstance(args[0], str):
+                print(f"[{name}] {args[0]}")
+            return _Placeholder()
+        return show
+
+    def empty(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class _SessionState(dict):
+    """Dict with the attribute access st.session_state allows"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(f"st.session_state has no attribute \"{name}\"") from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+class HeadlessStreamlit(_Placeholder):
+    """Minimal stand-in for the streamlit module in workers that run the library code.
+
+    Status calls (error, info, spinner, ...) are printed to the console and
+    widgets render nothing, so pipeline functions work unchanged without Streamlit.
+    """
+
+    def __init__(self):
+        self.session_state = _SessionState()
+
+    @contextlib.contextmanager
+    def spinner(self, text=""):
+        print(f"[spinner] {text}")
+        yield
+
+    def empty(self):
+        return _Placeholder()
+
+    def container(self, *args, **kwargs):
+        return _Placeholder()
+
+st = HeadlessStreamlit()
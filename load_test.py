@@ -0,0 +1,285 @@
+# load_test.py
+"""Simulate concurrent learners against a scratch copy of the database.
+
+Each learner logs in, then repeatedly picks an action from the mix, runs it
+through the real data-layer functions and waits a think time:
+
+    dashboard  get_user_progress + get_user_stats
+    quiz       log_quiz_attempt with seven answered questions
+    video      log_video_watched
+    challenge  code_ch.submit_challenge (update_user_challenge + log_activity
+               when Streamlit isn't installed)
+
+    python load_test.py --learners 50 --duration 60 --think 0.5 \
+        --mix dashboard=50,quiz=15,video=25,challenge=10
+
+The production database is copied with the SQLite backup API and never
+written. Pass --pragmas to try a pragma profile before rolling it out.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ACTIONS = ["dashboard", "quiz", "video", "challenge"]
+
+DEFAULT_MIX = "dashboard=50,quiz=15,video=25,challenge=10"
+
+TOPICS = ["Lists", "Dictionaries", "Loops", "Functions", "Classes", "Recursion"]
+
+def parse_mix(value):
+    """Parse "action=weight,..." into a dict of positive weights"""
+    mix = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, weight = item.split("=", 1)
+            if float(weight) > 0:
+                mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"unknown actions in mix: {', '.join(sorted(unknown))}")
+    if not mix:
+        raise ValueError("the mix has no actions")
+    return mix
+
+def is_lock_error(error):
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+class Learner:
+    """One simulated learner, run on its own thread like a Streamlit session"""
+
+    def __init__(self, db, challenges, number):
+        self.db = db
+        self.challenges = challenges
+        self.username = f"loadtest{number}"
+        self.user = None
+        self.rng = random.Random(number)
+
+    def login(self):
+        self.db.register_user(self.username, f"{self.username}@example.com", "loadtest")
+        self.user = self.db.authenticate_user(self.username, "loadtest")
+        if self.user is None:
+            raise RuntimeError(f"could not log in as {self.username}")
+
+    def dashboard(self):
+        self.db.get_user_progress(self.user["id"])
+        self.db.get_user_stats(self.user["id"])
+
+    def quiz(self):
+        topic = self.rng.choice(TOPICS)
+        questions = [{
+            "question": f"{topic} question {self.rng.randrange(50)}?",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": "A",
+            "category": "Basic Concepts"
+        } for _ in range(7)]
+        answers = {i: self.rng.choice("AB") for i in range(len(questions))}
+        score = sum(answers[i] == "A" for i in answers)
+        self.db.log_quiz_attempt(
+            self.user["id"], topic, score, len(questions),
+            {"questions": questions, "answers": answers},
+            attempt_key=uuid.uuid4().hex
+        )
+
+    def video(self):
+        self.db.log_video_watched(self.user["id"], self.rng.choice(TOPICS), self.rng.choice([25, 50, 100]))
+
+    def challenge(self):
+        challenge = self.rng.choice(self.challenges)
+        passed = self.rng.random() < 0.5
+        if challenge.get("submit"):
+            code = challenge["solution_code"] if passed else challenge["initial_code"]
+            challenge["submit"](self.user["id"], challenge["id"], code)
+        else:
+            self.db.update_user_challenge(self.user["id"], challenge["id"], completed=passed, code="pass")
+            if passed:
+                self.db.log_activity(self.user["id"], "challenge_completed",
+                                     {"challenge_id": challenge["id"], "xp_reward": 50})
+
+def load_challenges(db):
+    """Challenges to submit: code_ch's samples when it can be imported, else bare ids"""
+    try:
+        from code_ch import submit_challenge, get_sample_challenges
+    except ImportError as e:
+        print(f"code_ch unavailable ({e}); challenge submissions write through update_user_challenge")
+        return [{"id": challenge_id} for challenge_id in range(1, 6)]
+
+    conn = db.get_thread_connection()
+    if conn.execute("SELECT COUNT(*) FROM code_challenges").fetchone()[0] == 0:
+        # Seed the scratch copy with the sample challenges
+        with db.unit_of_work() as conn:
+            conn.executemany("""
+                INSERT INTO code_challenges
+                (title, story, description, difficulty, category, initial_code, solution_code,
+                 test_cases, hints, xp_reward, badge_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(c["title"], c["story"], c["description"], c["difficulty"], c["category"],
+                   c["initial_code"], c["solution_code"], json.dumps(c["test_cases"]),
+                   json.dumps(c["hints"]), c["xp_reward"], c["badge_id"]) for c in get_sample_challenges()])
+
+    rows = conn.execute("SELECT id, initial_code, solution_code FROM code_challenges").fetchall()
+    return [dict(row, submit=submit_challenge) for row in rows]
+
+def run(args, scratch_path):
+    """Run the learners against the scratch database and return the report"""
+    os.environ["LEARNING_PLATFORM_DB"] = scratch_path
+    # Keep the run's slow statements out of the production slow-query log
+    slow_log_path = os.path.join(os.path.dirname(scratch_path), "slow_queries.log")
+    os.environ["LEARNING_PLATFORM_SLOW_QUERY_LOG"] = slow_log_path
+    if args.pragmas is not None:
+        os.environ["LEARNING_PLATFORM_DB_PRAGMAS"] = args.pragmas
+    import db_utils
+    import query_stats
+
+    db_utils.DB_PATH = scratch_path
+    db_utils.ensure_schema()
+    challenges = load_challenges(db_utils)
+    mix = parse_mix(args.mix)
+    actions, weights = list(mix), list(mix.values())
+
+    lock = threading.Lock()
+    latencies = {action: [] for action in ["login"] + ACTIONS}
+    errors = {"lock": 0, "other": 0}
+    error_samples = []
+    query_stats.query_stats.reset()
+    activity_rows_before = db_utils.get_thread_connection().execute("SELECT COUNT(*) FROM activity_logs").fetchone()[0]
+
+    def timed(action, call):
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            with lock:
+                errors["lock" if is_lock_error(e) else "other"] += 1
+                if len(error_samples) < 5:
+                    error_samples.append(f"{action}: {e!r}")
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[action].append(elapsed)
+
+    start_barrier = threading.Barrier(args.learners + 1)
+    deadline = [0.0]
+
+    def learner_thread(number):
+        learner = Learner(db_utils, challenges, number)
+        start_barrier.wait()
+        try:
+            timed("login", learner.login)
+            if learner.user is None:
+                return
+            done = 0
+            while time.perf_counter() < deadline[0] and (not args.actions or done < args.actions):
+                action = learner.rng.choices(actions, weights)[0]
+                timed(action, getattr(learner, action))
+                done += 1
+                if args.think > 0:
+                    # Exponential think times give the bursty arrivals of real sessions
+                    time.sleep(learner.rng.expovariate(1 / args.think))
+        finally:
+            db_utils.close_thread_connection()
+
+    threads = [threading.Thread(target=learner_thread, args=(i,)) for i in range(args.learners)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + args.duration
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    flushed = db_utils.flush_activity_log(timeout=60)
+    elapsed = time.perf_counter() - started
+
+    # Activity events are written in the background; compare what was queued with what landed
+    conn = db_utils.get_thread_connection()
+    activity_rows = conn.execute("SELECT COUNT(*) FROM activity_logs").fetchone()[0] - activity_rows_before
+    total = sum(len(samples) for samples in latencies.values())
+
+    report = {
+        "learners": args.learners,
+        "seconds": round(elapsed, 3),
+        "actions": total,
+        "actions_per_second": round(total / elapsed, 1) if elapsed else None,
+        "lock_errors": errors["lock"],
+        "other_errors": errors["other"],
+        "error_samples": error_samples,
+        "activity_rows_written": activity_rows,
+        "activity_flushed": bool(flushed),
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        "latency_ms": {},
+        "slow_statements": len(query_stats.read_slow_queries(slow_log_path, limit=None)),
+        "top_statements": query_stats.query_stats.snapshot()[:args.statements],
+    }
+    for action, samples in latencies.items():
+        if samples:
+            samples.sort()
+            report["latency_ms"][action] = {
+                "count": len(samples),
+                "p50": round(query_stats.percentile(samples, 0.50) * 1000, 2),
+                "p95": round(query_stats.percentile(samples, 0.95) * 1000, 2),
+                "p99": round(query_stats.percentile(samples, 0.99) * 1000, 2),
+                "max": round(samples[-1] * 1000, 2),
+            }
+    db_utils.close_thread_connection()
+    return report
+
+def print_report(report):
+    print(f"{report['learners']} learners, {report['actions']} actions in {report['seconds']}s "
+          f"= {report['actions_per_second']} actions/s (journal_mode={report['journal_mode']})")
+    print(f"{'action':>10} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for action, stats in report["latency_ms"].items():
+        print(f"{action:>10} {stats['count']:>7} {stats['p50']:>9} {stats['p95']:>9} {stats['p99']:>9} {stats['max']:>9}")
+    print(f"Lock errors: {report['lock_errors']}, other errors: {report['other_errors']}")
+    for sample in report["error_samples"]:
+        print(f"    {sample}")
+    print(f"Statements over the slow-query threshold: {report['slow_statements']}")
+    print(f"Activity rows written: {report['activity_rows_written']}"
+          f"{'' if report['activity_flushed'] else ' (writer did not drain in time)'}")
+    if report["top_statements"]:
+        print("Statements by total time:")
+        for entry in report["top_statements"]:
+            print(f"    {entry['count']:>7} x p95 {entry['p95_ms']:>7.2f} ms  {entry['fingerprint'][:90]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--learners", type=int, default=20, help="concurrent simulated learners")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--actions", type=int, default=0, help="stop each learner after this many actions (0: no limit)")
+    parser.add_argument("--think", type=float, default=0.5, help="mean think time between actions, in seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="relative weights of the actions")
+    parser.add_argument("--source", default=os.getenv("LEARNING_PLATFORM_DB", os.path.join("data", "learning_platform.db")),
+                        help="database to copy (an empty schema is used if it doesn't exist)")
+    parser.add_argument("--pragmas", help='pragma overrides for the run, e.g. "synchronous=FULL,busy_timeout=0"')
+    parser.add_argument("--statements", type=int, default=5, help="slowest statements to include in the report")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as scratch:
+        scratch_path = os.path.join(scratch, "loadtest.db")
+        if os.path.exists(args.source):
+            source = sqlite3.connect(args.source)
+            target = sqlite3.connect(scratch_path)
+            source.backup(target)
+            source.close()
+            target.close()
+        report = run(args, scratch_path)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["lock_errors"] or report["other_errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,25 @@
 import streamlit as st
 import os
 import re
+import json
 from g_video_gen import (
-    setup_gemini_api, generate_script, generate_manim_code, 
-    render_manim_animation, generate_audio, merge_video_audio
+    generate_tutorial_coalesced, localize_tutorial, make_job_key, NARRATION_LANGUAGES
 )
 from s_quiz import (
     generate_mcqs, start_assessment, submit_answer, restart,
-    analyze_performance, display_performance_charts, get_feedback_and_resources
+    analyze_performance, get_feedback_and_resources
 )
+from s_quiz_app import display_performance_charts
 from dashboard import dashboard_page
 from db_utils import (
-    init_db, register_user, authenticate_user, 
+    ensure_schema, start_db_maintenance, register_user, authenticate_user, 
     log_activity, log_video_watched, log_quiz_attempt,
-    init_chatbot_db, init_challenges_tables, migrate_challenges_tables
+    get_generation_job, save_user_session, load_user_session, close_thread_connection
 )
 
-# Initialize database
-init_db()
-init_chatbot_db()
-init_challenges_tables()
-migrate_challenges_tables()
+# Apply pending schema migrations and start WAL checkpointing (no-ops after the first run in this process)
+ensure_schema()
+start_db_maintenance()
 
 # Set page config
 st.set_page_config(
@@ -69,6 +68,9 @@ def init_session_state():
         'final_video_path': None,
         'api_key_valid': False,
         'video_topic': "",
+        'narration_languages': [],
+        'localized_videos': {},
+        'video_job': None,
         # Quiz generator state
         'questions': [],
         'current_question': 0,
@@ -76,7 +78,8 @@ def init_session_state():
         'completed': False,
         'answers': {},
         'topic': "",
-        'question_categories': {}
+        'question_categories': {},
+        'quiz_attempt_key': None
     }
     
     for key, default_value in required_states.items():
@@ -86,6 +89,43 @@ def init_session_state():
 # Initialize session state
 init_session_state()
 
+# State saved per user so a reload, dropped connection or server restart doesn't regenerate content
+PERSISTED_SESSION_KEYS = [
+    'page', 'video_topic', 'narration_languages', 'video_job',
+    'script', 'manim_code', 'video_path', 'audio_path', 'final_video_path', 'localized_videos',
+    'questions', 'current_question', 'score', 'completed', 'answers', 'topic', 'question_categories',
+    'quiz_attempt_key'
+]
+
+def persist_session_state():
+    """Save the user's in-progress state to the database when it has changed"""
+    snapshot = json.dumps({key: st.session_state[key] for key in PERSISTED_SESSION_KEYS}, sort_keys=True)
+    if snapshot != st.session_state.get('saved_session'):
+        if save_user_session(st.session_state.user['id'], snapshot):
+            st.session_state.saved_session = snapshot
+
+def restore_session_state(user_id):
+    """Restore the state persist_session_state saved for a user"""
+    state = load_user_session(user_id)
+    if not state:
+        return
+    
+    for key in PERSISTED_SESSION_KEYS:
+        if key in state:
+            st.session_state[key] = state[key]
+    
+    # JSON object keys are strings, but the quiz indexes by question number
+    st.session_state.answers = {int(k): v for k, v in st.session_state.answers.items()}
+    st.session_state.question_categories = {int(k): v for k, v in st.session_state.question_categories.items()}
+    
+    # Forget generated files that have been cleaned up since
+    for key in ['video_path', 'audio_path', 'final_video_path']:
+        if st.session_state[key] and not os.path.exists(st.session_state[key]):
+            st.session_state[key] = None
+    # The localized videos and the multi-track file are one set; keep all or none
+    if not all(os.path.exists(path) for path in st.session_state.localized_videos.values()):
+        st.session_state.localized_videos = {}
+
 # Navigation functions
 def navigate_to_dashboard():
     st.session_state.page = "dashboard"
@@ -113,6 +153,7 @@ def login_page():
                     st.session_state.user = user
                     st.session_state.auth_status = True
                     st.session_state.page = "dashboard"
+                    restore_session_state(user['id'])
                     st.rerun()
                 else:
                     st.error("Invalid username or password")
@@ -147,6 +188,13 @@ def video_generator_page():
         value=st.session_state.video_topic
     )
     
+    st.session_state.narration_languages = st.multiselect(
+        "Extra narration languages (the video is rendered once and narrated in each)",
+        options=[lang for lang in NARRATION_LANGUAGES if lang != "en"],
+        default=st.session_state.narration_languages,
+        format_func=lambda lang: NARRATION_LANGUAGES[lang]
+    )
+    
     if st.button("Generate Tutorial", disabled=not st.session_state.video_topic):
         with st.spinner("Generating tutorial..."):
             # Reset previous results
@@ -155,40 +203,43 @@ def video_generator_page():
             st.session_state.video_path = None
             st.session_state.audio_path = None
             st.session_state.final_video_path = None
+            st.session_state.localized_videos = {}
+            
+            # Remember the job so a reload mid-generation can pick it up again
+            st.session_state.video_job = st.session_state.video_topic
+            persist_session_state()
             
-            # Step 1: Generate script
-            st.session_state.script = generate_script(st.session_state.video_topic)
+            # Run the pipeline, sharing it with anyone generating the same topic
+            results = generate_tutorial_coalesced(st.session_state.video_topic)
+            for key, value in results.items():
+                st.session_state[key] = value
             
-            if st.session_state.script:
-                # Step 2: Generate Manim code
-                st.session_state.manim_code = generate_manim_code(
-                    st.session_state.video_topic, 
-                    st.session_state.script
+            if st.session_state.final_video_path:
+                st.session_state.video_job = None
+                
+                # Narrate the same video in the extra languages
+                st.session_state.localized_videos = localize_tutorial(
+                    st.session_state.final_video_path,
+                    st.session_state.video_topic,
+                    st.session_state.narration_languages
                 )
                 
-                if st.session_state.manim_code:
-                    # Step 3: Render animation
-                    st.session_state.video_path = render_manim_animation(
-                        st.session_state.manim_code, 
-                        st.session_state.video_topic
-                    )
-                    
-                    if st.session_state.video_path:
-                        # Step 4: Generate audio
-                        st.session_state.audio_path = generate_audio(
-                            st.session_state.script, 
-                            st.session_state.video_topic
-                        )
-                        
-                        if st.session_state.audio_path:
-                            # Step 5: Merge video and audio
-                            st.session_state.final_video_path = merge_video_audio(
-                                st.session_state.video_path, 
-                                st.session_state.audio_path, 
-                                st.session_state.video_topic
-                            )
-                            # Log video watched
-                            log_video_watched(st.session_state.user['id'], st.session_state.video_topic)
+                # Log video watched
+                log_video_watched(st.session_state.user['id'], st.session_state.video_topic)
+    
+    # A generation interrupted by a reload may have finished, or can resume from its checkpoints
+    if st.session_state.video_job and not st.session_state.final_video_path:
+        job = get_generation_job(make_job_key(st.session_state.video_job))
+        if job and job['status'] == 'done' and job['result_path'] and os.path.exists(job['result_path']):
+            st.session_state.final_video_path = job['result_path']
+            st.session_state.video_topic = st.session_state.video_job
+            st.session_state.video_job = None
+        elif job and job['status'] == 'running' and not job['stale']:
+            st.info(f"Your tutorial on '{st.session_state.video_job}' is still being generated "
+                    f"(current step: {job['stage'] or 'starting'}). Click 'Generate Tutorial' to follow it.")
+        else:
+            st.info(f"Your tutorial on '{st.session_state.video_job}' did not finish. "
+                    "Click 'Generate Tutorial' to resume it from its last completed step.")
     
     # Display results
     if st.session_state.final_video_path:
@@ -203,6 +254,25 @@ def video_generator_page():
                 mime="video/mp4"
             )
         
+        # Localized versions share the rendered video
+        localized = {lang: path for lang, path in st.session_state.localized_videos.items() if lang != "multi"}
+        if localized:
+            st.subheader("Other languages")
+            tabs = st.tabs([NARRATION_LANGUAGES[lang] for lang in localized])
+            for tab, (lang, path) in zip(tabs, localized.items()):
+                with tab:
+                    st.video(path)
+            
+            multi_path = st.session_state.localized_videos.get("multi")
+            if multi_path:
+                with open(multi_path, "rb") as file:
+                    st.download_button(
+                        label="Download Video with All Narration Tracks",
+                        data=file,
+                        file_name=f"{st.session_state.video_topic.replace(' ', '_')}_tutorial_multilang.mp4",
+                        mime="video/mp4"
+                    )
+        
         if st.button("Generate Quiz on This Topic"):
             st.session_state.topic = st.session_state.video_topic
             navigate_to_quiz_generator()
@@ -257,7 +327,7 @@ def quiz_generator_page():
         if st.session_state.completed:
             st.success(f"Quiz complete! Score: {st.session_state.score}/{len(st.session_state.questions)}")
             
-            # Log quiz attempt
+            # Log quiz attempt; reruns of the results page reuse the key, so it's recorded once
             log_quiz_attempt(
                 st.session_state.user['id'],
                 st.session_state.topic,
@@ -265,9 +335,9 @@ def quiz_generator_page():
                 len(st.session_state.questions),
                 {
                     "questions": st.session_state.questions,
-                    "answers": st.session_state.answers,
-                    "categories": st.session_state.question_categories
-                }
+                    "answers": st.session_state.answers
+                },
+                attempt_key=st.session_state.quiz_attempt_key
             )
             
             # Performance analysis
@@ -327,7 +397,13 @@ else:
         video_generator_page()
     elif st.session_state.page == "quiz_generator":
         quiz_generator_page()
+    
+    persist_session_state()
 
 # Footer
 st.markdown("---")
 st.markdown("<div style='text-align: center;'>Python Learning Platform</div>", unsafe_allow_html=True)
+
+# Each rerun runs on a new thread; release its connection (runs cut short by
+# st.rerun() are closed when the next thread opens one)
+close_thread_connection()
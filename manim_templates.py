@@ -0,0 +1,339 @@
+# manim_templates.py
+import ast
+import re
+import textwrap
+
+# Topics whose scripts follow a predictable shape and can be rendered from templates
+COMMON_TOPIC_PATTERNS = [re.compile(pattern) for pattern in (
+    r"(?<!linked )\blists?\b",
+    r"\bdict(?:s|ionary|ionaries)?\b",
+    r"\btuples?\b",
+    r"\bsets\b|\bpython set\b|\bset (?:data type|operations|methods)\b",
+    r"\bstrings?\b",
+    r"(?<!event )\bloops?\b",
+    r"\bif(?:[ /-]else)? statements?\b",
+    r"\bslicing\b",
+    r"\b(?:list|dict|dictionary|set) comprehensions?\b",
+)]
+
+# Limits that keep template scenes inside the frame
+MAX_CODE_LINES = 10
+MAX_LIST_ITEMS = 8
+MAX_DICT_ITEMS = 6
+MAX_SUMMARY_POINTS = 5
+MAX_LINE_CHARS = 60
+
+# Markers that make a parsable paragraph look like code rather than prose
+CODE_MARKERS = ("=", "(", "[", "{", "def ", "for ", "while ", "if ", "class ", "import ", "return ")
+
+
+def _clip(text, limit=MAX_LINE_CHARS):
+    text = text.strip()
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _is_code(paragraph):
+    """Check whether a script paragraph is a Python code example"""
+    code = textwrap.dedent(paragraph).strip()
+    if not code or not any(marker in code for marker in CODE_MARKERS):
+        return False
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    # A lone name or string parses as Python but is just prose
+    return not all(isinstance(node, ast.Expr) and isinstance(node.value, (ast.Name, ast.Constant)) for node in tree.body)
+
+
+def _source(code, node):
+    """Source text of an expression node (ast.unparse would need Python 3.9)"""
+    return ast.get_source_segment(code, node)
+
+
+def _find_literals(code):
+    """Return the first list and dict literals assigned in a code example"""
+    list_literal, dict_literal = None, None
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None, None
+
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)):
+            continue
+        name = node.targets[0].id
+        if isinstance(node.value, ast.List) and list_literal is None and node.value.elts:
+            list_literal = (name, [_source(code, item) for item in node.value.elts])
+        elif isinstance(node.value, ast.Dict) and dict_literal is None and node.value.keys:
+            pairs = [(_source(code, k), _source(code, v)) for k, v in zip(node.value.keys, node.value.values) if k is not None]
+            if pairs:
+                dict_literal = (name, pairs)
+    return list_literal, dict_literal
+
+
+def parse_script_content(topic, script):
+    """Extract title, code examples, explanations, literals and summary points from a script"""
+    content = {
+        "title": topic,
+        "intro": [],
+        "code_examples": [],
+        "summary": [],
+        "list_literal": None,
+        "dict_literal": None
+    }
+
+    # Odd-numbered parts are fenced code blocks; keep them in document order
+    parts = re.split(r'```(?:python)?(.*?)```', script, flags=re.DOTALL)
+    paragraphs = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            paragraphs.append(textwrap.dedent(part).strip("\n"))
+        else:
+            paragraphs.extend(textwrap.dedent(p).strip("\n") for p in part.split('\n\n') if p.strip())
+
+    for paragraph in paragraphs:
+        lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+        if not lines:
+            continue
+        bullets = [line.lstrip("✔✓•* ").strip() for line in lines if line[0] in "✔✓•"]
+        if bullets:
+            content["summary"].extend(bullets)
+        elif _is_code(paragraph):
+            content["code_examples"].append({"code": textwrap.dedent(paragraph).strip("\n"), "notes": []})
+        elif content["code_examples"] and not content["code_examples"][-1]["notes"]:
+            content["code_examples"][-1]["notes"] = lines[:2]
+        elif len(content["intro"]) < 3:
+            content["intro"].extend(lines[:3 - len(content["intro"])])
+
+    for example in content["code_examples"]:
+        list_literal, dict_literal = _find_literals(example["code"])
+        content["list_literal"] = content["list_literal"] or list_literal
+        content["dict_literal"] = content["dict_literal"] or dict_literal
+
+    content["summary"] = content["summary"][:MAX_SUMMARY_POINTS]
+    return content
+
+
+def title_card_section(method, title, subtitle_lines):
+    """Title card: topic title with up to three introduction lines"""
+    lines = [
+        f"    def {method}(self):",
+        f"        title = Text({_clip(title, 40)!r}, font_size=48, color=BLUE)",
+        "        title.to_edge(UP)",
+        "        self.play(Write(title))",
+        "        self.wait(2)",
+    ]
+    if subtitle_lines:
+        lines.append("        intro = VGroup(")
+        for line in subtitle_lines[:3]:
+            lines.append(f"            Text({_clip(line)!r}, font_size=26),")
+        lines += [
+            "        ).arrange(DOWN, buff=0.4)",
+            "        intro.next_to(title, DOWN, buff=1)",
+            "        for line in intro:",
+            "            self.play(FadeIn(line, shift=UP * 0.3))",
+            "            self.wait(4)",
+            "        self.wait(3)",
+            "        self.play(FadeOut(title), FadeOut(intro))",
+        ]
+    else:
+        lines += ["        self.wait(5)", "        self.play(FadeOut(title))"]
+    return "\n".join(lines)
+
+
+def code_walkthrough_section(method, title, code, notes):
+    """Code walkthrough: monospace code revealed line by line with an explanation"""
+    code_lines = [line.rstrip() for line in code.splitlines() if line.strip()][:MAX_CODE_LINES]
+    indents = [len(line) - len(line.lstrip()) for line in code_lines]
+    lines = [
+        f"    def {method}(self):",
+        f"        title = Text({_clip(title, 40)!r}, font_size=36, color=GREEN)",
+        "        title.to_edge(UP)",
+        "        self.play(Write(title))",
+        "        code_lines = VGroup(",
+    ]
+    for line in code_lines:
+        lines.append(f"            Text({_clip(line)!r}, font='Monospace', font_size=24, color=YELLOW),")
+    lines += [
+        "        ).arrange(DOWN, aligned_edge=LEFT, buff=0.25)",
+        f"        for line, indent in zip(code_lines, {indents!r}):",
+        "            line.shift(RIGHT * 0.15 * indent)",
+        "        box = SurroundingRectangle(code_lines, color=GREY, buff=0.3)",
+        "        VGroup(code_lines, box).next_to(title, DOWN, buff=0.6)",
+        "        self.play(Create(box))",
+        "        for line in code_lines:",
+        "            self.play(Write(line))",
+        "            self.wait(2)",
+        "            self.play(Indicate(line, color=ORANGE))",
+    ]
+    if notes:
+        lines.append("        notes = VGroup(")
+        for note in notes[:2]:
+            lines.append(f"            Text({_clip(note)!r}, font_size=24),")
+        lines += [
+            "        ).arrange(DOWN, buff=0.3)",
+            "        notes.next_to(box, DOWN, buff=0.6)",
+            "        self.play(FadeIn(notes))",
+            "        self.wait(8)",
+            "        self.play(FadeOut(title), FadeOut(code_lines), FadeOut(box), FadeOut(notes))",
+        ]
+    else:
+        lines += [
+            "        self.wait(8)",
+            "        self.play(FadeOut(title), FadeOut(code_lines), FadeOut(box))",
+        ]
+    return "\n".join(lines)
+
+
+def list_visualization_section(method, name, items):
+    """List visualization: boxed elements with their indexes, highlighted in turn"""
+    items = [_clip(item, 8) for item in items[:MAX_LIST_ITEMS]]
+    return "\n".join([
+        f"    def {method}(self):",
+        f"        title = Text({_clip(name + ' as a list', 40)!r}, font_size=36, color=BLUE)",
+        "        title.to_edge(UP)",
+        "        self.play(Write(title))",
+        "        cells = VGroup()",
+        f"        for index, value in enumerate({items!r}):",
+        "            box = Square(side_length=1.2, color=BLUE)",
+        "            label = Text(value, font_size=24).move_to(box)",
+        "            position = Text(str(index), font_size=20, color=GREY).next_to(box, DOWN, buff=0.2)",
+        "            cells.add(VGroup(box, label, position))",
+        "        cells.arrange(RIGHT, buff=0.1).move_to(ORIGIN)",
+        "        self.play(LaggedStart(*[Create(cell) for cell in cells], lag_ratio=0.3))",
+        "        self.wait(2)",
+        "        pointer = Arrow(UP, DOWN, color=ORANGE).next_to(cells[0], UP)",
+        "        self.play(GrowArrow(pointer))",
+        "        for cell in cells:",
+        "            self.play(pointer.animate.next_to(cell, UP), Indicate(cell[0], color=ORANGE))",
+        "            self.wait(1.5)",
+        "        self.wait(4)",
+        "        self.play(FadeOut(title), FadeOut(cells), FadeOut(pointer))",
+    ])
+
+
+def dict_visualization_section(method, name, pairs):
+    """Dict visualization: key boxes pointing at their values"""
+    pairs = [(_clip(k, 14), _clip(v, 14)) for k, v in pairs[:MAX_DICT_ITEMS]]
+    return "\n".join([
+        f"    def {method}(self):",
+        f"        title = Text({_clip(name + ' as a dictionary', 40)!r}, font_size=36, color=BLUE)",
+        "        title.to_edge(UP)",
+        "        self.play(Write(title))",
+        "        rows = VGroup()",
+        f"        for key, value in {pairs!r}:",
+        "            key_box = VGroup(Rectangle(width=3, height=0.7, color=BLUE), Text(key, font_size=24))",
+        "            value_box = VGroup(Rectangle(width=3, height=0.7, color=GREEN), Text(value, font_size=24))",
+        "            value_box.next_to(key_box, RIGHT, buff=1.5)",
+        "            arrow = Arrow(key_box.get_right(), value_box.get_left(), buff=0.1, color=ORANGE)",
+        "            rows.add(VGroup(key_box, arrow, value_box))",
+        "        rows.arrange(DOWN, buff=0.3).next_to(title, DOWN, buff=0.6)",
+        "        for row in rows:",
+        "            self.play(FadeIn(row[0]), GrowArrow(row[1]), FadeIn(row[2]))",
+        "            self.wait(3)",
+        "        self.wait(4)",
+        "        self.play(FadeOut(title), FadeOut(rows))",
+    ])
+
+
+def bullet_summary_section(method, title, points):
+    """Bullet summary: check-marked key points written one at a time"""
+    lines = [
+        f"    def {method}(self):",
+        f"        title = Text({_clip(title, 40)!r}, font_size=40, color=BLUE)",
+        "        title.to_edge(UP)",
+        "        self.play(Write(title))",
+        "        points = VGroup(",
+    ]
+    for point in points[:MAX_SUMMARY_POINTS]:
+        lines.append(f"            Text({('✔ ' + _clip(point))!r}, font_size=26),")
+    lines += [
+        "        ).arrange(DOWN, aligned_edge=LEFT, buff=0.4)",
+        "        points.next_to(title, DOWN, buff=0.8)",
+        "        for point in points:",
+        "            self.play(Write(point))",
+        "            self.wait(4)",
+        "        self.wait(5)",
+        "        self.play(FadeOut(title), FadeOut(points))",
+    ]
+    return "\n".join(lines)
+
+
+def is_common_topic(topic):
+    """Check whether a topic is covered by the template library.
+
+    Patterns match whole words, so "asset", "playlist" or "offset" don't count.
+    """
+    normalized = topic.lower()
+    return any(pattern.search(normalized) for pattern in COMMON_TOPIC_PATTERNS)
+
+
+def build_template_sections(topic, script, include_title_card=True):
+    """Fill the templates from a script.
+
+    Returns (sections, methods) in the shape assemble_manim_class expects, or
+    None when the topic is not a common one or the script lacks the structure
+    the templates need. Leave out the title card when a shared intro already
+    shows the topic title.
+    """
+    if not is_common_topic(topic):
+        return None
+
+    content = parse_script_content(topic, script)
+    if not content["code_examples"] or len(content["summary"]) < 2:
+        return None
+
+    sections, methods = [], {}
+
+    def add(method, title, source):
+        sections.append({"method": method, "title": title, "summary": ""})
+        methods[method] = source
+
+    if include_title_card:
+        add("title_card", topic, title_card_section("title_card", topic, content["intro"]))
+    for i, example in enumerate(content["code_examples"][:3]):
+        method = f"code_walkthrough_{i + 1}"
+        add(method, topic, code_walkthrough_section(method, f"{topic}: Example {i + 1}", example["code"], example["notes"]))
+    if content["list_literal"]:
+        name, items = content["list_literal"]
+        add("list_visualization", name, list_visualization_section("list_visualization", name, items))
+    if content["dict_literal"]:
+        name, pairs = content["dict_literal"]
+        add("dict_visualization", name, dict_visualization_section("dict_visualization", name, pairs))
+    add("bullet_summary", "Today, we learned", bullet_summary_section("bullet_summary", "Today, we learned", content["summary"]))
+
+    # Every value is embedded through repr(), so this only guards against template bugs
+    for source in methods.values():
+        compile("class _Check:\n" + source, "<template>", "exec")
+    return sections, methods
+
+
+# Branded segments rendered once and spliced into every tutorial at merge time.
+# The lower part of the intro and outro frames stays empty for the title overlay.
+SHARED_SEGMENT_SCENES = {
+    "intro": ("BrandedIntro", """from manim import *
+
+class BrandedIntro(Scene):
+    def construct(self):
+        blue = Circle(radius=0.9, color=BLUE, fill_opacity=0.8).shift(LEFT * 0.5 + UP * 1.5)
+        yellow = Circle(radius=0.9, color=YELLOW, fill_opacity=0.8).shift(RIGHT * 0.5 + UP * 1.0)
+        self.play(GrowFromCenter(blue), GrowFromCenter(yellow))
+        name = Text("Python Learning Platform", font_size=44, color=WHITE)
+        name.next_to(VGroup(blue, yellow), DOWN, buff=0.5)
+        self.play(Write(name))
+        self.wait(3)
+        self.play(FadeOut(blue), FadeOut(yellow), FadeOut(name))
+"""),
+    "outro": ("BrandedOutro", """from manim import *
+
+class BrandedOutro(Scene):
+    def construct(self):
+        message = Text("Keep practicing!", font_size=56, color=YELLOW).shift(UP * 1.5)
+        self.play(Write(message))
+        name = Text("Python Learning Platform", font_size=32, color=BLUE)
+        name.next_to(message, DOWN, buff=0.5)
+        self.play(FadeIn(name))
+        self.wait(3)
+        self.play(FadeOut(message), FadeOut(name))
+"""),
+}
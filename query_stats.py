@@ -0,0 +1,362 @@
+# query_stats.py
+"""Per-statement instrumentation for the SQLite layer.
+
+Connections opened with InstrumentedConnection record every statement's
+latency, rows and calling function under a fingerprint (the SQL with its
+literals replaced by ?). Statements slower than QUERY_SLOW_MS are appended to
+the slow-query log with their EXPLAIN QUERY PLAN, and dump_query_stats()
+writes the aggregated counters (count, p50, p95, p99 per fingerprint) to a
+JSON file of this process. load_query_stats() merges every process's file
+for db_admin.py and query_stats_app.py.
+"""
+import collections
+import glob
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+# Statements slower than this many milliseconds go to the slow-query log
+QUERY_SLOW_MS = float(os.getenv("LEARNING_PLATFORM_QUERY_SLOW_MS", "100"))
+
+# JSON-lines log of slow statements and their query plans
+SLOW_QUERY_LOG_PATH = os.getenv("LEARNING_PLATFORM_SLOW_QUERY_LOG", os.path.join("data", "slow_queries.log"))
+
+# Where the aggregated counters go; each process writes its own file next to
+# this path with its pid inserted (data/query_stats.<pid>.json)
+QUERY_STATS_PATH = os.getenv("LEARNING_PLATFORM_QUERY_STATS", os.path.join("data", "query_stats.json"))
+
+# Latest latencies kept per fingerprint for the percentiles
+QUERY_SAMPLE_SIZE = 1000
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+def fingerprint(sql):
+    """Normalize a statement so executions with different values share one entry"""
+    sql = _LITERALS.sub("?", " ".join(sql.split()))
+    return _IN_LISTS.sub("IN (?)", sql)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class QueryStats:
+    """Thread-safe per-fingerprint counters shared by every instrumented connection"""
+
+    def __init__(self, sample_size=QUERY_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+            self.started_at = time.time()
+
+    def record(self, sql, seconds, rows, caller):
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "rows": 0,
+                    "latencies": collections.deque(maxlen=self.sample_size),
+                    "callers": collections.Counter(),
+                }
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["rows"] += rows
+            entry["latencies"].append(seconds)
+            entry["callers"][caller] += 1
+
+    def snapshot(self, include_samples=False):
+        """Aggregated counters per fingerprint, slowest total time first (milliseconds).
+
+        With include_samples, each entry also carries its sorted latency sample
+        ("samples_ms"), so snapshots of several processes can be merged.
+        """
+        with self._lock:
+            entries = [(key, dict(entry, latencies=sorted(entry["latencies"]), callers=dict(entry["callers"])))
+                       for key, entry in self._entries.items()]
+
+        results = []
+        for key, entry in entries:
+            result = _summarize(
+                key, entry["count"], entry["total_seconds"] * 1000, entry["max_seconds"] * 1000,
+                entry["rows"], entry["callers"], [seconds * 1000 for seconds in entry["latencies"]]
+            )
+            if not include_samples:
+                del result["samples_ms"]
+            results.append(result)
+        results.sort(key=lambda item: item["total_ms"], reverse=True)
+        return results
+
+def _summarize(key, count, total_ms, max_ms, rows, callers, samples_ms):
+    """One fingerprint's entry as snapshot() reports it, from its totals and sorted latency sample"""
+    return {
+        "fingerprint": key,
+        "count": count,
+        "total_ms": round(total_ms, 3),
+        "mean_ms": round(total_ms / count, 3),
+        "p50_ms": round(percentile(samples_ms, 0.50), 3),
+        "p95_ms": round(percentile(samples_ms, 0.95), 3),
+        "p99_ms": round(percentile(samples_ms, 0.99), 3),
+        "max_ms": round(max_ms, 3),
+        "rows": rows,
+        "callers": callers,
+        "samples_ms": [round(ms, 3) for ms in samples_ms],
+    }
+
+query_stats = QueryStats()
+_slow_log_lock = threading.Lock()
+
+def _caller():
+    """Name the function outside this module that issued the statement"""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}:{frame.f_lineno}"
+
+def _log_slow_query(conn, sql, parameters, seconds, rows, caller):
+    """Append a slow statement and its query plan to the slow-query log"""
+    plan = []
+    if parameters is not None and sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+        try:
+            # A plain cursor, so the EXPLAIN itself isn't recorded
+            plan = [row[3] for row in sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+        except sqlite3.Error as e:
+            plan = [f"unavailable: {e}"]
+
+    entry = {
+        "at": time.time(),
+        "ms": round(seconds * 1000, 3),
+        "rows": rows,
+        "caller": caller,
+        "fingerprint": fingerprint(sql),
+        "plan": plan,
+    }
+    try:
+        with _slow_log_lock:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG_PATH) or ".", exist_ok=True)
+            with open(SLOW_QUERY_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Error writing slow query log: {e}")
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement and counts the rows it returns.
+
+    A SELECT is recorded once its rows are exhausted (or the cursor is reused,
+    closed or collected), so the latency includes fetching them.
+    """
+
+    _statement = None
+
+    def _start(self, sql, parameters, started, caller):
+        self._finish()
+        seconds = time.perf_counter() - started
+        if self.description is None:
+            # No result set: record now, with the rows the statement changed
+            self._record(sql, parameters, seconds, self.rowcount, caller)
+        else:
+            self._statement = [sql, parameters, seconds, 0, caller]
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            self._record(*statement)
+
+    def _record(self, sql, parameters, seconds, rows, caller):
+        # rowcount is -1 for statements that don't report one
+        rows = max(rows, 0)
+        query_stats.record(sql, seconds, rows, caller)
+        if seconds * 1000 >= QUERY_SLOW_MS:
+            _log_slow_query(self.connection, sql, parameters, seconds, rows, caller)
+
+    def _fetched(self, started, rows, exhausted):
+        statement = self._statement
+        if statement is not None:
+            statement[2] += time.perf_counter() - started
+            statement[3] += rows
+            if exhausted:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        caller = _caller()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._start(sql, parameters, started, caller)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        caller = _caller()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        # No single parameter set to explain the plan with
+        self._start(sql, None, started, caller)
+        return self
+
+    def executescript(self, sql_script):
+        self._finish()
+        caller = _caller()
+        started = time.perf_counter()
+        super().executescript(sql_script)
+        self._start(sql_script, None, started, caller)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), len(rows) < (self.arraysize if size is None else size))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the execute() shortcuts, are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def process_stats_path(path=QUERY_STATS_PATH, pid=None):
+    """Path of the counters file one process (this one by default) dumps to"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+def dump_query_stats(path=QUERY_STATS_PATH):
+    """Write this process's aggregated counters to its own JSON file and return that file's path"""
+    data = {
+        "pid": os.getpid(),
+        "since": query_stats.started_at,
+        "dumped_at": time.time(),
+        "slow_ms": QUERY_SLOW_MS,
+        "statements": query_stats.snapshot(include_samples=True),
+    }
+    path = process_stats_path(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+    return path
+
+def merge_query_stats(dumps):
+    """Combine the counters of several processes into one dump-shaped dict.
+
+    Counts, totals and rows add up, and the percentiles are taken over the
+    processes' latency samples together. "pids" lists the processes merged.
+    """
+    merged = {}
+    for dump in dumps:
+        for entry in dump["statements"]:
+            into = merged.setdefault(entry["fingerprint"], {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                "callers": collections.Counter(), "samples_ms": [],
+            })
+            into["count"] += entry["count"]
+            into["total_ms"] += entry["total_ms"]
+            into["max_ms"] = max(into["max_ms"], entry["max_ms"])
+            into["rows"] += entry["rows"]
+            into["callers"].update(entry["callers"])
+            into["samples_ms"].extend(entry["samples_ms"])
+
+    statements = [
+        _summarize(key, entry["count"], entry["total_ms"], entry["max_ms"], entry["rows"],
+                   dict(entry["callers"]), sorted(entry["samples_ms"]))
+        for key, entry in merged.items()
+    ]
+    statements.sort(key=lambda item: item["total_ms"], reverse=True)
+    latest = max(dumps, key=lambda dump: dump["dumped_at"])
+    return {
+        "pids": sorted(dump["pid"] for dump in dumps),
+        "since": min(dump["since"] for dump in dumps),
+        "dumped_at": latest["dumped_at"],
+        "slow_ms": latest["slow_ms"],
+        "statements": statements,
+    }
+
+def load_query_stats(path=QUERY_STATS_PATH):
+    """Read and merge the counters every process wrote with dump_query_stats(), or None if there are none yet"""
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r"\.\d+" + re.escape(ext) + "$")
+    dumps = []
+    for file_path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+        if not pattern.match(file_path):
+            continue
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                dumps.append(json.load(f))
+        except (OSError, ValueError):
+            # Removed or unreadable since the glob; the other processes still count
+            continue
+    return merge_query_stats(dumps) if dumps else None
+
+def read_slow_queries(path=SLOW_QUERY_LOG_PATH, limit=50):
+    """Get the most recent slow-query log entries, newest first"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = collections.deque(f, maxlen=limit)
+    except OSError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
@@ -0,0 +1,40 @@
+# query_stats_app.py - admin page for the SQLite query counters
+import datetime
+import pandas as pd
+import streamlit as st
+from query_stats import QUERY_STATS_PATH, load_query_stats, read_slow_queries
+
+def main():
+    st.title("🗄️ Query Statistics")
+    
+    data = load_query_stats(QUERY_STATS_PATH)
+    if data is None:
+        st.info("No query stats yet. The app writes them from its database maintenance thread.")
+        return
+    
+    dumped_at = datetime.datetime.fromtimestamp(data["dumped_at"])
+    since = datetime.datetime.fromtimestamp(data["since"])
+    pids = ", ".join(str(pid) for pid in data["pids"])
+    st.caption(f"Processes {pids}, statements since {since:%Y-%m-%d %H:%M}, last written {dumped_at:%Y-%m-%d %H:%M:%S}")
+    
+    if data["statements"]:
+        stats_df = pd.DataFrame(data["statements"])
+        stats_df["callers"] = stats_df["callers"].apply(lambda callers: ", ".join(sorted(callers)))
+        st.dataframe(
+            stats_df[["fingerprint", "count", "total_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rows", "callers"]],
+            use_container_width=True
+        )
+    
+    st.subheader(f"Slow queries (over {data['slow_ms']} ms)")
+    slow = read_slow_queries(limit=50)
+    if not slow:
+        st.write("None logged.")
+    for entry in slow:
+        with st.expander(f"{entry['ms']:.1f} ms - {entry['caller']}"):
+            st.code(entry["fingerprint"], language="sql")
+            st.write(f"Rows: {entry['rows']}")
+            for step in entry["plan"]:
+                st.text(step)
+
+if __name__ == "__main__":
+    main()
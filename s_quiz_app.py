@@ -0,0 +1,215 @@
+# s_quiz_app.py - standalone Streamlit entry point for the adaptive quiz
+import streamlit as st
+from s_quiz import (
+    start_assessment, submit_answer, restart,
+    analyze_performance, get_feedback_and_resources
+)
+
+def display_performance_charts(performance):
+    """Generate and display performance charts"""
+    if not performance:
+        return
+    
+    # Plotting libraries are only needed once a quiz is finished
+    import matplotlib.pyplot as plt
+    import numpy as np
+    
+    # Prepare data for charts
+    categories = list(performance.keys())
+    scores = [p["score_pct"] for p in performance.values()]
+    correct_counts = [p["correct"] for p in performance.values()]
+    total_counts = [p["total"] for p in performance.values()]
+    
+    # Create a 2x1 layout
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Category performance bar chart
+        fig1, ax1 = plt.subplots(figsize=(6, 4))
+        bars = ax1.bar(categories, scores, color='skyblue')
+        ax1.set_ylim(0, 100)
+        ax1.set_ylabel('Score (%)')
+        ax1.set_title('Performance by Category')
+        ax1.set_xticklabels(categories, rotation=30, ha='right')
+        
+        # Add value labels on top of bars
+        for bar in bars:
+            height = bar.get_height()
+            ax1.text(bar.get_x() + bar.get_width()/2., height + 2,
+                    f"{height:.0f}%", ha='center', va='bottom')
+        
+        st.pyplot(fig1)
+    
+    with col2:
+        # Pie chart of overall performance
+        total_correct = sum(correct_counts)
+        total_questions = sum(total_counts)
+        total_incorrect = total_questions - total_correct
+        
+        fig2, ax2 = plt.subplots(figsize=(6, 4))
+        labels = ['Correct', 'Incorrect']
+        sizes = [total_correct, total_incorrect]
+        colors = ['#4CAF50', '#F44336']
+        explode = (0.1, 0)  # explode the 1st slice (Correct)
+        
+        ax2.pie(sizes, explode=explode, labels=labels, colors=colors,
+                autopct='%1.1f%%', shadow=True, startangle=140)
+        ax2.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+        ax2.set_title('Overall Performance')
+        
+        st.pyplot(fig2)
+    
+    # Radar chart for category proficiency
+    categories_radar = list(performance.keys())
+    if len(categories_radar) >= 3:  # Only create radar chart if we have at least 3 categories
+        # Number of variables
+        N = len(categories_radar)
+        
+        # What will be the angle of each axis in the plot
+        angles = [n / float(N) * 2 * np.pi for n in range(N)]
+        angles += angles[:1]  # Close the loop
+        
+        # Normalize scores to range 0-1 for the radar chart
+        normalized_scores = [s/100 for s in scores]
+        normalized_scores += normalized_scores[:1]  # Close the loop
+        
+        # Create the radar chart
+        fig3 = plt.figure(figsize=(8, 6))
+        ax3 = fig3.add_subplot(111, polar=True)
+        
+        # Draw one axis per variable and add labels
+        plt.xticks(angles[:-1], categories_radar, color='grey', size=10)
+        
+        # Draw the chart
+        ax3.plot(angles, normalized_scores, linewidth=2, linestyle='solid')
+        ax3.fill(angles, normalized_scores, alpha=0.25)
+        
+        # Add radial axes and labels
+        ax3.set_rlabel_position(0)
+        plt.yticks([0.25, 0.5, 0.75], ["25%", "50%", "75%"], color="grey", size=8)
+        plt.ylim(0, 1)
+        
+        st.pyplot(fig3)
+
+def init_session_state():
+    """Give every quiz key a starting value the first time a session runs"""
+    if 'questions' not in st.session_state:
+        st.session_state.questions = []
+    if 'current_question' not in st.session_state:
+        st.session_state.current_question = 0
+    if 'score' not in st.session_state:
+        st.session_state.score = 0
+    if 'completed' not in st.session_state:
+        st.session_state.completed = False
+    if 'answers' not in st.session_state:
+        st.session_state.answers = {}
+    if 'topic' not in st.session_state:
+        st.session_state.topic = ""
+    if 'question_categories' not in st.session_state:
+        st.session_state.question_categories = {}
+    if 'time_taken' not in st.session_state:
+        st.session_state.time_taken = {}
+
+def main():
+    init_session_state()
+    st.sidebar.title("Adaptive MCQ Generator")
+
+    if not st.session_state.questions:
+        topic = st.sidebar.text_input("Enter a coding topic:", key="topic_input")
+        
+        if st.sidebar.button("Start Assessment") and topic:
+            st.session_state.topic = topic
+            start_assessment()
+    else:
+        if st.sidebar.button("Start New Assessment", key="sidebar_new_assessment"):
+            restart()
+
+    # Display quiz content
+    if st.session_state.questions:
+        st.title(f"📚 Adaptive Assessment: {st.session_state.topic}")
+        
+        if not st.session_state.completed:
+            # Display current question
+            q_idx = st.session_state.current_question
+            question_data = st.session_state.questions[q_idx]
+            
+            st.subheader(f"Question {q_idx + 1} of {len(st.session_state.questions)}")
+            st.write(question_data["question"])
+            
+            # Display category
+            category = question_data.get("category", "General")
+            st.caption(f"Category: {category}")
+            
+            # Create a unique key for each radio button
+            radio_key = f"radio_{q_idx}"
+            
+            # Initialize the answer in session state if not present
+            if radio_key not in st.session_state:
+                st.session_state[radio_key] = None
+                
+            # Display options
+            selected_option = st.radio(
+                "Select your answer:",
+                question_data["options"],
+                key=radio_key
+            )
+            
+            # Store the answer in session state
+            st.session_state.answers[q_idx] = selected_option
+            
+            # Submit button
+            if st.button("Submit Answer", key=f"submit_{q_idx}"):
+                submit_answer(q_idx)
+                st.rerun()
+                
+            # Display progress
+            progress = (q_idx + 1) / len(st.session_state.questions)
+            st.progress(progress)
+            
+        else:
+            # Quiz completed - show results
+            st.success("### Assessment Complete! 🎉")
+            st.write(f"Your score: {st.session_state.score}/{len(st.session_state.questions)}")
+            
+            percentage = (st.session_state.score / len(st.session_state.questions)) * 100
+            
+            if percentage == 100:
+                st.balloons()
+                st.success("🎯 Perfect Score! Excellent work!")
+            elif percentage >= 70:
+                st.info("👍 Good job! Keep practicing!")
+            else:
+                st.warning("📚 You might need more practice on this topic.")
+                
+            # Analyze performance by category
+            performance, strengths, weaknesses = analyze_performance()
+            
+            # Display performance charts
+            st.subheader("📊 Performance Analysis")
+            display_performance_charts(performance)
+            
+            # Generate personalized feedback
+            feedback = get_feedback_and_resources(strengths, weaknesses, st.session_state.topic)
+            st.markdown(feedback)
+            
+            # Review answers
+            st.subheader("📝 Review Your Answers")
+            for i, q in enumerate(st.session_state.questions):
+                with st.expander(f"Question {i+1} - {q.get('category', 'General')}"):
+                    st.write(q["question"])
+                    user_answer = st.session_state.answers.get(i, "Not answered")
+                    
+                    if user_answer == q["correct_answer"]:
+                        st.success(f"Your answer: {user_answer} ✅")
+                    else:
+                        st.error(f"Your answer: {user_answer} ❌")
+                        st.info(f"Correct answer: {q['correct_answer']}")
+            
+            if st.button("Start New Assessment", key="main_new_assessment"):
+                restart()
+                st.rerun()
+    else:
+        st.write("Enter a topic in the sidebar and click 'Start Assessment' to begin.")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
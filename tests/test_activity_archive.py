@@ -0,0 +1,56 @@
+# tests/test_activity_archive.py
+"""Archived activity must keep showing up in the dashboard's trend through the rollups."""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+from time_utils import now_ms
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+class ActivityArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+        # A fresh scratch database, migrated on first use
+        db_utils.close_thread_connection()
+        self.addCleanup(db_utils.close_thread_connection)
+        self.addCleanup(setattr, db_utils, "_schema_ready", db_utils._schema_ready)
+        self.addCleanup(setattr, db_utils, "DB_PATH", db_utils.DB_PATH)
+        db_utils.DB_PATH = os.path.join(self.scratch.name, "archive.db")
+        db_utils._schema_ready = None
+
+        db_utils.register_user("archived", "archived@example.com", "archived")
+        self.user_id = db_utils.authenticate_user("archived", "archived")["id"]
+
+    def test_archived_days_stay_in_the_dashboard_trend(self):
+        retention_days = db_utils.ACTIVITY_RETENTION_DAYS
+        self.assertGreater(db_utils.DASHBOARD_TREND_DAYS, retention_days)
+        old = now_ms() - (retention_days + 10) * DAY_MS
+        with db_utils.unit_of_work() as conn:
+            conn.executemany(
+                """INSERT INTO activity_logs (user_id, activity_type, activity_details, timestamp)
+                   VALUES (?, ?, ?, ?)""",
+                [(self.user_id, "quiz_attempt", "{}", old), (self.user_id, "quiz_attempt", "{}", now_ms())]
+            )
+        old_day = datetime.datetime.fromtimestamp(old / 1000).date().isoformat()
+
+        archived = db_utils.archive_activity_logs(retention_days, os.path.join(self.scratch.name, "archive"))
+        db_utils.invalidate_user_cache(self.user_id)
+        trend = {row["day"]: row["activities"] for row in db_utils.get_dashboard_snapshot(self.user_id)["activity_trend"]}
+
+        self.assertEqual(archived, 1)
+        live = db_utils.get_thread_connection().execute(
+            "SELECT COUNT(*) FROM activity_logs WHERE activity_type = 'quiz_attempt'"
+        ).fetchone()[0]
+        self.assertEqual(live, 1)
+        self.assertEqual(trend.get(old_day), 1)
+
+if __name__ == "__main__":
+    unittest.main()
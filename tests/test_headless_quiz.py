@@ -0,0 +1,61 @@
+# tests/test_headless_quiz.py
+"""The quiz flow in s_quiz must run without Streamlit, on the headless_ui stand-in."""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import s_quiz
+from headless_ui import HeadlessStreamlit
+
+QUESTIONS = [
+    {"question": "What does len([1, 2]) return?", "options": ["1", "2", "3", "4"],
+     "correct_answer": "2", "category": "Basic Concepts"},
+    {"question": "Which keyword defines a function?", "options": ["def", "fun", "fn", "lambda"],
+     "correct_answer": "def", "category": "Application"},
+]
+
+class HeadlessQuizTest(unittest.TestCase):
+
+    def setUp(self):
+        self.st = HeadlessStreamlit()
+        patcher = mock.patch.object(s_quiz, "st", self.st)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(s_quiz, "generate_mcqs", return_value=[dict(q) for q in QUESTIONS])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_quiz_runs_on_headless_session_state(self):
+        state = self.st.session_state
+        state.topic = "Python basics"
+
+        s_quiz.start_assessment()
+        s_quiz.submit_answer(0)  # No answer yet: reported, not counted
+        self.assertEqual(state.current_question, 0)
+
+        state.answers[0] = "2"
+        s_quiz.submit_answer(0)
+        state.answers[1] = "fn"
+        s_quiz.submit_answer(1)
+
+        self.assertTrue(state.completed)
+        self.assertEqual(state.score, 1)
+        self.assertIsNotNone(state.quiz_attempt_key)
+        performance, strengths, weaknesses = s_quiz.analyze_performance()
+        self.assertEqual(performance["Basic Concepts"]["correct"], 1)
+        self.assertEqual(strengths, ["Basic Concepts"])
+        self.assertEqual(weaknesses, ["Application"])
+
+        s_quiz.restart()
+        self.assertEqual(state.questions, [])
+        self.assertEqual(state.topic, "")
+
+    def test_missing_key_raises_attribute_error(self):
+        with self.assertRaises(AttributeError):
+            self.st.session_state.questions
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+# tests/test_query_plans.py
+"""Every hot-path statement must be served by an index, never a full table scan."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+
+class QueryPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+        # Point the default database somewhere the check must never touch
+        self.original_db_path = db_utils.DB_PATH
+        db_utils.DB_PATH = os.path.join(self.scratch.name, "production.db")
+        self.addCleanup(setattr, db_utils, "DB_PATH", self.original_db_path)
+
+    def test_hot_statements_use_indexes(self):
+        results = db_utils.check_query_plans(os.path.join(self.scratch.name, "plans.db"))
+
+        self.assertTrue(results)
+        for sql, plan, scans in results:
+            with self.subTest(sql=" ".join(sql.split())):
+                self.assertEqual(scans, [], "\n".join(plan))
+
+    def test_check_leaves_the_default_database_alone(self):
+        db_utils.check_query_plans(os.path.join(self.scratch.name, "plans.db"))
+
+        self.assertFalse(os.path.exists(db_utils.DB_PATH))
+
+    def test_refuses_the_default_database(self):
+        with self.assertRaises(ValueError):
+            db_utils.check_query_plans(db_utils.DB_PATH)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# tests/test_query_stats.py
+"""Query counters dumped by several processes must all show up, merged, in load_query_stats()."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query_stats
+
+class QueryStatsMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+        self.path = os.path.join(self.scratch.name, "query_stats.json")
+        self.addCleanup(query_stats.query_stats.reset)
+        query_stats.query_stats.reset()
+
+    def test_each_process_keeps_its_own_counters(self):
+        query_stats.query_stats.record("SELECT * FROM users WHERE id = 1", 0.002, 1, "app.main:1")
+        query_stats.query_stats.record("SELECT * FROM users WHERE id = 2", 0.004, 1, "app.main:1")
+        written = query_stats.dump_query_stats(self.path)
+        # Another process's dump of the same statement
+        other = {
+            "pid": os.getpid() + 1, "since": 0.0, "dumped_at": 1.0, "slow_ms": 100.0,
+            "statements": [{
+                "fingerprint": "SELECT * FROM users WHERE id = ?", "count": 1, "total_ms": 10.0,
+                "mean_ms": 10.0, "p50_ms": 10.0, "p95_ms": 10.0, "p99_ms": 10.0, "max_ms": 10.0,
+                "rows": 1, "callers": {"load_test.run:9": 1}, "samples_ms": [10.0],
+            }],
+        }
+        with open(query_stats.process_stats_path(self.path, other["pid"]), "w", encoding="utf-8") as f:
+            json.dump(other, f)
+
+        data = query_stats.load_query_stats(self.path)
+
+        self.assertNotEqual(written, self.path)
+        self.assertEqual(data["pids"], sorted([os.getpid(), other["pid"]]))
+        [entry] = data["statements"]
+        self.assertEqual(entry["count"], 3)
+        self.assertEqual(entry["total_ms"], 16.0)
+        self.assertEqual(entry["max_ms"], 10.0)
+        self.assertEqual(entry["p50_ms"], 4.0)
+        self.assertEqual(entry["callers"], {"app.main:1": 2, "load_test.run:9": 1})
+
+    def test_no_dumps_yet(self):
+        self.assertIsNone(query_stats.load_query_stats(self.path))
+
+if __name__ == "__main__":
+    unittest.main()
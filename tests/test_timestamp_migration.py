@@ -0,0 +1,46 @@
+# tests/test_timestamp_migration.py
+"""The epoch-millisecond migration must survive legacy timestamps it can't parse."""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+from time_utils import to_epoch_ms
+
+class TimestampMigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+        self.path = os.path.join(self.scratch.name, "legacy.db")
+
+        # A database left at the last schema version with text timestamps
+        with mock.patch.object(db_utils, "MIGRATIONS", db_utils.MIGRATIONS[:4]):
+            self.assertTrue(db_utils.apply_migrations(self.path))
+
+    def test_malformed_timestamp_takes_its_neighbours_time(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('legacy', 'l@example.com', 'x')")
+        conn.executemany(
+            "INSERT INTO chatbot_interactions (user_id, query, response, timestamp) VALUES (1, 'q', 'r', ?)",
+            [("not a time",), ("2024-03-01T10:00:00",), ("yesterday-ish",), ("2024-03-02T09:30:00",)]
+        )
+        conn.commit()
+        conn.close()
+
+        with self.assertLogs(db_utils.logger, "WARNING"):
+            self.assertTrue(db_utils.apply_migrations(self.path))
+
+        conn = sqlite3.connect(self.path)
+        stored = [row[0] for row in conn.execute("SELECT timestamp FROM chatbot_interactions ORDER BY id")]
+        conn.close()
+        first, second = to_epoch_ms("2024-03-01T10:00:00"), to_epoch_ms("2024-03-02T09:30:00")
+        self.assertEqual(stored, [first, first, first, second])
+
+if __name__ == "__main__":
+    unittest.main()
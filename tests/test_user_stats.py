@@ -0,0 +1,56 @@
+# tests/test_user_stats.py
+"""The materialized streak must read as broken once a day has passed without activity."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+from time_utils import now_ms
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+class UserStreakTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+        # A fresh scratch database, migrated on first use
+        db_utils.close_thread_connection()
+        self.addCleanup(db_utils.close_thread_connection)
+        self.addCleanup(setattr, db_utils, "_schema_ready", db_utils._schema_ready)
+        self.addCleanup(setattr, db_utils, "DB_PATH", db_utils.DB_PATH)
+        db_utils.DB_PATH = os.path.join(self.scratch.name, "stats.db")
+        db_utils._schema_ready = None
+
+        db_utils.register_user("streaker", "streaker@example.com", "streaker")
+        # Looked up directly: authenticate_user would log a login today and extend the streak
+        self.user_id = db_utils.get_thread_connection().execute(
+            "SELECT id FROM users WHERE username = 'streaker'"
+        ).fetchone()[0]
+
+    def log_days_ago(self, *days):
+        with db_utils.unit_of_work() as conn:
+            conn.executemany(
+                """INSERT INTO activity_logs (user_id, activity_type, activity_details, timestamp)
+                   VALUES (?, 'video_watched', '{}', ?)""",
+                [(self.user_id, now_ms() - day * DAY_MS) for day in days]
+            )
+        db_utils.invalidate_user_cache(self.user_id)
+
+    def test_streak_ending_yesterday_still_counts(self):
+        self.log_days_ago(2, 1)
+
+        self.assertEqual(db_utils.get_user_stats(self.user_id)["current_streak"], 2)
+
+    def test_streak_lapses_without_a_new_activity(self):
+        self.log_days_ago(12, 11, 10)
+
+        stats = db_utils.get_user_stats(self.user_id)
+        self.assertEqual(stats["current_streak"], 0)
+        self.assertEqual(stats["longest_streak"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
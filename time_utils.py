@@ -0,0 +1,46 @@
+# time_utils.py
+"""Canonical timestamps: integer milliseconds since the Unix epoch (UTC)"""
+import datetime
+import time
+
+def now_ms():
+    """Current time in epoch milliseconds"""
+    return time.time_ns() // 1_000_000
+
+def to_epoch_ms(value):
+    """Convert a stored or supplied time value to epoch milliseconds.
+
+    Accepts epoch seconds or milliseconds, datetime objects (naive ones are local
+    time) and the legacy text formats: isoformat() strings and str(datetime)
+    are local time, while SQLite's CURRENT_TIMESTAMP ("YYYY-MM-DD HH:MM:SS",
+    no fraction) is UTC. Returns None for empty or unparseable values.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        # Anything below ~1973 in milliseconds is really a value in seconds
+        return int(value * 1000) if abs(value) < 1e11 else int(value)
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, datetime.date):
+        return int(datetime.datetime.combine(value, datetime.time()).timestamp() * 1000)
+
+    text = str(value).strip()
+    try:
+        return to_epoch_ms(float(text))
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None and "T" not in text and "." not in text and len(text) == 19:
+        # CURRENT_TIMESTAMP default, which SQLite writes in UTC
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def from_epoch_ms(ms):
+    """Convert epoch milliseconds to a naive local datetime for display"""
+    if ms is None:
+        return None
+    return datetime.datetime.fromtimestamp(to_epoch_ms(ms) / 1000)